@@ -0,0 +1,88 @@
+# file: benchmarks/export.py
+# compares reparsing text logs with loading a columnar export.
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.results import save_results
+from benchmarks.synthetic import write_trace
+from src.export import export_trace, load_export
+from src.parser import read_trace
+from src.timestamp import export_reference_timestamps
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading exported traces against reparsing text logs."
+    )
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=1_000_000,
+        help="number of events (default: 1M)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["auto", "parquet", "npz"],
+        default="auto",
+        help="export format (default: auto)",
+    )
+    parser.add_argument(
+        "--target",
+        type=float,
+        default=10.0,
+        help="minimum speedup of loading over reparsing (default: 10x)",
+    )
+    parser.add_argument("-j", "--json", help="save the results into a JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_trace(os.path.join(tmp, "trace_io_0.log"), args.events)
+        export_reference_timestamps(tmp)
+
+        start = time.perf_counter()
+        for _ in read_trace(tmp, "io"):
+            pass
+        parse_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        (target,) = export_trace(tmp, os.path.join(tmp, "export"), args.format)
+        export_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_export(target)
+        load_s = time.perf_counter() - start
+
+    logging.info(f"reparse text: {parse_s:.3f}s")
+    logging.info(f"export:       {export_s:.3f}s ({target})")
+    logging.info(f"load export:  {load_s:.3f}s ({parse_s / load_s:.1f}x faster)")
+
+    if args.json:
+        save_results(
+            args.json,
+            "export",
+            {
+                "reparse_s": parse_s,
+                "export_s": export_s,
+                "load_s": load_s,
+                "load_speedup": parse_s / load_s,
+            },
+        )
+
+    if parse_s / load_s < args.target:
+        logging.error(f"speedup below target ({args.target}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
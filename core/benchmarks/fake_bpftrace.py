@@ -0,0 +1,96 @@
+# file: benchmarks/fake_bpftrace.py
+# a stand-in for bpftrace that prints synthetic trace lines to stdout.
+#
+# configured by environment variables:
+#   FAKE_BPFTRACE_EVENTS  number of lines to print (default: 1M)
+#   FAKE_BPFTRACE_THREADS number of simulated threads (default: 16)
+#   FAKE_BPFTRACE_RATE    lines per second (default: 0, as fast as possible)
+#   FAKE_BPFTRACE_HOLD    keep running after the output until signaled (default: 0)
+#   FAKE_BPFTRACE_LOST    "Lost N events" reported per block while BPFTRACE_PERF_RB_PAGES
+#                         is below FAKE_BPFTRACE_LOST_BELOW (default: 0, nothing lost)
+#
+# like bpftrace, -o writes the output into a file and -c runs a command, the
+# output then lasts as long as the command instead of FAKE_BPFTRACE_EVENTS lines.
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import trace_lines  # noqa: E402
+
+BLOCK = 16 * 1024  # lines generated once and written repeatedly
+TICK = 0.01  # pacing interval in seconds
+
+
+def paced(out, lines: list[bytes], events: int, rate: int, child):
+    """Write lines at a rate, until `events` lines or until the child exits."""
+    start = time.monotonic()
+    written = 0
+    cursor = 0
+
+    while child.poll() is None if child is not None else written < events:
+        due = int((time.monotonic() - start) * rate) - written if rate else BLOCK
+        if child is None:
+            due = min(due, events - written)
+        if due <= 0:
+            time.sleep(TICK)
+            continue
+
+        chunk = []
+        while len(chunk) < due:
+            take = lines[cursor : cursor + due - len(chunk)]
+            chunk += take
+            cursor = (cursor + len(take)) % len(lines)
+        out.write(b"".join(chunk))
+        out.flush()
+        written += due
+
+
+def main():
+    events = int(os.environ.get("FAKE_BPFTRACE_EVENTS", 1_000_000))
+    threads = int(os.environ.get("FAKE_BPFTRACE_THREADS", 16))
+    rate = int(os.environ.get("FAKE_BPFTRACE_RATE", 0))
+
+    out = sys.stdout.buffer
+    if "-o" in sys.argv:
+        out = open(sys.argv[sys.argv.index("-o") + 1], "wb")
+
+    child = None
+    if "-c" in sys.argv:
+        child = subprocess.Popen(sys.argv[sys.argv.index("-c") + 1], shell=True)
+
+    out.write(b"Attaching 2 probes...\n")
+
+    # generating lines is slower than the tracer under test, so repeat one block
+    lines = list(trace_lines(min(max(events, 1), BLOCK), threads))
+
+    lost = int(os.environ.get("FAKE_BPFTRACE_LOST", 0))
+    pages = int(os.environ.get("BPFTRACE_PERF_RB_PAGES", 64))
+    if lost and pages < int(os.environ.get("FAKE_BPFTRACE_LOST_BELOW", 1 << 30)):
+        lines.append(f"Lost {lost} events\n".encode())
+
+    if rate or child is not None:
+        paced(out, lines, events, rate, child)
+    else:
+        block = b"".join(lines)
+        for _ in range(events // BLOCK):
+            out.write(block)
+        out.write(b"".join(trace_lines(events % BLOCK, threads)))
+    out.flush()
+
+    # like bpftrace, run until SIGINT/SIGTERM
+    if child is None and os.environ.get("FAKE_BPFTRACE_HOLD", "0") != "0":
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        while True:
+            signal.pause()
+
+    if child is not None:
+        sys.exit(child.wait())
+
+
+if __name__ == "__main__":
+    main()
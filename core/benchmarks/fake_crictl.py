@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# file: benchmarks/fake_crictl.py
+# a stand-in for crictl to run the tracing daemon without a container runtime.
+#
+# containers are read from the JSON file in FAKE_CRICTL_CONTAINERS, e.g.
+#   {"default/web/nginx": 1234}
+# maps namespace/pod/container to the pid of a local process, whose cgroup is
+# then traced. only `ps` and `inspect` with `-o json` are supported.
+
+import hashlib
+import json
+import os
+import sys
+
+
+def containers() -> dict:
+    try:
+        with open(os.environ["FAKE_CRICTL_CONTAINERS"]) as f:
+            entries = json.load(f)
+    except (KeyError, OSError, ValueError):
+        return {}
+    return {hashlib.sha256(k.encode()).hexdigest(): (k, v) for k, v in entries.items()}
+
+
+def option(name: str) -> str:
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else None
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: fake_crictl.py ps|inspect ...")
+
+    if sys.argv[1] == "ps":
+        namespace = option("--namespace")
+        label = option("--label")
+        listing = []
+        for cid, (key, _) in containers().items():
+            ns, pod, container = key.split("/")
+            labels = {
+                "io.kubernetes.pod.namespace": ns,
+                "io.kubernetes.pod.name": pod,
+                "io.kubernetes.container.name": container,
+            }
+            if namespace and namespace != ns:
+                continue
+            if label and label != f"io.kubernetes.pod.name={pod}":
+                continue
+            listing.append({"id": cid, "labels": labels})
+        print(json.dumps({"containers": listing}))
+    elif sys.argv[1] == "inspect":
+        entry = containers().get(sys.argv[2])
+        if entry is None:
+            sys.exit(f"container {sys.argv[2]} not found")
+        print(json.dumps({"info": {"pid": entry[1]}}))
+    else:
+        sys.exit(f"unsupported command {sys.argv[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# file: benchmarks/overhead.py
+# slowdown of the synthetic workload traced by each tracer mode of src/handlers.
+#
+# needs root and bpftrace, or --fake to only measure the Python side with
+# fake_bpftrace.py (which runs the workload like bpftrace -c).
+
+import argparse
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+
+import src.handlers as hd
+from benchmarks.results import save_results
+from benchmarks.rotate import install_fake_bpftrace
+from src.matchbox import ignite_tracing
+from src.options import TracerOptions
+from src.utils import must_support_bpftrace
+
+WORKLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workload.py")
+
+MODES = {
+    "trace": TracerOptions(),
+    "trace_rotate": TracerOptions(rotate=True),
+    "combined": TracerOptions(mode="combined"),
+    "aggregate": TracerOptions(mode="aggregate"),
+    "sampled": TracerOptions(sample_rate=8),
+}
+
+
+def workload_command(timings: str, args: argparse.Namespace) -> str:
+    return shlex.join(
+        [sys.executable, WORKLOAD, "-s", str(args.size), "-n", str(args.ops)]
+        + ["-t", str(args.threads), "-j", timings]
+    )
+
+
+def load_timings(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the slowdown of a workload under each tracer mode."
+    )
+    parser.add_argument(
+        "-m",
+        "--modes",
+        nargs="+",
+        choices=list(MODES),
+        default=list(MODES),
+        help="tracer modes to run (default: all)",
+    )
+    parser.add_argument("-s", "--size", type=int, default=64, help="data size in MB")
+    parser.add_argument("-n", "--ops", type=int, default=50_000, help="random reads")
+    parser.add_argument("-t", "--threads", type=int, default=16, help="threads")
+    parser.add_argument(
+        "--fake",
+        action="store_true",
+        help="use fake_bpftrace.py instead of bpftrace (no root needed)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=int,
+        default=100_000,
+        help="lines per second of the fake bpftrace (default: 100k)",
+    )
+    parser.add_argument("-j", "--json", help="save the results into a JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fake:
+            install_fake_bpftrace(tmp)
+            os.environ["PATH"] = tmp + os.pathsep + os.environ["PATH"]
+            os.environ["FAKE_BPFTRACE_RATE"] = str(args.rate)
+        must_support_bpftrace()
+
+        timings = os.path.join(tmp, "timings.json")
+        subprocess.run(shlex.split(workload_command(timings, args)), check=True)
+        baseline = load_timings(timings)
+        print(f"{'baseline':>14}: {baseline['total']:.3f}s")
+
+        metrics = {"baseline_s": baseline["total"]}
+        for mode in args.modes:
+            out = os.path.join(tmp, mode)
+            tracers = hd.handle_execute(
+                out, workload_command(timings, args), MODES[mode]
+            )
+            ignite_tracing(out, tracers)
+
+            traced = load_timings(timings)
+            slowdowns = {
+                phase: traced[phase] / baseline[phase]
+                for phase in baseline
+                if baseline[phase] > 0
+            }
+            print(
+                f"{mode:>14}: {traced['total']:.3f}s (x{slowdowns['total']:.2f}), "
+                + ", ".join(
+                    f"{p} x{v:.2f}" for p, v in slowdowns.items() if p != "total"
+                )
+            )
+            for phase, value in slowdowns.items():
+                metrics[f"{mode}_{phase}_slowdown"] = value
+
+    if args.json:
+        save_results(args.json, "overhead", metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# file: benchmarks/pairing.py
+# throughput of the trace parser and the EN/EX pairing engine.
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.results import save_results
+from benchmarks.synthetic import write_trace
+from src.pairing import Pairer
+from src.parser import TraceReader
+
+
+def run(path: str, pair: bool) -> tuple[int, float]:
+    """Read (and pair) a trace, return the number of events and elapsed seconds."""
+    start = time.perf_counter()
+    events = 0
+
+    pairer = Pairer()
+    for batch in TraceReader().read([path]):
+        events += len(batch)
+        if pair:
+            for _ in pairer.feed(batch):
+                pass
+
+    return events, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark trace parsing and EN/EX pairing."
+    )
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=1_000_000,
+        help="number of events (default: 1M)",
+    )
+    parser.add_argument(
+        "-t", "--threads", type=int, default=64, help="number of simulated threads"
+    )
+    parser.add_argument(
+        "--target",
+        type=int,
+        default=100_000,
+        help="minimum parse+pair throughput in events/s (default: 100k)",
+    )
+    parser.add_argument("-j", "--json", help="save the results into a JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace_io_0.log")
+        write_trace(path, args.events, args.threads)
+
+        n, parse_s = run(path, pair=False)
+        _, pair_s = run(path, pair=True)
+
+    logging.info(f"parse:       {n / parse_s:,.0f} events/s ({parse_s:.2f}s)")
+    logging.info(f"parse+pair:  {n / pair_s:,.0f} events/s ({pair_s:.2f}s)")
+
+    if args.json:
+        save_results(
+            args.json,
+            "pairing",
+            {"parse_events_per_s": n / parse_s, "pair_events_per_s": n / pair_s},
+        )
+
+    if n / pair_s < args.target:
+        logging.error(f"throughput below target ({args.target:,} events/s)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# file: benchmarks/results.py
+# JSON benchmark results that can be compared across commits.
+#
+# a results file holds the environment of the run and a metrics dict per benchmark:
+#   {"env": {...}, "benchmarks": {"pairing": {"pair_events_per_s": 250000.0, ...}}}
+#
+# metric names tell the direction: *_per_s and *speedup are better when higher,
+# everything else (seconds, ratios like slowdown) is better when lower.
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HIGHER_IS_BETTER = ("_per_s", "speedup")
+
+
+def environment() -> dict:
+    """Describe the machine and the commit of a benchmark run."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(path: str, benchmark: str, metrics: dict):
+    """Merge the metrics of a benchmark into a results file.
+
+    :param path: the JSON results file (created if missing)
+    :param benchmark: benchmark name
+    :param metrics: flat dict of metric name => number
+    """
+    results = load_results(path) if os.path.isfile(path) else {"benchmarks": {}}
+    results["env"] = environment()
+    results["benchmarks"][benchmark] = metrics
+
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_results(path: str) -> dict:
+    """Read a results file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith(HIGHER_IS_BETTER)
+
+
+def main():
+    """Compare two results files: python benchmarks/results.py old.json new.json"""
+    if len(sys.argv) < 3:
+        print(f"usage: {sys.argv[0]} <old.json> <new.json> [tolerance]")
+        sys.exit(2)
+
+    old, new = load_results(sys.argv[1]), load_results(sys.argv[2])
+    tolerance = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+
+    print(f"{old['env'].get('commit')} -> {new['env'].get('commit')}")
+
+    regressions = 0
+    for name, metrics in sorted(new["benchmarks"].items()):
+        before = old["benchmarks"].get(name, {})
+        for metric, value in sorted(metrics.items()):
+            if metric not in before or not before[metric] or value is None:
+                continue
+
+            change = value / before[metric] - 1
+            worse = -change if higher_is_better(metric) else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(
+                f"{name}.{metric}: {before[metric]:.4g} -> {value:.4g} ({change:+.1%}){flag}"
+            )
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# file: benchmarks/rotate.py
+# sustained throughput of the RotateTracer stdout to file path.
+
+import argparse
+import asyncio
+import logging
+import os
+import stat
+import sys
+import tempfile
+import time
+
+from benchmarks.results import save_results
+from src.matchbox import Supervisor
+from src.tracer import RotateTracer
+
+FAKE_BPFTRACE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fake_bpftrace.py"
+)
+
+
+def install_fake_bpftrace(bin_dir: str):
+    """Put a `bpftrace` wrapper that runs fake_bpftrace.py into a directory."""
+    path = os.path.join(bin_dir, "bpftrace")
+    with open(path, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_BPFTRACE}" "$@"\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RotateTracer throughput.")
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=2_000_000,
+        help="number of lines (default: 2M)",
+    )
+    parser.add_argument(
+        "-rs",
+        "--rotate_size",
+        type=int,
+        default=16 * 1024 * 1024,
+        help="rotate size in bytes (default: 16MB)",
+    )
+    parser.add_argument("-j", "--json", help="save the results into a JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_bpftrace(tmp)
+        os.environ["PATH"] = tmp + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_BPFTRACE_EVENTS"] = str(args.events)
+
+        out = os.path.join(tmp, "out")
+        os.makedirs(out)
+
+        tracer = RotateTracer("io", "fake.bt", out)
+        tracer.with_rotate_size(args.rotate_size)
+
+        start = time.perf_counter()
+        asyncio.run(Supervisor([tracer]).run())
+        elapsed = time.perf_counter() - start
+
+        files = sorted(os.listdir(out))
+        total = 0
+        for name in files:
+            with open(os.path.join(out, name), "rb") as f:
+                data = f.read()
+            total += len(data)
+            if data and not data.endswith(b"\n"):
+                logging.error(f"{name} does not end on a line boundary")
+                sys.exit(1)
+
+    logging.info(f"wrote {total / 1e6:.1f} MB in {len(files)} files")
+    logging.info(f"throughput: {total / 1e6 / elapsed:.1f} MB/s ({elapsed:.2f}s)")
+
+    if args.json:
+        save_results(args.json, "rotate", {"write_mb_per_s": total / 1e6 / elapsed})
+
+
+if __name__ == "__main__":
+    main()
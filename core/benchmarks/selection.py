@@ -0,0 +1,94 @@
+# file: benchmarks/selection.py
+# probes attached, rendering time, and bpftrace startup for a syscall selection.
+
+import argparse
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmarks.results import save_results
+from src.scripts import select_script
+
+_PROBE = re.compile(r"^\w+:\S*$", re.M)
+
+
+def count_probes(path: str) -> int:
+    """Count the probes of a bpftrace script."""
+    with open(path) as f:
+        text = f.read()
+    return len(_PROBE.findall(text)) + text.count("\nBEGIN") + text.count("\nEND")
+
+
+def dry_run(path: str, args: list[str]) -> float:
+    """Time a bpftrace --dry-run (parse, compile, and load without attaching)."""
+    start = time.perf_counter()
+    subprocess.run(
+        ["bpftrace", "--dry-run", path] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the overhead reduction of --syscalls/--exclude."
+    )
+    parser.add_argument(
+        "-s",
+        "--script",
+        default="bpftrace/pid/io_trace.bt",
+        help="generated script (default: bpftrace/pid/io_trace.bt)",
+    )
+    parser.add_argument(
+        "--syscalls",
+        default="read,pread64,openat",
+        help="selection to compare with the full script (default: read,pread64,openat)",
+    )
+    parser.add_argument(
+        "--args",
+        nargs="*",
+        default=["1"],
+        help="script arguments for the dry-run (default: 1)",
+    )
+    parser.add_argument("-j", "--json", help="save the results into a JSON file")
+    args = parser.parse_args()
+
+    syscalls = args.syscalls.split(",")
+
+    with tempfile.TemporaryDirectory() as cache:
+        start = time.perf_counter()
+        selected = select_script(args.script, syscalls, None, cache)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        select_script(args.script, syscalls, None, cache)
+        cached = time.perf_counter() - start
+
+        print(f"rendering: {cold * 1e3:.2f} ms, cached: {cached * 1e3:.2f} ms")
+        print(f"probes: {count_probes(args.script)} -> {count_probes(selected)}")
+
+        metrics = {
+            "render_s": cold,
+            "cached_render_s": cached,
+            "probes_full": count_probes(args.script),
+            "probes_selected": count_probes(selected),
+        }
+
+        if shutil.which("bpftrace") is None:
+            print("bpftrace not found, skipping the startup measurement")
+        else:
+            full = dry_run(args.script, args.args)
+            reduced = dry_run(selected, args.args)
+            print(f"bpftrace startup: {full:.2f}s -> {reduced:.2f}s")
+            metrics.update(startup_full_s=full, startup_selected_s=reduced)
+
+    if args.json:
+        save_results(args.json, "selection", metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# file: benchmarks/suite.py
+# runs every benchmark and collects the results into one JSON file.
+#
+#   PYTHONPATH=. python benchmarks/suite.py -j results.json
+#   python benchmarks/results.py old.json results.json
+
+import argparse
+import os
+import subprocess
+import sys
+
+# benchmark => extra arguments (sizes are kept small enough to run on a laptop)
+SUITE = {
+    "pairing": ["-n", "500000", "--target", "0"],
+    "export": ["-n", "500000", "--target", "0"],
+    "rotate": ["-n", "1000000"],
+    "supervisor": ["-n", "1", "4", "16"],
+    "selection": [],
+    "overhead": ["-s", "32", "-n", "20000"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument(
+        "-j", "--json", required=True, help="JSON file to write the results"
+    )
+    parser.add_argument(
+        "-b",
+        "--benchmarks",
+        nargs="+",
+        choices=list(SUITE),
+        default=list(SUITE),
+        help="benchmarks to run (default: all)",
+    )
+    parser.add_argument(
+        "--fake",
+        action="store_true",
+        help="run the overhead benchmark with the fake bpftrace",
+    )
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    failed = []
+    for name in args.benchmarks:
+        extra = SUITE[name] + (["--fake"] if name == "overhead" and args.fake else [])
+        print(f"==> {name}", flush=True)
+
+        cmd = [sys.executable, os.path.join(here, f"{name}.py"), "-j", args.json]
+        if subprocess.run(cmd + extra).returncode != 0:
+            failed.append(name)
+
+    if failed:
+        print(f"failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# file: benchmarks/supervisor.py
+# start and stop latency of the tracer supervisor for a growing number of tracers.
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.rotate import install_fake_bpftrace
+from benchmarks.results import save_results
+from src.matchbox import Supervisor
+from src.tracer import RotateTracer
+
+
+async def run_once(out: str, count: int) -> tuple[float, float]:
+    """Start `count` tracers, stop them once all are running.
+
+    :return: (start latency, stop latency) in seconds
+    """
+    tracers = []
+    for i in range(count):
+        tracer = RotateTracer(f"t{i}", "fake.bt", out)
+        tracer.with_rotate_size()
+        tracers.append(tracer)
+    supervisor = Supervisor(tracers)
+
+    start = time.perf_counter()
+    task = asyncio.create_task(supervisor.run())
+
+    # all tracers are running once each one printed its output
+    while not all(t.loss()[0] > 0 for t in tracers):
+        await asyncio.sleep(0.001)
+    started = time.perf_counter() - start
+
+    start = time.perf_counter()
+    supervisor.stop()
+    await task
+    stopped = time.perf_counter() - start
+
+    return started, stopped
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark start/stop latency of the tracer supervisor."
+    )
+    parser.add_argument(
+        "-n",
+        "--tracers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16],
+        help="numbers of tracers to run (default: 1 2 4 8 16)",
+    )
+    parser.add_argument("-j", "--json", help="save the results into a JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_bpftrace(tmp)
+        os.environ["PATH"] = tmp + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_BPFTRACE_EVENTS"] = "1"
+        os.environ["FAKE_BPFTRACE_HOLD"] = "1"
+
+        metrics = {}
+        for count in args.tracers:
+            out = os.path.join(tmp, f"out_{count}")
+            os.makedirs(out)
+            started, stopped = asyncio.run(run_once(out, count))
+            print(f"{count:>4} tracers: start {started:.3f}s, stop {stopped:.3f}s")
+            metrics[f"start_{count}_s"] = started
+            metrics[f"stop_{count}_s"] = stopped
+
+    if args.json:
+        save_results(args.json, "supervisor", metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# file: benchmarks/synthetic.py
+# synthetic trace lines in the format made by templates/bpftrace/*.j2.
+
+import random
+
+# (op, enter args, exit args) of the generated calls
+CALLS = [
+    ("read", "fd={fd} count=4096", "ret=4096"),
+    ("write", "fd={fd} count=512", "ret=512"),
+    ("pread64", "fd={fd} count=65536", "ret=65536"),
+    ("openat", "fname=/data/file_{fd}.bin", "ret={fd}"),
+    ("statx", "fname=/data/file_{fd}.bin", "ret=0"),
+]
+
+
+def trace_lines(events: int, threads: int = 16, seed: int = 7):
+    """Yield synthetic EN/EX trace lines (encoded), interleaving threads.
+
+    :param events: number of lines to generate
+    :param threads: number of simulated threads
+    :param seed: random seed to make runs comparable
+    """
+    rnd = random.Random(seed)
+    ts = 1_000_000_000
+    pending = {}  # tid => (op, exit args)
+
+    for _ in range(events):
+        tid = 1000 + rnd.randrange(threads)
+        ts += rnd.randrange(50, 5000)
+
+        if tid in pending:
+            op, ex = pending.pop(tid)
+            yield f"{ts} {{pid=1000 tid={tid} proc=app}}{{EX {op}}}{{{ex}}}\n".encode()
+        else:
+            op, en, ex = CALLS[rnd.randrange(len(CALLS))]
+            fd = 3 + rnd.randrange(32)
+            pending[tid] = (op, ex.format(fd=fd))
+            yield f"{ts} {{pid=1000 tid={tid} proc=app}}{{EN {op}}}{{{en.format(fd=fd)}}}\n".encode()
+
+
+def write_trace(path: str, events: int, threads: int = 16):
+    """Write a synthetic trace file.
+
+    :param path: output file path
+    :param events: number of lines to generate
+    :param threads: number of simulated threads
+    """
+    with open(path, "wb") as f:
+        f.write(b"Attaching 2 probes...\n")
+        f.writelines(trace_lines(events, threads))
@@ -0,0 +1,126 @@
+# file: benchmarks/workload.py
+# synthetic I/O workload, each phase is timed and the timings are printed as JSON.
+#
+# phases: sequential and random reads, small and large writes, mmap page faults,
+# and random reads from many threads. The data file is created before the timed
+# phases so every phase runs on a warm page cache.
+
+import argparse
+import json
+import mmap
+import os
+import random
+import tempfile
+import threading
+import time
+
+PAGE = mmap.PAGESIZE
+
+
+def seq_read(path: str, size: int, block: int = 4096):
+    with open(path, "rb", buffering=0) as f:
+        while f.read(block):
+            pass
+
+
+def rand_read(path: str, size: int, ops: int, block: int = 4096, seed: int = 7):
+    rnd = random.Random(seed)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for _ in range(ops):
+            os.pread(fd, block, rnd.randrange(0, size - block))
+    finally:
+        os.close(fd)
+
+
+def write(path: str, size: int, block: int):
+    data = b"x" * block
+    with open(path, "wb", buffering=0) as f:
+        for _ in range(size // block):
+            f.write(data)
+
+
+def mmap_faults(path: str, size: int):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, size, PAGE):
+                mm[offset]
+
+
+def threaded_reads(path: str, size: int, ops: int, threads: int):
+    workers = [
+        threading.Thread(target=rand_read, args=(path, size, ops // threads, 4096, i))
+        for i in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+def run(directory: str, size: int, ops: int, threads: int) -> dict:
+    """Run all phases, return their durations in seconds."""
+    data = os.path.join(directory, "data.bin")
+    write(data, size, 1024 * 1024)
+
+    phases = {
+        "seq_read": lambda: seq_read(data, size),
+        "rand_read": lambda: rand_read(data, size, ops),
+        "small_write": lambda: write(
+            os.path.join(directory, "small.bin"), size // 8, 512
+        ),
+        "large_write": lambda: write(
+            os.path.join(directory, "large.bin"), size, 1024 * 1024
+        ),
+        "mmap_faults": lambda: mmap_faults(data, size),
+        "threaded_read": lambda: threaded_reads(data, size, ops, threads),
+    }
+
+    timings = {}
+    for name, phase in phases.items():
+        start = time.perf_counter()
+        phase()
+        timings[name] = time.perf_counter() - start
+    timings["total"] = sum(timings.values())
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a synthetic I/O workload.")
+    parser.add_argument(
+        "-s", "--size", type=int, default=64, help="data file size in MB (default: 64)"
+    )
+    parser.add_argument(
+        "-n",
+        "--ops",
+        type=int,
+        default=50_000,
+        help="random reads per phase (default: 50k)",
+    )
+    parser.add_argument(
+        "-t", "--threads", type=int, default=16, help="reader threads (default: 16)"
+    )
+    parser.add_argument(
+        "-d", "--dir", default=None, help="working directory (default: a temp dir)"
+    )
+    parser.add_argument(
+        "-j",
+        "--json",
+        default=None,
+        help="write the timings to a file (default: stdout)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        timings = run(tmp, args.size * 1024 * 1024, args.ops, args.threads)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(timings, f)
+    else:
+        print(json.dumps(timings, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import csv
+import logging
+import os
+
+from src.aggregate import read_aggregates, to_histogram
+from src.parser import trace_files
+from src.timestamp import ClockConverter
+
+
+def __wall(clock: ClockConverter, nsecs: int):
+    if clock is None or nsecs is None:
+        return ""
+    return f"{clock.to_wall(nsecs) / 1e9:.6f}"
+
+
+def export_series(input_dir: str, output_dir: str, tracer: str) -> list[str]:
+    """Write the dumps of an aggregation tracer as CSV time series.
+
+    :param input_dir: tracing output directory
+    :param output_dir: directory of the CSV files
+    :param tracer: io_aggregate or memory_aggregate
+    :return: the written files
+    """
+    clock = ClockConverter.load(input_dir)
+
+    counters_path = os.path.join(output_dir, f"{tracer}_counters.csv")
+    latency_path = os.path.join(output_dir, f"{tracer}_latency.csv")
+
+    with open(counters_path, "w", newline="") as cf, open(
+        latency_path, "w", newline=""
+    ) as lf:
+        counters = csv.writer(cf)
+        counters.writerow(
+            ["start", "end", "wall", "pid", "op", "fd", "count", "bytes", "errors"]
+        )
+        latency = csv.writer(lf)
+        latency.writerow(
+            ["start", "end", "wall", "pid", "op", "count", "p50", "p99", "max"]
+        )
+
+        dumps = 0
+        for dump in read_aggregates(input_dir, tracer):
+            wall = __wall(clock, dump.end)
+            for s in dump.samples:
+                counters.writerow(
+                    [s.start, s.end, wall, s.pid, s.op, s.fd]
+                    + [s.count, s.bytes, s.errors]
+                )
+            for s in dump.latencies:
+                h = to_histogram(s.buckets)
+                latency.writerow(
+                    [s.start, s.end, wall, s.pid, s.op, h.count]
+                    + [h.percentile(50), h.percentile(99), h.max]
+                )
+            dumps += 1
+
+    logging.info(f"{tracer}: {dumps} dumps")
+    return [counters_path, latency_path]
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Convert the dumps of FLAP aggregation mode (-m aggregate) into CSV time series."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (trace_<tracer>_aggregate_<n>.log files)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="series",
+        help="Folder path to write the CSV files (default: series)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    os.makedirs(args.out, exist_ok=True)
+
+    written = []
+    tracers = trace_files(args.input)
+    for tracer in ("io_aggregate", "memory_aggregate"):
+        if tracer not in tracers:
+            continue
+        written += export_series(args.input, args.out, tracer)
+    logging.info(f"exported: {written}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import sys
 
 import src.handlers as hd
 from src.matchbox import extinguish_tracing, ignite_tracing
+from src.options import add_tracer_arguments, tracer_options
+from src.targets import Target
 from src.utils import must_support_bpftrace
 
 
@@ -13,23 +15,29 @@ def process(args: argparse.Namespace):
     # list of tracers (type: src/tracer/Tracer)
     tracers = []
 
+    # options shared by all tracers
+    options = tracer_options(args)
+
     # call handler based on user input to get the tracers
     if args.execute:
-        tracers = hd.handle_execute(
-            args.out, args.execute, args.rotate, args.rotate_size
-        )
+        tracers = hd.handle_execute(args.out, args.execute, options)
     elif args.pid:
-        tracers = hd.handle_pid(args.out, args.pid, args.rotate, args.rotate_size)
+        tracers = hd.handle_pid(args.out, args.pid, options)
     elif args.command:
-        tracers = hd.handle_command(
-            args.out, args.command, args.rotate, args.rotate_size
-        )
+        tracers = hd.handle_command(args.out, args.command, options)
     elif args.cgroup and args.filter_command:
         tracers = hd.handle_cgroup_and_command(
-            args.out, args.cgroup, args.filter_command, args.rotate, args.rotate_size
+            args.out, args.cgroup, args.filter_command, options
         )
     elif args.cgroup:
-        tracers = hd.handle_cgroup(args.out, args.cgroup, args.rotate, args.rotate_size)
+        tracers = hd.handle_cgroup(args.out, args.cgroup, options)
+    elif args.cgroups:
+        targets = [
+            Target(cgid, os.path.join(args.out, cgid), comm=args.filter_command)
+            for cgid in map(str.strip, args.cgroups.split(","))
+            if cgid
+        ]
+        tracers = hd.handle_multi(args.out, targets, options)
     else:
         logging.error("no input provided!")
         sys.exit(1)
@@ -39,7 +47,7 @@ def process(args: argparse.Namespace):
     signal.signal(signal.SIGTERM, extinguish_tracing(tracers=tracers))
 
     # start tracers
-    ignite_tracing(output_dir=args.out, tracers=tracers)
+    ignite_tracing(output_dir=args.out, tracers=tracers, policy=options.policy)
 
 
 def init_vars(args: argparse.Namespace):
@@ -74,12 +82,17 @@ def main():
         "--cgroup",
         help="trace processes by their Cgroup ID (must be a valid cgroup)",
     )
+    group.add_argument(
+        "-cgs",
+        "--cgroups",
+        help="trace several comma separated Cgroup IDs with one bpftrace per tracer (outputs go to <out>/<cgroup id>)",
+    )
 
     # optional arguments
     parser.add_argument(
         "-fc",
         "--filter_command",
-        help="Filter based on a command in cgroup tracing (only works with -cg|--cgroup)",
+        help="Filter based on a command in cgroup tracing (only works with -cg|--cgroup and -cgs|--cgroups)",
     )
     parser.add_argument(
         "-o",
@@ -99,19 +112,7 @@ def main():
         action="store_true",
         help="Enable debug mode (print debug messages)",
     )
-    parser.add_argument(
-        "-r",
-        "--rotate",
-        action="store_true",
-        help="Enable log rotation (useful to break large tracing log output)",
-    )
-    parser.add_argument(
-        "-rs",
-        "--rotate_size",
-        type=int,
-        default=100 * 1024 * 1024,
-        help="Setting the rotate size (default is 100MB)",
-    )
+    add_tracer_arguments(parser)
 
     # parse the arguments
     args = parser.parse_args()
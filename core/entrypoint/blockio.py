@@ -0,0 +1,76 @@
+import argparse
+import json
+import logging
+import os
+
+from src.blockio import correlate_block_io
+from src.mappings import PAGE_SIZE
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Correlate the page cache and block events of FLAP block traces with the syscalls, per file."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (traced with --block)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="blockio",
+        help="Folder path to write blockio.json (default: blockio)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        default="io",
+        help="Tracer with the syscall events (default: io)",
+    )
+    parser.add_argument(
+        "-b",
+        "--block_tracer",
+        default="block",
+        help="Tracer with the page cache and block events (default: block)",
+    )
+    parser.add_argument(
+        "-ps",
+        "--page_size",
+        type=int,
+        default=PAGE_SIZE,
+        help=f"Page size of the traced host (default: {PAGE_SIZE})",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    correlator = correlate_block_io(
+        args.input, args.tracer, args.block_tracer, args.page_size
+    )
+    logging.info(f"block requests attributed by {correlator.attributed}")
+
+    os.makedirs(args.out, exist_ok=True)
+    summary_path = os.path.join(args.out, "blockio.json")
+    with open(summary_path, "w") as f:
+        json.dump(correlator.summary(), f, indent=2)
+
+    logging.info(f"exported: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,12 @@ import logging
 import os
 import signal
 import sys
+import time
 
 import src.handlers as hd
 from src.containers import find_pod_cgroup
 from src.matchbox import extinguish_tracing, ignite_tracing
+from src.options import add_tracer_arguments, tracer_options
 from src.utils import must_support_bpftrace
 
 
@@ -18,8 +20,13 @@ def process(args: argparse.Namespace):
     pod = args.pod
     container = args.container
 
+    # options shared by all tracers
+    options = tracer_options(args)
+
     # find the cgroup
+    start = time.monotonic()
     cgroup = find_pod_cgroup(namespace=ns, pod=pod, container=container)
+    resolve = time.monotonic() - start
     if len(cgroup) == 0:
         logging.error("empty cgroup returned!")
         sys.exit(1)
@@ -31,18 +38,23 @@ def process(args: argparse.Namespace):
             f"tracing {args.container}/{args.filter_command} in {args.namespace}/{args.pod}"
         )
         tracers = hd.handle_cgroup_and_command(
-            args.out, cgroup, args.filter_command, args.rotate, args.rotate_size
+            args.out, cgroup, args.filter_command, options
         )
     else:
         logging.info(f"tracing {args.container} in {args.namespace}/{args.pod}")
-        tracers = hd.handle_cgroup(args.out, cgroup, args.rotate, args.rotate_size)
+        tracers = hd.handle_cgroup(args.out, cgroup, options)
 
     # set the termination handlers
     signal.signal(signal.SIGINT, extinguish_tracing(tracers=tracers))
     signal.signal(signal.SIGTERM, extinguish_tracing(tracers=tracers))
 
     # start tracers
-    ignite_tracing(output_dir=args.out, tracers=tracers)
+    ignite_tracing(
+        output_dir=args.out,
+        tracers=tracers,
+        policy=options.policy,
+        metadata={"cgroup": cgroup, "resolve_time": round(resolve, 6)},
+    )
 
 
 def init_vars(args: argparse.Namespace):
@@ -89,19 +101,7 @@ def main():
         action="store_true",
         help="Enable debug mode (print debug messages)",
     )
-    parser.add_argument(
-        "-r",
-        "--rotate",
-        action="store_true",
-        help="Enable log rotation (useful to break large tracing log output)",
-    )
-    parser.add_argument(
-        "-rs",
-        "--rotate_size",
-        type=int,
-        default=100 * 1024 * 1024,
-        help="Setting the rotate size (default is 100MB)",
-    )
+    add_tracer_arguments(parser)
 
     # parse the arguments
     args = parser.parse_args()
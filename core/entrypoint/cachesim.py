@@ -0,0 +1,179 @@
+import argparse
+import csv
+import logging
+import os
+import sys
+
+from src.cachesim import (
+    DEFAULT_POINTS,
+    POLICIES,
+    find_containers,
+    simulate_container,
+)
+from src.mappings import PAGE_SIZE
+from src.plot import line_plot
+
+COLUMNS = ["scope", "name", "policy", "pages", "bytes", "accesses", "hit_ratio"]
+
+
+def __policies(value: str) -> list[str]:
+    policies = [item.strip().lower() for item in value.split(",") if item.strip()]
+    for policy in policies:
+        if policy not in POLICIES:
+            raise argparse.ArgumentTypeError(
+                f"unknown policy {policy}, use {', '.join(POLICIES)}"
+            )
+    return policies
+
+
+def __series(rows: list[dict], key: str) -> dict[str, list[tuple[int, float]]]:
+    series = {}
+    for row in rows:
+        series.setdefault(row[key], []).append((row["bytes"], row["hit_ratio"]))
+    return series
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Simulate page caches on the reads of FLAP io traces and plot hit ratio against cache size."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory, or a daemon output directory with a sub-directory per container",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="cachesim",
+        help="Folder path to write hit_ratio.csv and the plots (default: cachesim)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        default="io",
+        help="Tracer with the read and write events (default: io)",
+    )
+    parser.add_argument(
+        "-p",
+        "--policies",
+        type=__policies,
+        default=list(POLICIES),
+        help=f"Comma separated cache policies (default: {','.join(POLICIES)})",
+    )
+    parser.add_argument(
+        "-n",
+        "--points",
+        type=int,
+        default=DEFAULT_POINTS,
+        help=f"Cache sizes per curve, from one page to the working set (default: {DEFAULT_POINTS})",
+    )
+    parser.add_argument(
+        "-ps",
+        "--page_size",
+        type=int,
+        default=PAGE_SIZE,
+        help=f"Page size of the traced host (default: {PAGE_SIZE})",
+    )
+    parser.add_argument(
+        "-w",
+        "--writes",
+        action="store_true",
+        help="Count the written pages as accesses too",
+    )
+    parser.add_argument(
+        "-m",
+        "--min_accesses",
+        type=int,
+        default=1,
+        help="Skip the files with fewer page accesses (default: 1)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=8,
+        help="Files plotted per container, the most accessed first (default: 8)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    containers = find_containers(args.input, args.tracer)
+    if not containers:
+        logging.error(f"no {args.tracer} trace files in {args.input}")
+        sys.exit(1)
+
+    os.makedirs(args.out, exist_ok=True)
+    table_path = os.path.join(args.out, "hit_ratio.csv")
+    exported = [table_path]
+    with open(table_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+
+        for name, output_dir in containers.items():
+            container, files = simulate_container(
+                output_dir, name, args.tracer, args.page_size, args.writes
+            )
+            if not container.stack.accesses:
+                continue
+
+            rows = container.rows(args.policies, args.points, args.page_size)
+            writer.writerows(rows)
+            plot_path = os.path.join(args.out, f"{name}.svg")
+            line_plot(
+                plot_path,
+                __series(rows, "policy"),
+                f"{name}: page cache hit ratio",
+                "cache size (bytes)",
+                "hit ratio",
+                xlog=True,
+                ylim=(0, 1),
+            )
+            exported.append(plot_path)
+
+            ranked = sorted(
+                files.values(), key=lambda c: c.stack.accesses, reverse=True
+            )
+            plotted = []
+            for i, curve in enumerate(ranked):
+                if curve.stack.accesses < args.min_accesses:
+                    break
+                rows = curve.rows(args.policies, args.points, args.page_size)
+                writer.writerows(rows)
+                if i < args.top:
+                    plotted.extend(
+                        row for row in rows if row["policy"] == args.policies[0]
+                    )
+
+            if plotted:
+                plot_path = os.path.join(args.out, f"{name}_files.svg")
+                line_plot(
+                    plot_path,
+                    __series(plotted, "name"),
+                    f"{name}: {args.policies[0]} hit ratio of the most read files",
+                    "cache size (bytes)",
+                    "hit ratio",
+                    xlog=True,
+                    ylim=(0, 1),
+                )
+                exported.append(plot_path)
+
+    logging.info(f"exported: {exported}")
+
+
+if __name__ == "__main__":
+    main()
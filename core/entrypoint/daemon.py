@@ -0,0 +1,158 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+
+import src.handlers as hd
+from src.daemon import DEFAULT_SOCKET, Daemon, request
+from src.matchbox import extinguish_tracing, ignite_tracing
+from src.options import add_tracer_arguments, tracer_options
+from src.utils import must_support_bpftrace
+
+
+def serve(args: argparse.Namespace):
+    """Run the tracers of the node and serve the control API."""
+    must_support_bpftrace()
+    os.environ["BPFTRACE_MAX_STRLEN"] = args.max_str_len
+
+    # options shared by all tracers
+    options = tracer_options(args)
+
+    # one multi-target tracer per script, sessions are added at runtime
+    tracers = hd.handle_multi(args.out, [], options)
+    daemon = Daemon(
+        args.out,
+        tracers,
+        socket_path=args.socket,
+        crictl=args.crictl,
+        resolve_timeout=args.resolve_timeout,
+    )
+
+    # set the termination handlers
+    signal.signal(signal.SIGINT, extinguish_tracing(tracers=tracers))
+    signal.signal(signal.SIGTERM, extinguish_tracing(tracers=tracers))
+
+    # start tracers
+    ignite_tracing(
+        output_dir=args.out,
+        tracers=tracers,
+        policy=options.policy,
+        services=[daemon.serve],
+    )
+
+
+def call(args: argparse.Namespace):
+    """Send a request to a running daemon and print the response."""
+    if args.action == "stop":
+        code, response = request(args.socket, "POST", "/stop")
+    elif args.action == "status" and not args.container:
+        code, response = request(args.socket, "GET", "/status")
+    else:
+        session = f"/sessions/{args.namespace}/{args.pod}/{args.container}"
+        if args.action == "add":
+            payload = {
+                "namespace": args.namespace,
+                "pod": args.pod,
+                "container": args.container,
+                "filter_command": args.filter_command,
+            }
+            code, response = request(args.socket, "POST", "/sessions", payload)
+        elif args.action == "remove":
+            code, response = request(args.socket, "DELETE", session)
+        else:
+            code, response = request(args.socket, "GET", session)
+
+    print(json.dumps(response, indent=2))
+    if code >= 400:
+        sys.exit(1)
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Node tracing daemon, traces many containers with one set of bpftrace processes."
+    )
+    parser.add_argument(
+        "-s",
+        "--socket",
+        default=DEFAULT_SOCKET,
+        help=f"Control API Unix socket (default: {DEFAULT_SOCKET})",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    # daemon
+    server = actions.add_parser("serve", help="Run the daemon")
+    server.add_argument(
+        "-o",
+        "--out",
+        default="logs",
+        help="Folder path to export the tracing logs, a folder per session (default: logs)",
+    )
+    server.add_argument(
+        "-mxsl",
+        "--max_str_len",
+        default="150",
+        help="bpf MAX_STRLEN in bytes (default: 150)",
+    )
+    server.add_argument(
+        "--crictl",
+        default="crictl",
+        help="crictl binary, e.g. a stub for local tests (default: crictl)",
+    )
+    server.add_argument(
+        "--resolve_timeout",
+        type=float,
+        default=300,
+        help="Seconds to wait for a container to start (default: 300)",
+    )
+    add_tracer_arguments(server)
+
+    # client
+    for action in ("add", "remove", "status"):
+        client = actions.add_parser(action, help=f"{action.capitalize()} a session")
+        client.add_argument(
+            "-ns",
+            "--namespace",
+            required=action != "status",
+            help="Kubernetes namespace of the Pod",
+        )
+        client.add_argument("-p", "--pod", required=action != "status", help="Pod name")
+        client.add_argument(
+            "-c",
+            "--container",
+            required=action != "status",
+            help="Container name inside the pod (status of the daemon if omitted)",
+        )
+        if action == "add":
+            client.add_argument(
+                "-fc",
+                "--filter_command",
+                help="Specific command to trace inside the container",
+            )
+    actions.add_parser("stop", help="Stop the daemon")
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    if args.action == "serve":
+        logging.info(f"configs:\n\t{vars(args)}")
+        serve(args)
+    else:
+        call(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import logging
+
+from src.export import export_trace
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Export FLAP tracing logs into a columnar format (Parquet or NumPy .npz)."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (trace_<tracer>_<n>.log files)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="export",
+        help="Folder path to write the exported files (default: export)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["auto", "parquet", "npz"],
+        default="auto",
+        help="Output format (default: parquet if pyarrow is installed, otherwise npz)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        action="append",
+        help="Tracer to export, can be repeated (default: all tracers)",
+    )
+    parser.add_argument(
+        "-bs",
+        "--batch_size",
+        type=int,
+        default=64 * 1024,
+        help="Number of records per batch (default: 65536)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    exported = export_trace(
+        args.input, args.out, args.format, args.tracer, args.batch_size
+    )
+    logging.info(f"exported: {exported}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import csv
+import json
+import logging
+import os
+
+from src.mappings import PAGE_SIZE, attribute_faults
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Attribute the page faults of FLAP memory traces to files and pages."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (trace_memory_<n>.log files)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="faults",
+        help="Folder path to write faults.json and heatmap.csv (default: faults)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        default="memory",
+        help="Tracer with the mmap and page fault events (default: memory)",
+    )
+    parser.add_argument(
+        "-ps",
+        "--page_size",
+        type=int,
+        default=PAGE_SIZE,
+        help=f"Page size of the traced host (default: {PAGE_SIZE})",
+    )
+    parser.add_argument(
+        "-tb",
+        "--time_bin",
+        type=float,
+        default=1.0,
+        help="Seconds per heatmap row (default: 1)",
+    )
+    parser.add_argument(
+        "-pb",
+        "--page_bin",
+        type=int,
+        default=256,
+        help="Pages per heatmap column (default: 256)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    resolver = attribute_faults(
+        args.input,
+        args.tracer,
+        args.page_size,
+        int(args.time_bin * 1e9),
+        args.page_bin,
+    )
+
+    os.makedirs(args.out, exist_ok=True)
+    summary_path = os.path.join(args.out, "faults.json")
+    with open(summary_path, "w") as f:
+        json.dump(resolver.summary(), f, indent=2)
+
+    heatmap_path = os.path.join(args.out, "heatmap.csv")
+    with open(heatmap_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "start", "first_page", "faults"])
+        for path, summary in sorted(resolver.files.items()):
+            for start, page, count in summary.heatmap():
+                writer.writerow([path, start, page, count])
+
+    logging.info(f"exported: {[summary_path, heatmap_path]}")
+
+
+if __name__ == "__main__":
+    main()
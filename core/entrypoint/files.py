@@ -0,0 +1,71 @@
+import argparse
+import json
+import logging
+import os
+
+from src.fdtable import summarize_files
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Summarize the syscalls of FLAP io traces per file."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="files",
+        help="Folder path to write files.json and latency.json (default: files)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        default="io",
+        help="Tracer to summarize (default: io)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    resolver = summarize_files(args.input, args.tracer)
+
+    os.makedirs(args.out, exist_ok=True)
+    summary_path = os.path.join(args.out, "files.json")
+    with open(summary_path, "w") as f:
+        json.dump(resolver.summary(), f, indent=2)
+
+    logging.info(f"exported: {summary_path}")
+
+    # the latency of every op over all files, and what the pairing dropped
+    pairer = resolver.pairer
+    latency_path = os.path.join(args.out, "latency.json")
+    with open(latency_path, "w") as f:
+        json.dump(
+            {"ops": pairer.latencies.summary(), "pairing": pairer.stats.as_dict()},
+            f,
+            indent=2,
+        )
+
+    logging.info(f"exported: {latency_path}")
+
+
+if __name__ == "__main__":
+    main()
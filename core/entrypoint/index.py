@@ -0,0 +1,52 @@
+import argparse
+import logging
+
+from src.index import DEFAULT_INTERVAL, index_dir
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Write the sidecar index of every trace segment of FLAP tracing logs."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (trace_<tracer>_<n>.log files)",
+    )
+    parser.add_argument(
+        "-n",
+        "--interval",
+        type=int,
+        default=DEFAULT_INTERVAL,
+        help=f"Events between two offset checkpoints (default: {DEFAULT_INTERVAL})",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Index the segments that have a valid index again",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    count = index_dir(args.input, args.interval, args.force)
+    logging.info(f"indexed segments: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import logging
+import os
+
+from src.patterns import classify_patterns
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Classify the file access patterns of FLAP io traces (sequential, strided, reverse, random)."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (trace_io_<n>.log files)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="patterns",
+        help="Folder path to write patterns.json (default: patterns)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        default="io",
+        help="Tracer with the read and write events (default: io)",
+    )
+    parser.add_argument(
+        "-m",
+        "--min_requests",
+        type=int,
+        default=2,
+        help="Skip the streams with fewer accesses (default: 2)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    classifier = classify_patterns(args.input, args.tracer)
+
+    os.makedirs(args.out, exist_ok=True)
+    summary_path = os.path.join(args.out, "patterns.json")
+    with open(summary_path, "w") as f:
+        json.dump(classifier.summary(args.min_requests), f, indent=2)
+
+    logging.info(f"exported: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+from itertools import islice
+
+from src.export import resolve_format, write_batches
+from src.parser import TraceReader
+from src.query import DEFAULT_CHUNK_SIZE, Query, run_query
+from src.timestamp import ClockConverter
+
+
+def __list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def __ints(value: str) -> list[int]:
+    return [int(item) for item in __list(value)]
+
+
+def __timestamp(value: str, clock: ClockConverter) -> int:
+    """Convert nsecs or an ISO 8601 wall clock time into bpftrace nsecs."""
+    if value is None or value.isdigit():
+        return int(value) if value is not None else None
+    if clock is None:
+        logging.error("wall clock times need the clock anchors of the trace")
+        sys.exit(1)
+    try:
+        wall = datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        logging.error(f"invalid time {value}, use nsecs or an ISO 8601 date")
+        sys.exit(1)
+    return clock.to_mono(int(wall * 1e9))
+
+
+def __merge(values: list[list]) -> set:
+    if not values:
+        return None
+    return {item for items in values for item in items}
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Query FLAP tracing logs in parallel and print or export the matching events."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (trace_<tracer>_<n>.log files)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        action="append",
+        help="Tracer to query, can be repeated (default: all event tracers)",
+    )
+    parser.add_argument(
+        "-p",
+        "--pid",
+        type=__ints,
+        action="append",
+        help="Comma separated process ids, can be repeated",
+    )
+    parser.add_argument(
+        "--tid",
+        type=__ints,
+        action="append",
+        help="Comma separated thread ids, can be repeated",
+    )
+    parser.add_argument(
+        "-c",
+        "--comm",
+        type=__list,
+        action="append",
+        help="Comma separated command names, can be repeated",
+    )
+    parser.add_argument(
+        "--op",
+        type=__list,
+        action="append",
+        help="Comma separated operations, e.g. read,pread64, can be repeated",
+    )
+    parser.add_argument(
+        "--path",
+        action="append",
+        help="File path or shell pattern, fds are resolved through open/dup/close, can be repeated",
+    )
+    parser.add_argument(
+        "-s",
+        "--start",
+        help="First timestamp, bpftrace nsecs or an ISO 8601 date (default: beginning)",
+    )
+    parser.add_argument(
+        "-e",
+        "--end",
+        help="Last timestamp, bpftrace nsecs or an ISO 8601 date (default: end)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "-cs",
+        "--chunk_size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+        help=f"Megabytes scanned per worker task (default: {DEFAULT_CHUNK_SIZE // (1024 * 1024)})",
+    )
+    parser.add_argument(
+        "-l",
+        "--limit",
+        type=int,
+        help="Stop after this number of events (default: all)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        help="Folder path to export the matching events into instead of printing them",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["auto", "parquet", "npz"],
+        default="auto",
+        help="Export format (default: parquet if pyarrow is installed, otherwise npz)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    clock = ClockConverter.load(args.input)
+    query = Query(
+        pids=__merge(args.pid),
+        tids=__merge(args.tid),
+        comms=__merge(args.comm),
+        ops=__merge(args.op),
+        paths=args.path,
+        start=__timestamp(args.start, clock),
+        end=__timestamp(args.end, clock),
+    )
+
+    events = run_query(
+        args.input,
+        query,
+        args.tracer,
+        args.jobs,
+        args.chunk_size * 1024 * 1024,
+        args.limit,
+    )
+    lines = (line for _, _, line in islice(events, args.limit))
+
+    if args.out is None:
+        out = sys.stdout.buffer
+        for line in lines:
+            out.write(line + b"\n")
+        out.flush()
+        return
+
+    fmt = resolve_format(args.format)
+    os.makedirs(args.out, exist_ok=True)
+    target = os.path.join(args.out, "query" if fmt == "parquet" else "query.npz")
+
+    reader = TraceReader()
+    rows = write_batches(reader.parse(lines), reader.strings, target, fmt, clock)
+    logging.info(f"exported {rows} events to {target}")
+
+
+if __name__ == "__main__":
+    main()
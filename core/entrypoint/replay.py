@@ -0,0 +1,104 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from src.replay import FAST, SCALED, TIMINGS, Replayer, build_workload
+
+
+def main():
+    # create an argument parser
+    parser = argparse.ArgumentParser(
+        description="Replay the I/O calls of a FLAP trace against a scratch directory and report throughput and latencies."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="Tracing output directory (written by app.py or boot.py)",
+    )
+    parser.add_argument(
+        "-s",
+        "--scratch",
+        required=True,
+        help="Directory on the filesystem to benchmark, the traced paths are recreated inside it",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default="replay",
+        help="Folder path to write replay.json (default: replay)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tracer",
+        default="io",
+        help="Tracer to replay, combined includes mmap and page faults (default: io)",
+    )
+    parser.add_argument(
+        "--timing",
+        choices=TIMINGS,
+        default=FAST,
+        help="Keep the traced timing, scale it by --speed, or replay as fast as possible (default: afap)",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=2.0,
+        help="Speed-up factor of the scaled timing (default: 2)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Replay threads (default: one per traced thread)",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (print debug messages)",
+    )
+
+    # parse the arguments
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    if args.timing == SCALED and args.speed <= 0:
+        logging.error("--speed must be positive")
+        sys.exit(1)
+
+    workload = build_workload(args.input, args.tracer)
+    if not workload.actions():
+        logging.error(f"no calls to replay in the {args.tracer} trace of {args.input}")
+        sys.exit(1)
+
+    os.makedirs(args.scratch, exist_ok=True)
+    replayer = Replayer(workload, args.scratch, args.timing, args.speed, args.jobs)
+    report = replayer.run()
+
+    for name in ("original", "replay"):
+        run = report[name]
+        logging.info(
+            f"{name}: {run['duration']:.3f}s, "
+            f"read {(run['read_bytes_per_sec'] or 0) / 1e6:.1f} MB/s, "
+            f"write {(run['write_bytes_per_sec'] or 0) / 1e6:.1f} MB/s, "
+            f"{run['calls_per_sec'] or 0:.0f} calls/s"
+        )
+
+    os.makedirs(args.out, exist_ok=True)
+    report_path = os.path.join(args.out, "replay.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    logging.info(f"exported: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import re
+from collections import namedtuple
+
+from src.histogram import LogHistogram
+from src.parser import read_lines, trace_files
+
+# aggregation scripts print "<nsecs> DUMP" and then print() their maps
+_DUMP = re.compile(rb"^(\d+) DUMP$")
+_VALUE = re.compile(rb"^@(\w+)\[(.*)\]: (-?\d+)$")
+_HIST = re.compile(rb"^@(\w+)\[(.*)\]:$")
+_BUCKET = re.compile(rb"^\[(\d+[KMGTPE]?)(?:, (\d+[KMGTPE]?))?[\])]\s+(\d+) \|")
+
+_UNITS = {
+    "K": 1 << 10,
+    "M": 1 << 20,
+    "G": 1 << 30,
+    "T": 1 << 40,
+    "P": 1 << 50,
+    "E": 1 << 60,
+}
+
+COUNTERS = ("count", "bytes", "errors")
+
+# one row per (pid, op, fd) and dump window
+Sample = namedtuple(
+    "Sample", ["start", "end", "pid", "op", "fd", "count", "bytes", "errors"]
+)
+
+# log2 latency histogram per (pid, op) and dump window, buckets are (low, high, count)
+LatencySample = namedtuple("LatencySample", ["start", "end", "pid", "op", "buckets"])
+
+Dump = namedtuple("Dump", ["start", "end", "samples", "latencies"])
+
+
+def _size(value: bytes) -> int:
+    text = value.decode()
+    if text[-1] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
+
+
+def _key(raw: bytes) -> tuple:
+    """Split a printed map key ("1234, read, 3") into typed fields."""
+    fields = raw.decode(errors="replace").split(", ")
+    return tuple(int(f) if f.lstrip("-").isdigit() else f for f in fields)
+
+
+class DumpParser:
+    """DumpParser turns the periodic map dumps of the aggregation scripts into time-series records.
+
+    Each "<nsecs> DUMP" marker opens a window that ends at that timestamp and
+    starts at the previous marker (None for the first one), the maps printed
+    after the marker belong to that window.
+    """
+
+    def __init__(self):
+        self._start = None
+        self._end = None
+        self._counters = {}  # (pid, op, fd) => {counter: value}
+        self._latencies = {}  # (pid, op) => [(low, high, count)]
+        self._hist = None  # buckets of the histogram being read
+
+    def feed(self, lines):
+        """Parse output lines, yields a Dump when a window is complete.
+
+        :param lines: iterable of raw output lines (bytes)
+        """
+        for line in lines:
+            line = line.rstrip(b"\n")
+
+            if self._hist is not None:
+                m = _BUCKET.match(line)
+                if m:
+                    low = _size(m.group(1))
+                    high = _size(m.group(2)) if m.group(2) else low + 1
+                    self._hist.append((low, high, int(m.group(3))))
+                    continue
+                self._hist = None
+
+            if not line.startswith(b"@"):
+                m = _DUMP.match(line)
+                if m:
+                    if self._end is not None:
+                        yield self.__dump()
+                    self._start, self._end = self._end, int(m.group(1))
+                continue
+
+            if self._end is None:
+                continue  # maps printed by bpftrace outside of a dump
+
+            m = _VALUE.match(line)
+            if m:
+                name = m.group(1).decode()
+                if name in COUNTERS:
+                    key = _key(m.group(2))
+                    self._counters.setdefault(key, {})[name] = int(m.group(3))
+                continue
+
+            m = _HIST.match(line)
+            if m and m.group(1) == b"latency":
+                self._hist = self._latencies.setdefault(_key(m.group(2)), [])
+
+    def flush(self):
+        """Yield the last window."""
+        if self._end is not None and (self._counters or self._latencies):
+            yield self.__dump()
+
+    def __dump(self) -> Dump:
+        samples = [
+            Sample(
+                self._start,
+                self._end,
+                *key,
+                values.get("count", 0),
+                values.get("bytes", 0),
+                values.get("errors", 0),
+            )
+            for key, values in self._counters.items()
+        ]
+        latencies = [
+            LatencySample(self._start, self._end, *key, buckets)
+            for key, buckets in self._latencies.items()
+        ]
+
+        self._counters = {}
+        self._latencies = {}
+        self._hist = None
+
+        return Dump(self._start, self._end, samples, latencies)
+
+
+def to_histogram(buckets: list[tuple[int, int, int]]) -> LogHistogram:
+    """Load log2 buckets into a LogHistogram (values are the bucket lower bounds).
+
+    :param buckets: (low, high, count) tuples
+    """
+    h = LogHistogram()
+    for low, _, count in buckets:
+        h.record(low, count)
+    return h
+
+
+def read_aggregates(output_dir: str, tracer: str = "io_aggregate"):
+    """Parse the dumps of an aggregation tracer.
+
+    :param output_dir: tracing output directory
+    :param tracer: io_aggregate or memory_aggregate
+    :return: iterator of Dump
+    """
+    parser = DumpParser()
+    for path in trace_files(output_dir).get(tracer, []):
+        yield from parser.feed(read_lines(path))
+    yield from parser.flush()
@@ -0,0 +1,68 @@
+import logging
+
+from src.tracer import Tracer
+
+RB_PAGES_ENV = "BPFTRACE_PERF_RB_PAGES"
+DEFAULT_RB_PAGES = 64  # bpftrace default perf ring buffer pages per CPU
+
+
+class BackpressurePolicy:
+    """BackpressurePolicy restarts tracers that lose too many events with cheaper settings.
+
+    The perf ring buffer is enlarged first, then the sampling gets coarser.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.01,
+        window: float = 10,
+        max_rb_pages: int = 4096,
+        max_sample_rate: int = 64,
+        growth: int = 4,
+    ):
+        """BackpressurePolicy constructor.
+
+        :param threshold: maximum lost/(lost + recorded) events ratio over a window
+        :param window: seconds between two checks
+        :param max_rb_pages: largest perf ring buffer (pages per CPU)
+        :param max_sample_rate: coarsest 1-in-N sampling
+        :param growth: factor applied to the ring buffer or to the sampling rate
+        """
+        self.threshold = threshold
+        self.window = window
+        self.max_rb_pages = max_rb_pages
+        self.max_sample_rate = max_sample_rate
+        self.growth = growth
+
+    def exceeded(self, events: int, lost: int) -> bool:
+        """Check the loss ratio of a window.
+
+        :param events: recorded events in the window
+        :param lost: lost events in the window
+        """
+        return lost > 0 and lost / (lost + events) > self.threshold
+
+    def adapt(self, tracer: Tracer) -> bool:
+        """Change the tracer settings for its next run.
+
+        :param tracer: a tracer over the threshold
+        :return: False when there is nothing left to adapt
+        """
+        pages = int(tracer.env(RB_PAGES_ENV, DEFAULT_RB_PAGES))
+        if pages < self.max_rb_pages:
+            pages = min(pages * self.growth, self.max_rb_pages)
+            tracer.with_env({RB_PAGES_ENV: str(pages)})
+            tracer.adapted(f"perf ring buffer to {pages} pages", rb_pages=pages)
+            return True
+
+        rate, by = tracer.sampling()
+        if rate < self.max_sample_rate:
+            rate = min(rate * self.growth, self.max_sample_rate)
+            tracer.with_sampling(rate, by)
+            tracer.adapted(f"sampling to 1/{rate} by {by}", sample_rate=rate)
+            return True
+
+        logging.warning(
+            f"[{tracer.name()}] losing events at the largest buffer and coarsest sampling"
+        )
+        return False
@@ -0,0 +1,340 @@
+import logging
+from bisect import bisect_right
+
+from src.fdtable import (
+    OPEN_OPS,
+    READ_OPS,
+    SYNC_OPS,
+    TRANSFER_OPS,
+    WRITE_OPS,
+    FileResolver,
+)
+from src.mappings import PAGE_SIZE
+from src.pairing import FLAG_ONESHOT, LatencyStats, Pairer, pair_events
+from src.parser import read_trace
+from src.patterns import POSITIONED_OPS
+
+# path of the block requests that are neither made during a syscall on a file
+# nor by the writeback of a known inode (page faults, metadata, journal, ...)
+UNATTRIBUTED = "<unattributed>"
+
+# calls that can add pages to the page cache, dirty them, or queue bios in the
+# thread, the others (stat, open, fork, io_uring requests run by kernel workers,
+# ...) have no syscall window
+WINDOW_OPS = (
+    READ_OPS + WRITE_OPS + TRANSFER_OPS + SYNC_OPS + ("fadvise64", "io_uring_enter")
+)
+
+
+def unknown_inode(ino: int, dev: int = None) -> str:
+    """Name of an inode that no traced syscall resolved to a path.
+
+    :param ino: inode number
+    :param dev: device of the inode (None if unknown)
+    """
+    return f"<ino {ino}>" if dev is None else f"<dev {dev} ino {ino}>"
+
+
+def rwbs_direction(rwbs: str) -> str:
+    """Return read, write, or other (flush, discard) for the rwbs flags of a block request.
+
+    :param rwbs: block request flags, e.g. R, RA, WS, FWFS, D
+    """
+    if "R" in rwbs:
+        return "read"
+    if "W" in rwbs:
+        return "write"
+    return "other"
+
+
+class FileIO:
+    """FileIO holds the page cache and device statistics of a single file.
+
+    The pages read into the page cache during a read of the file are misses
+    when they are in the range of the read, readahead otherwise, and the
+    pages added outside of reads (page faults, partial writes, fadvise) are
+    counted as other. Block requests are attributed to the file of the
+    syscall that queued them or to the inode they write back.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.read_bytes = 0
+        self.written_bytes = 0
+        self.pages_requested = 0
+        self.pages_missed = 0
+        self.pages_readahead = 0
+        self.pages_other = 0
+        self.device = {"read": 0, "write": 0, "other": 0}  # direction => requests
+        self.device_bytes = {"read": 0, "write": 0, "other": 0}
+        self.device_errors = 0
+        self.device_latency = LatencyStats()  # issue to completion, per direction
+        self.queue_latency = LatencyStats()  # queued to issue, per direction
+        self.writebacks = 0
+        self.writeback_pages = 0
+
+    def hit_ratio(self) -> float:
+        """Return the page cache hit ratio of the reads (None without reads)."""
+        if not self.pages_requested:
+            return None
+        return max(0.0, 1 - self.pages_missed / self.pages_requested)
+
+    def amplification(self, direction: str) -> float:
+        """Return the device bytes per requested byte (None without requests).
+
+        :param direction: read or write
+        """
+        requested = self.read_bytes if direction == "read" else self.written_bytes
+        if not requested:
+            return None
+        return self.device_bytes[direction] / requested
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "read_bytes": self.read_bytes,
+            "written_bytes": self.written_bytes,
+            "pages_requested": self.pages_requested,
+            "pages_missed": self.pages_missed,
+            "pages_readahead": self.pages_readahead,
+            "pages_other": self.pages_other,
+            "hit_ratio": self.hit_ratio(),
+            "device_requests": dict(self.device),
+            "device_bytes": dict(self.device_bytes),
+            "device_errors": self.device_errors,
+            "device_latency": self.device_latency.summary(),
+            "queue_latency": self.queue_latency.summary(),
+            "writebacks": self.writebacks,
+            "writeback_pages": self.writeback_pages,
+            "read_amplification": self.amplification("read"),
+            "write_amplification": self.amplification("write"),
+        }
+
+
+class BlockCorrelator:
+    """BlockCorrelator ties page cache insertions and block requests to the syscalls of the io tracer.
+
+    The io trace is read first, every syscall that can read, dirty or write
+    back pages of a file becomes a window (start, end, file, page range) of
+    its thread. The block tracer prints
+    its events for the thread they were made for, an event is attributed to
+    the window of that thread it falls in, or through the inode number to
+    the file a window of another event resolved it to.
+    """
+
+    def __init__(self, page_size: int = PAGE_SIZE):
+        """BlockCorrelator constructor.
+
+        :param page_size: page size of the traced host
+        """
+        self.page_size = page_size
+        self.files = {}  # path => FileIO
+        self.inodes = {}  # ino => path
+        self.devices = {}  # (dev, ino) => path
+        self.attributed = {"window": 0, "inode": 0, "unattributed": 0}
+
+        # tid => sorted windows [start, end, path, first page, last page, pages, adds]
+        self._windows = {}
+        self._starts = {}  # tid => window starts, for bisect
+
+    def read_syscalls(self, batches):
+        """Build the syscall windows and the per-file request sizes from the io tracer.
+
+        :param batches: batches of the io tracer returned by the TraceReader
+        """
+        resolver = FileResolver()
+        positions = {}  # (pid, fd) => file offset
+        windows = self._windows
+        page_size = self.page_size
+
+        for record, path in resolver.resolve(batches):
+            op, pid, args, ret = record.op, record.pid, record.args, record.ret
+            fd = args.get("fd")
+
+            offset = None
+            if op in OPEN_OPS:
+                if ret is not None and ret >= 0:
+                    positions[(pid, ret)] = 0
+            elif op == "lseek":
+                if ret is not None and ret >= 0:
+                    positions[(pid, fd)] = ret
+            elif op == "close":
+                positions.pop((pid, fd), None)
+            elif op in POSITIONED_OPS:
+                offset = args.get("pos")
+            elif op in READ_OPS or op in WRITE_OPS:
+                # the position printed on the exit, else the one inferred from open/lseek
+                offset = args.get("pos")
+                if offset is None or offset < 0:
+                    offset = positions.get((pid, fd))
+                if offset is not None and ret is not None and ret > 0:
+                    positions[(pid, fd)] = offset + ret
+            elif op in TRANSFER_OPS:
+                # the source position moves unless an offset pointer was passed
+                positions.pop((pid, fd), None)
+
+            if op not in WINDOW_OPS:
+                continue
+
+            window = [record.ts, record.ts + record.latency, path, None, None, 0, 0]
+            if (op in READ_OPS or op in TRANSFER_OPS) and ret is not None and ret > 0:
+                file = self._file(path)
+                file.read_bytes += ret
+                if offset is not None and offset >= 0:
+                    window[3] = offset // page_size
+                    window[4] = (offset + ret - 1) // page_size
+                    window[5] = window[4] - window[3] + 1
+                else:
+                    window[5] = -(-ret // page_size)
+                file.pages_requested += window[5]
+            elif op in WRITE_OPS and ret is not None and ret > 0:
+                self._file(path).written_bytes += ret
+
+            windows.setdefault(record.tid, []).append(window)
+
+        for tid, tid_windows in windows.items():
+            tid_windows.sort(key=lambda window: window[0])
+            self._starts[tid] = [window[0] for window in tid_windows]
+
+        logging.debug(f"syscall windows of {len(windows)} threads")
+
+    def read_block(self, batches):
+        """Attribute the page cache and block events of the block tracer.
+
+        :param batches: batches of the block tracer returned by the TraceReader
+        """
+        pairer = Pairer(emit_oneshots=True, histograms=False)
+        for record in pair_events(batches, pairer):
+            if record.flags & FLAG_ONESHOT:
+                if record.op == "cache_add":
+                    self._cache_add(record)
+                elif record.op == "inode_dirty":
+                    window = self._window(record.tid, record.ts)
+                    if window is not None:
+                        self.inodes.setdefault(record.args.get("ino"), window[2])
+            elif record.op == "block_rq":
+                self._block_rq(record)
+            elif record.op == "writeback":
+                path = self._inode_path(record.args.get("ino"))
+                if path is not None:
+                    file = self._file(path)
+                    file.writebacks += 1
+                    file.writeback_pages += max(record.args.get("wrote", 0), 0)
+
+        # a read with an unknown offset has its first added pages as misses
+        for tid_windows in self._windows.values():
+            for window in tid_windows:
+                adds = window[6]
+                if adds:
+                    file = self._file(window[2])
+                    missed = min(adds, window[5])
+                    file.pages_missed += missed
+                    file.pages_readahead += adds - missed
+
+        logging.debug(f"block events attributed by {self.attributed}")
+
+    def summary(self) -> list[dict]:
+        """Return the per-file summaries, the files with the most device bytes first."""
+        return [
+            file.as_dict()
+            for file in sorted(
+                self.files.values(),
+                key=lambda f: (sum(f.device_bytes.values()), f.pages_requested),
+                reverse=True,
+            )
+        ]
+
+    def _cache_add(self, record):
+        args = record.args
+        dev, ino, index = args.get("dev"), args.get("ino"), args.get("index")
+
+        window = self._window(record.tid, record.ts)
+        if window is not None:
+            path = window[2]
+            self.devices.setdefault((dev, ino), path)
+            self.inodes.setdefault(ino, path)
+            file = self._file(path)
+            if not window[5]:
+                file.pages_other += 1
+            elif window[3] is None:
+                window[6] += 1  # classified when the trace is done
+            elif window[3] <= index <= window[4]:
+                file.pages_missed += 1
+            else:
+                file.pages_readahead += 1
+            return
+
+        path = self.devices.get((dev, ino))
+        self._file(path or unknown_inode(ino, dev)).pages_other += 1
+
+    def _block_rq(self, record):
+        args = record.args
+        ino = args.get("ino", 0)
+
+        path = None
+        if ino:
+            path = self._inode_path(ino) or unknown_inode(ino)
+            self.attributed["inode"] += 1
+        else:
+            # bios are queued in the syscall, the request may be issued after it
+            window = self._window(record.tid, record.ts - args.get("queued", 0))
+            if window is not None:
+                path = window[2]
+                self.attributed["window"] += 1
+        if path is None:
+            path = UNATTRIBUTED
+            self.attributed["unattributed"] += 1
+
+        file = self._file(path)
+        direction = rwbs_direction(args.get("rwbs", ""))
+        file.device[direction] += 1
+        file.device_bytes[direction] += args.get("bytes", 0)
+        if record.ret is not None and record.ret != 0:
+            file.device_errors += 1
+        file.device_latency.record(direction, record.latency)
+        file.queue_latency.record(direction, args.get("queued", 0))
+
+    def _window(self, tid: int, ts: int) -> list:
+        """Return the syscall window of a thread that contains a timestamp (None if there is none)."""
+        starts = self._starts.get(tid)
+        if not starts:
+            return None
+        i = bisect_right(starts, ts) - 1
+        if i < 0:
+            return None
+        window = self._windows[tid][i]
+        return window if ts <= window[1] else None
+
+    def _inode_path(self, ino: int) -> str:
+        return self.inodes.get(ino) if ino is not None else None
+
+    def _file(self, path: str) -> FileIO:
+        file = self.files.get(path)
+        if file is None:
+            file = self.files[path] = FileIO(path)
+        return file
+
+
+def correlate_block_io(
+    output_dir: str,
+    io_tracer: str = "io",
+    block_tracer: str = "block",
+    page_size: int = PAGE_SIZE,
+) -> BlockCorrelator:
+    """Correlate the block tracer output with the io tracer output of a tracing session.
+
+    :param output_dir: the tracing output directory
+    :param io_tracer: tracer with the syscalls (io, or combined traces split as io)
+    :param block_tracer: tracer with the page cache and block events
+    :param page_size: page size of the traced host
+    :return: the correlator with the per-file results
+    """
+    correlator = BlockCorrelator(page_size)
+    correlator.read_syscalls(read_trace(output_dir, io_tracer))
+    correlator.read_block(read_trace(output_dir, block_tracer))
+
+    logging.info(
+        f"correlated {len(correlator.files)} files, "
+        f"{len(correlator.inodes)} inodes resolved to a path"
+    )
+    return correlator
@@ -0,0 +1,453 @@
+import logging
+import os
+from array import array
+from collections import OrderedDict
+
+from src.mappings import PAGE_SIZE
+from src.parser import read_trace, trace_files
+from src.patterns import AccessResolver
+
+LRU = "lru"
+ARC = "arc"
+TWO_Q = "2q"
+CLOCK = "clock"
+POLICIES = (LRU, ARC, TWO_Q, CLOCK)
+
+DEFAULT_POINTS = 12  # cache sizes of a curve
+STACK_CAPACITY = 1 << 16  # initial time slots of a StackDistance tree
+
+_FILE_BITS = 40  # container page keys are (file id << _FILE_BITS) | page
+
+
+class StackDistance:
+    """StackDistance computes the LRU miss-ratio curve of an access sequence in one pass.
+
+    Mattson's algorithm: an access hits an LRU cache of C pages iff its stack
+    distance (the number of distinct pages accessed since the previous access
+    of the page, plus one) is at most C. The last access time of every page is
+    marked in a Fenwick tree over time slots, so a distance is a prefix sum
+    difference in O(log n). When the slots run out, the live marks are
+    renumbered, so memory follows the number of distinct pages and not the
+    length of the sequence.
+    """
+
+    def __init__(self, capacity: int = STACK_CAPACITY):
+        """StackDistance constructor.
+
+        :param capacity: initial time slots
+        """
+        self.accesses = 0
+        self.cold = 0  # first accesses of the pages
+        self.distances = array("q", [0])  # stack distance => accesses
+
+        self._capacity = capacity
+        self._tree = array("q", bytes(8 * (capacity + 1)))
+        self._time = 0
+        self._last = {}  # page => time slot of its last access
+
+    def access(self, page: int):
+        """Record an access.
+
+        :param page: the page key
+        """
+        if self._time == self._capacity:
+            self._compact()
+        tree = self._tree
+        size = self._capacity
+        now = self._time
+        self.accesses += 1
+
+        last = self._last.get(page)
+        if last is None:
+            self.cold += 1
+        else:
+            # marks in (last, now) are the distinct pages accessed since then
+            distance = 1
+            i = now
+            while i > 0:
+                distance += tree[i]
+                i &= i - 1
+            i = last + 1
+            while i > 0:
+                distance -= tree[i]
+                i &= i - 1
+
+            distances = self.distances
+            if distance >= len(distances):
+                distances.extend(bytes(8 * (distance + 1 - len(distances))))
+            distances[distance] += 1
+
+            i = last + 1
+            while i <= size:
+                tree[i] -= 1
+                i += i & -i
+
+        i = now + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+        self._last[page] = now
+        self._time = now + 1
+
+    def pages(self) -> int:
+        """Return the number of distinct pages."""
+        return len(self._last)
+
+    def hits(self, sizes: list[int]) -> list[int]:
+        """Return the hits of LRU caches.
+
+        :param sizes: cache sizes in pages (ascending)
+        """
+        result = []
+        total = 0
+        distance = 0
+        distances = self.distances
+        for size in sizes:
+            while distance < len(distances) - 1 and distance < size:
+                distance += 1
+                total += distances[distance]
+            result.append(total)
+        return result
+
+    def _compact(self):
+        live = sorted(self._last, key=self._last.get)
+        self._last = {page: slot for slot, page in enumerate(live)}
+        self._capacity = max(self._capacity, 2 * len(live))
+        self._time = len(live)
+
+        # Fenwick tree of ones over the first len(live) slots
+        tree = array("q", bytes(8 * (self._capacity + 1)))
+        for i in range(1, self._capacity + 1):
+            low = i - (i & -i)
+            tree[i] = max(0, min(i, self._time) - low)
+        self._tree = tree
+
+
+class ClockCache:
+    """ClockCache is a CLOCK (second chance) cache, the LRU approximation of the kernel."""
+
+    def __init__(self, size: int):
+        """ClockCache constructor.
+
+        :param size: cache size in pages
+        """
+        self.size = size
+        self._slots = {}  # page => slot
+        self._pages = []  # slot => page
+        self._referenced = bytearray(size)
+        self._hand = 0
+
+    def access(self, page: int) -> bool:
+        """Access a page and return True on a hit.
+
+        :param page: the page key
+        """
+        slot = self._slots.get(page)
+        if slot is not None:
+            self._referenced[slot] = 1
+            return True
+
+        if len(self._pages) < self.size:
+            self._slots[page] = len(self._pages)
+            self._pages.append(page)
+            return False
+
+        referenced = self._referenced
+        hand = self._hand
+        while referenced[hand]:
+            referenced[hand] = 0
+            hand = (hand + 1) % self.size
+        del self._slots[self._pages[hand]]
+        self._pages[hand] = page
+        self._slots[page] = hand
+        self._hand = (hand + 1) % self.size
+        return False
+
+
+class TwoQCache:
+    """TwoQCache is the full 2Q cache (Johnson and Shasha).
+
+    New pages enter a FIFO (A1in, a quarter of the cache), the pages evicted
+    from it are remembered in a ghost FIFO (A1out, half the cache size), and a
+    page accessed again while in A1out is promoted to the LRU main queue (Am).
+    """
+
+    def __init__(self, size: int):
+        """TwoQCache constructor.
+
+        :param size: cache size in pages
+        """
+        self.size = size
+        self._in_size = max(1, size // 4)
+        self._out_size = max(1, size // 2)
+        self._in = OrderedDict()
+        self._out = OrderedDict()
+        self._main = OrderedDict()
+
+    def access(self, page: int) -> bool:
+        """Access a page and return True on a hit.
+
+        :param page: the page key
+        """
+        if page in self._main:
+            self._main.move_to_end(page)
+            return True
+        if page in self._in:
+            return True
+
+        if page in self._out:
+            del self._out[page]
+            self._reclaim()
+            self._main[page] = None
+        else:
+            self._reclaim()
+            self._in[page] = None
+        return False
+
+    def _reclaim(self):
+        if len(self._in) + len(self._main) < self.size:
+            return
+        if len(self._in) > self._in_size or not self._main:
+            page, _ = self._in.popitem(last=False)
+            self._out[page] = None
+            if len(self._out) > self._out_size:
+                self._out.popitem(last=False)
+        else:
+            self._main.popitem(last=False)
+
+
+class ArcCache:
+    """ArcCache is an Adaptive Replacement Cache (Megiddo and Modha).
+
+    T1 holds the pages seen once recently, T2 the pages seen at least twice,
+    B1 and B2 remember the pages evicted from them. Hits in B1 grow the target
+    size of T1, hits in B2 shrink it.
+    """
+
+    def __init__(self, size: int):
+        """ArcCache constructor.
+
+        :param size: cache size in pages
+        """
+        self.size = size
+        self._target = 0  # target size of T1
+        self._t1 = OrderedDict()
+        self._t2 = OrderedDict()
+        self._b1 = OrderedDict()
+        self._b2 = OrderedDict()
+
+    def access(self, page: int) -> bool:
+        """Access a page and return True on a hit.
+
+        :param page: the page key
+        """
+        size = self.size
+        t1, t2, b1, b2 = self._t1, self._t2, self._b1, self._b2
+
+        if page in t1:
+            del t1[page]
+            t2[page] = None
+            return True
+        if page in t2:
+            t2.move_to_end(page)
+            return True
+
+        if page in b1:
+            self._target = min(size, self._target + max(len(b2) // len(b1), 1))
+            self._replace(False)
+            del b1[page]
+            t2[page] = None
+            return False
+        if page in b2:
+            self._target = max(0, self._target - max(len(b1) // len(b2), 1))
+            self._replace(True)
+            del b2[page]
+            t2[page] = None
+            return False
+
+        if len(t1) + len(b1) == size:
+            if len(t1) < size:
+                b1.popitem(last=False)
+                self._replace(False)
+            else:
+                t1.popitem(last=False)
+        elif len(t1) + len(t2) + len(b1) + len(b2) >= size:
+            if len(t1) + len(t2) + len(b1) + len(b2) == 2 * size:
+                b2.popitem(last=False)
+            self._replace(False)
+        t1[page] = None
+        return False
+
+    def _replace(self, in_b2: bool):
+        t1, t2 = self._t1, self._t2
+        if len(t1) + len(t2) < self.size:
+            return
+        if t1 and (len(t1) > self._target or (in_b2 and len(t1) == self._target)):
+            page, _ = t1.popitem(last=False)
+            self._b1[page] = None
+        elif t2:
+            page, _ = t2.popitem(last=False)
+            self._b2[page] = None
+        else:
+            page, _ = t1.popitem(last=False)
+            self._b1[page] = None
+
+
+SIMULATORS = {ARC: ArcCache, TWO_Q: TwoQCache, CLOCK: ClockCache}
+
+
+def curve_sizes(pages: int, points: int = DEFAULT_POINTS) -> list[int]:
+    """Get geometrically spaced cache sizes from one page to the working set.
+
+    :param pages: distinct pages of the sequence
+    :param points: number of sizes
+    :return: ascending sizes in pages
+    """
+    if pages <= 1 or points <= 1:
+        return [max(pages, 1)]
+    return sorted({round(pages ** (i / (points - 1))) for i in range(points)})
+
+
+def simulate(policy: str, size: int, pages) -> int:
+    """Replay a page sequence through a cache and return its hits.
+
+    :param policy: ARC, TWO_Q or CLOCK
+    :param size: cache size in pages
+    :param pages: the page keys
+    """
+    access = SIMULATORS[policy](size).access
+    hits = 0
+    for page in pages:
+        if access(page):
+            hits += 1
+    return hits
+
+
+class CacheCurve:
+    """CacheCurve holds the page accesses of a file or a container and their hit-ratio curves.
+
+    The LRU curve comes from the StackDistance of the sequence, the other
+    policies are not stack algorithms and replay the sequence at every size.
+    """
+
+    def __init__(self, scope: str, name: str):
+        """CacheCurve constructor.
+
+        :param scope: file or container
+        :param name: the file path or the container name
+        """
+        self.scope = scope
+        self.name = name
+        self.pages = array("q")  # the page sequence
+        self.stack = StackDistance()
+
+    def access(self, page: int):
+        """Record a page access.
+
+        :param page: the page key
+        """
+        self.pages.append(page)
+        self.stack.access(page)
+
+    def rows(
+        self,
+        policies: list[str] = POLICIES,
+        points: int = DEFAULT_POINTS,
+        page_size: int = PAGE_SIZE,
+    ) -> list[dict]:
+        """Compute the hit ratios of the policies at geometrically spaced sizes.
+
+        :param policies: cache policies
+        :param points: cache sizes of the curve
+        :param page_size: bytes per page
+        :return: rows of the hit-ratio table
+        """
+        accesses = self.stack.accesses
+        sizes = curve_sizes(self.stack.pages(), points)
+
+        rows = []
+        for policy in policies:
+            if policy == LRU:
+                hits = self.stack.hits(sizes)
+            else:
+                hits = [simulate(policy, size, self.pages) for size in sizes]
+            for size, hit in zip(sizes, hits):
+                rows.append(
+                    {
+                        "scope": self.scope,
+                        "name": self.name,
+                        "policy": policy,
+                        "pages": size,
+                        "bytes": size * page_size,
+                        "accesses": accesses,
+                        "hit_ratio": hit / accesses if accesses else None,
+                    }
+                )
+        return rows
+
+
+def find_containers(output_dir: str, tracer: str = "io") -> dict[str, str]:
+    """Find the output directories of the traced containers.
+
+    A daemon output directory has a sub-directory per container, a
+    single-target output directory is one container.
+
+    :param output_dir: the tracing output directory
+    :param tracer: the tracer of the trace files
+    :return: container name => output directory
+    """
+    containers = {}
+    if tracer in trace_files(output_dir):
+        containers[os.path.basename(os.path.normpath(output_dir))] = output_dir
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        if os.path.isdir(path) and tracer in trace_files(path):
+            containers[name] = path
+    return containers
+
+
+def simulate_container(
+    output_dir: str,
+    name: str,
+    tracer: str = "io",
+    page_size: int = PAGE_SIZE,
+    writes: bool = False,
+) -> tuple[CacheCurve, dict[str, CacheCurve]]:
+    """Collect the page accesses of a container, as a whole and per file.
+
+    :param output_dir: the output directory of the container
+    :param name: the container name
+    :param tracer: tracer name (io, or a tracer with the read and write events)
+    :param page_size: bytes per page
+    :param writes: count the written pages as accesses too
+    :return: the container curve, and path => file curve
+    """
+    container = CacheCurve("container", name)
+    files = {}  # path => CacheCurve
+    ids = {}  # path => file id
+    unknown = 0
+
+    for access in AccessResolver().resolve(read_trace(output_dir, tracer)):
+        if access.direction != "read" and not writes:
+            continue
+        if access.offset is None:
+            unknown += 1
+            continue
+
+        curve = files.get(access.path)
+        if curve is None:
+            curve = files[access.path] = CacheCurve("file", access.path)
+            ids[access.path] = len(ids) << _FILE_BITS
+        base = ids[access.path]
+        first = access.offset // page_size
+        last = (access.offset + access.size - 1) // page_size
+        for page in range(first, last + 1):
+            curve.access(page)
+            container.access(base | page)
+
+    logging.info(
+        f"[{name}] {container.stack.accesses} page accesses to "
+        f"{container.stack.pages()} pages of {len(files)} files, "
+        f"{unknown} accesses without offset skipped"
+    )
+    return container, files
@@ -0,0 +1,209 @@
+import gzip
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# compression method => file extension
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+INDEX_SUFFIX = ".idx"  # sidecar index of a segment (see src/index.py)
+
+
+def index_path(path: str) -> str:
+    """Get the sidecar index path of a (possibly compressed) segment.
+
+    :param path: a .log, .log.gz, or .log.zst file
+    """
+    for ext in EXTENSIONS.values():
+        if path.endswith(ext):
+            path = path[: -len(ext)]
+            break
+    return path + INDEX_SUFFIX
+
+
+def must_support_compression(method: str):
+    """Check if a compression method can be used.
+
+    :param method: gzip or zstd
+    """
+    if method not in EXTENSIONS:
+        logging.error(f"unknown compression method '{method}'.")
+        sys.exit(5)
+    if method == "zstd" and zstandard is None:
+        logging.error("zstd compression needs the zstandard package, use gzip instead.")
+        sys.exit(5)
+
+
+def compress_file(path: str, method: str) -> str:
+    """Compress a file next to itself and remove the original.
+
+    :param path: the file to compress
+    :param method: gzip or zstd
+    :return: the compressed file path
+    """
+    target = path + EXTENSIONS[method]
+    tmp = target + ".tmp"
+
+    with open(path, "rb") as src:
+        if method == "zstd":
+            with open(tmp, "wb") as dst:
+                zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+        else:
+            with gzip.open(tmp, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+    os.replace(tmp, target)
+    os.remove(path)
+    return target
+
+
+def open_segment(path: str):
+    """Open a (possibly compressed) trace segment for binary reading.
+
+    :param path: a .log, .log.gz, or .log.zst file
+    """
+    if path.endswith(EXTENSIONS["gzip"]):
+        return gzip.open(path, "rb")
+    if path.endswith(EXTENSIONS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError(f"cannot read {path}: zstandard is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), closefd=True, read_across_frames=True
+        )
+    return open(path, "rb")
+
+
+class RetentionPolicy:
+    """RetentionPolicy limits the closed segments of a tracer, evicting the oldest first."""
+
+    def __init__(
+        self, max_bytes: int = None, max_segments: int = None, max_age: float = None
+    ):
+        """RetentionPolicy constructor (None disables a limit).
+
+        :param max_bytes: maximum total size of the closed segments
+        :param max_segments: maximum number of closed segments
+        :param max_age: maximum age of a closed segment in seconds
+        """
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments
+        self.max_age = max_age
+
+    def enabled(self) -> bool:
+        return any(
+            limit is not None
+            for limit in (self.max_bytes, self.max_segments, self.max_age)
+        )
+
+    def apply(self, segments: list[str]) -> list[str]:
+        """Remove the segments that are over the limits.
+
+        :param segments: closed segment paths, oldest first
+        :return: the remaining segments
+        """
+        now = time.time()
+        sizes = [os.path.getsize(path) for path in segments]
+        total = sum(sizes)
+
+        evict = 0
+        while evict < len(segments):
+            over_bytes = self.max_bytes is not None and total > self.max_bytes
+            over_count = (
+                self.max_segments is not None
+                and len(segments) - evict > self.max_segments
+            )
+            too_old = (
+                self.max_age is not None
+                and now - os.path.getmtime(segments[evict]) > self.max_age
+            )
+            if not (over_bytes or over_count or too_old):
+                break
+
+            total -= sizes[evict]
+            evict += 1
+
+        for path in segments[:evict]:
+            logging.info(f"retention: removing {path}")
+            os.remove(path)
+            if os.path.exists(index_path(path)):
+                os.remove(index_path(path))
+
+        return segments[evict:]
+
+
+class SegmentWorker:
+    """SegmentWorker indexes and compresses closed segments and applies the retention policy in a background thread."""
+
+    def __init__(
+        self,
+        method: str = None,
+        retention: RetentionPolicy = None,
+        indexer=None,
+    ):
+        """SegmentWorker constructor.
+
+        :param method: compression method (None to keep segments uncompressed)
+        :param retention: retention policy (None to keep all segments)
+        :param indexer: called with every closed segment before it is compressed
+            (e.g. src/index.write_index, None to not index segments)
+        """
+        self._method = method
+        self._retention = retention
+        self._indexer = indexer
+        self._segments = []  # closed segments, oldest first
+        self._queue = queue.Queue()
+        self._t = threading.Thread(target=self.__run, daemon=True)
+        self._t.start()
+
+    def submit(self, path: str):
+        """Hand over a closed segment (never blocks).
+
+        :param path: the closed segment path
+        """
+        self._queue.put(path)
+
+    def close(self):
+        """Process the remaining segments and stop the worker."""
+        self._queue.put(None)
+        self._t.join()
+
+    def __run(self):
+        # segments also age when none is closed, max_age is checked periodically
+        max_age = self._retention.max_age if self._retention else None
+        timeout = min(max_age, 60) if max_age is not None else None
+
+        while True:
+            try:
+                path = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                try:
+                    self._segments = self._retention.apply(self._segments)
+                except Exception as e:
+                    logging.error(f"failed to apply the retention policy: {e}")
+                continue
+            if path is None:
+                return
+
+            try:
+                if self._indexer:
+                    self._indexer(path)
+                if self._method:
+                    path = compress_file(path, self._method)
+                    logging.debug(f"compressed segment {path}")
+                self._segments.append(path)
+
+                if self._retention:
+                    self._segments = self._retention.apply(self._segments)
+            except Exception as e:
+                logging.error(f"failed to process segment {path}: {e}")
@@ -1,68 +1,229 @@
+import json
 import logging
+import os
 import subprocess
 import sys
+import threading
 import time
 
+CGROUP_ROOTS = ("/sys/fs/cgroup", "/sys/fs/cgroup/unified")  # v2, hybrid
+KUBEPODS = ("kubepods.slice", "kubepods")  # systemd and cgroupfs drivers
 
-def find_pod_cgroup(namespace: str, pod: str, container: str) -> str:
-    """Find pod's cgroup based on its namespace, name, and container using crictl.
+BACKOFF_START = 0.05  # first wait for the container in seconds
+BACKOFF_MAX = 2.0
+
+
+class CgroupNotFound(Exception):
+    """The cgroup of a container could not be resolved."""
+
+
+def crictl_json(args: list[str], crictl: str = "crictl") -> dict:
+    """Run a crictl command with JSON output.
+
+    :param args: crictl arguments (without -o json)
+    :param crictl: the crictl binary
+    :return: the decoded output
+    """
+    try:
+        result = subprocess.run(
+            [crictl] + args + ["-o", "json"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(result.stdout or "{}")
+    except (OSError, ValueError) as exc:
+        raise CgroupNotFound(f"error running crictl {args[0]}: {exc}")
+    except subprocess.CalledProcessError as exc:
+        raise CgroupNotFound(f"error running crictl {args[0]}: {exc.stderr.strip()}")
+
+
+def find_container_id(
+    namespace: str, pod: str, container: str, crictl: str = "crictl"
+) -> str:
+    """Find the id of a running container by its Kubernetes labels.
+
+    :return: the container id, None if it is not running yet
+    """
+    listing = crictl_json(
+        [
+            "ps",
+            "--namespace",
+            namespace,
+            "--label",
+            f"io.kubernetes.pod.name={pod}",
+            "--name",
+            f"^{container}$",
+        ],
+        crictl,
+    )
+
+    for entry in listing.get("containers", []):
+        labels = entry.get("labels", {})
+        if (
+            labels.get("io.kubernetes.pod.name") == pod
+            and labels.get("io.kubernetes.pod.namespace") == namespace
+            and labels.get("io.kubernetes.container.name") == container
+        ):
+            return entry["id"]
+
+    return None
+
+
+def cgroup_path_from_pid(pid: int) -> str:
+    """Read the cgroup v2 path of a process from /proc/<pid>/cgroup."""
+    try:
+        with open(f"/proc/{pid}/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return line[3:].strip()
+    except OSError:
+        pass
+    return None
+
+
+def cgroup_path_from_spec(cgroups_path: str) -> str:
+    """Turn the OCI cgroupsPath into a path relative to the cgroup root.
+
+    systemd driver: "kubepods-besteffort-pod<uid>.slice:cri-containerd:<id>"
+    cgroupfs driver: "/kubepods/besteffort/pod<uid>/<id>"
+    """
+    if not cgroups_path:
+        return None
+    if cgroups_path.startswith("/"):
+        return cgroups_path
+
+    parts = cgroups_path.split(":")
+    if len(parts) != 3:
+        return None
+    slice_name, prefix, name = parts
+
+    # a-b-c.slice lives in a.slice/a-b.slice/a-b-c.slice
+    words = slice_name[: -len(".slice")].split("-")
+    slices = ["-".join(words[: i + 1]) + ".slice" for i in range(len(words))]
+    return "/" + "/".join(slices + [f"{prefix}-{name}.scope"])
+
+
+def search_kubepods(container_id: str) -> str:
+    """Look for the container cgroup in the kubepods slices only (qos/pod/container)."""
+    for root in CGROUP_ROOTS:
+        for kubepods in KUBEPODS:
+            stack = [(os.path.join(root, kubepods), 0)]
+            while stack:
+                path, depth = stack.pop()
+                try:
+                    entries = list(os.scandir(path))
+                except OSError:
+                    continue
+
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if container_id in entry.name:
+                        return entry.path
+                    if depth < 2:
+                        stack.append((entry.path, depth + 1))
+
+    return None
+
+
+def resolve_cgroup_path(container_id: str, crictl: str = "crictl") -> str:
+    """Find the cgroup directory of a container.
+
+    The process cgroup is read first, then the OCI spec of `crictl inspect`,
+    and only then the kubepods slices are searched.
+    """
+    info = crictl_json(["inspect", container_id], crictl).get("info", {})
+
+    candidates = []
+    if info.get("pid"):
+        candidates.append(cgroup_path_from_pid(info["pid"]))
+    spec = info.get("runtimeSpec", {}).get("linux", {})
+    candidates.append(cgroup_path_from_spec(spec.get("cgroupsPath")))
+
+    for relative in candidates:
+        if relative is None:
+            continue
+        for root in CGROUP_ROOTS:
+            path = root + relative
+            if os.path.isdir(path):
+                return path
+
+    return search_kubepods(container_id)
+
+
+def resolve_pod_cgroup(
+    namespace: str,
+    pod: str,
+    container: str,
+    timeout: float = None,
+    crictl: str = "crictl",
+    cancel: threading.Event = None,
+) -> str:
+    """Resolve the cgroup id of a container, waiting for it to start.
 
     :param namespace: kubernetes namespace
     :param pod: kubernetes pod name
     :param container: kubernetes pod's container name
+    :param timeout: seconds to wait for the container (None waits forever)
+    :param crictl: the crictl binary
+    :param cancel: stops waiting when set
     :return: container cgroup
+    :raises CgroupNotFound: when the container or its cgroup is not found
     """
+    start = time.monotonic()
 
-    # poll for the container ID
+    # wait for the container with exponential backoff
+    delay = BACKOFF_START
     while True:
-        logging.info("waiting ...")
-        try:
-            result = subprocess.run(
-                ["crictl", "ps", "--namespace", namespace],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as exc:
-            logging.error(f"error running crictl ps: {exc}")
-            sys.exit(1)
-
-        containerid = None
-        for line in result.stdout.splitlines()[1:]:
-            parts = line.split()
-
-            if len(parts) >= 11 and parts[9] == pod and parts[6] == container:
-                containerid = parts[0]
-                break
-
+        containerid = find_container_id(namespace, pod, container, crictl)
         if containerid:
             logging.info(f"target container found: {container} => {containerid}")
             break
 
-        time.sleep(0.5)
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise CgroupNotFound(f"container {namespace}/{pod}/{container} not found")
+
+        logging.info(f"waiting {delay:.2f}s ...")
+        if cancel is not None:
+            if cancel.wait(delay):
+                raise CgroupNotFound(
+                    f"cancelled waiting for {namespace}/{pod}/{container}"
+                )
+        else:
+            time.sleep(delay)
+        delay = min(delay * 2, BACKOFF_MAX)
 
     # find cgroup path
-    try:
-        find_proc = subprocess.run(
-            ["find", "/sys/fs/cgroup/", "-type", "d", "-name", f"*{containerid}*"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        path = find_proc.stdout.strip().splitlines()[0]
-    except Exception as e:
-        logging.error(f"could not find cgroup path: {e}")
-        sys.exit(1)
+    path = resolve_cgroup_path(containerid, crictl)
+    if path is None:
+        raise CgroupNotFound(f"could not find cgroup path of {containerid}")
 
     # find numeric cgroupid
     try:
-        stat_proc = subprocess.run(
-            ["stat", "-c", "%i", path], capture_output=True, text=True, check=True
-        )
-        cgroupid = stat_proc.stdout.strip()
-        return cgroupid
-    except Exception as e:
-        logging.error(f"could not determine cgroupid for {path}: {e}")
-        sys.exit(1)
+        cgroupid = str(os.stat(path).st_ino)
+    except OSError as e:
+        raise CgroupNotFound(f"could not determine cgroupid for {path}: {e}")
+
+    logging.info(
+        f"cgroup {path} => {cgroupid} resolved in {time.monotonic() - start:.3f}s"
+    )
+    return cgroupid
+
+
+def find_pod_cgroup(
+    namespace: str, pod: str, container: str, timeout: float = None
+) -> str:
+    """Find pod's cgroup based on its namespace, name, and container using crictl.
 
-    return ""
+    :param namespace: kubernetes namespace
+    :param pod: kubernetes pod name
+    :param container: kubernetes pod's container name
+    :param timeout: seconds to wait for the container (None waits forever)
+    :return: container cgroup
+    """
+    try:
+        return resolve_pod_cgroup(namespace, pod, container, timeout)
+    except CgroupNotFound as e:
+        logging.error(str(e))
+        sys.exit(1)
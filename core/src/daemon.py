@@ -0,0 +1,325 @@
+import asyncio
+import http.client
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from http import HTTPStatus
+
+from src.containers import CgroupNotFound, resolve_pod_cgroup
+from src.matchbox import Supervisor
+from src.targets import Target
+from src.tracer import MultiTracer
+
+DEFAULT_SOCKET = "/run/flap/flap.sock"
+MAX_REQUEST_SIZE = 64 * 1024
+
+
+class Session:
+    """Session is a container traced by the daemon."""
+
+    def __init__(
+        self, namespace: str, pod: str, container: str, filter_command: str = None
+    ):
+        """Session constructor.
+
+        :param namespace: kubernetes namespace
+        :param pod: kubernetes pod name
+        :param container: kubernetes pod's container name
+        :param filter_command: only keep the events of this command (None for all)
+        """
+        self.namespace = namespace
+        self.pod = pod
+        self.container = container
+        self.filter_command = filter_command
+
+        self.state = "resolving"  # resolving, tracing, stopping, stopped or failed
+        self.error = None
+        self.target = None
+        self.requested = time.monotonic()
+
+    def key(self) -> str:
+        """Get the session id (namespace/pod/container)."""
+        return f"{self.namespace}/{self.pod}/{self.container}"
+
+    def status(self, tracers: list[MultiTracer]) -> dict:
+        """Get the session status for the control API.
+
+        :param tracers: the tracers of the daemon
+        """
+        status = {
+            "session": self.key(),
+            "filter_command": self.filter_command,
+            "state": self.state,
+        }
+        if self.error:
+            status["error"] = self.error
+        if self.target is None:
+            return status
+
+        entries = {}
+        for tracer in tracers:
+            entry = tracer.targets().get(self.target.cgid)
+            if entry is not None:
+                entries[tracer.name()] = entry
+
+        if self.state == "stopping" and not entries:
+            self.state = status["state"] = "stopped"
+
+        attached = [entry["attached"] for entry in entries.values()]
+        status["cgroup"] = self.target.cgid
+        status["output_dir"] = self.target.output_dir
+        status["events"] = {name: entry["events"] for name, entry in entries.items()}
+        if attached and None not in attached:
+            status["time_to_attach"] = round(max(attached) - self.requested, 6)
+        return status
+
+
+class Daemon:
+    """Daemon traces the containers of a node with one set of multi-target tracers.
+
+    Sessions are added and removed through an HTTP API on a Unix socket, they
+    only update the tracked cgroups of the running bpftrace processes:
+
+        GET    /sessions                                list the sessions
+        POST   /sessions                                {"namespace", "pod", "container", "filter_command"}
+        GET    /sessions/<namespace>/<pod>/<container>  session status
+        DELETE /sessions/<namespace>/<pod>/<container>  stop tracing the container
+        GET    /status                                  tracer reports and sessions
+        POST   /stop                                    stop the daemon
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        tracers: list[MultiTracer],
+        socket_path: str = DEFAULT_SOCKET,
+        crictl: str = "crictl",
+        resolve_timeout: float = 300,
+    ):
+        """Daemon constructor.
+
+        :param output_dir: the output directory (a sub-directory per session)
+        :param tracers: the multi-target tracers
+        :param socket_path: the control API socket
+        :param crictl: the crictl binary (a stub for local tests)
+        :param resolve_timeout: seconds to wait for a container to start
+        """
+        self._output_dir = output_dir
+        self._tracers = tracers
+        self._socket_path = socket_path
+        self._crictl = crictl
+        self._resolve_timeout = resolve_timeout
+
+        self._sessions = {}  # session id => Session
+        self._resolving = set()  # resolution tasks
+        self._supervisor = None
+        self._cancel = threading.Event()  # stops the pending resolutions
+
+    async def serve(self, supervisor: Supervisor):
+        """Serve the control API until cancelled (a service of ignite_tracing).
+
+        :param supervisor: the supervisor of the tracers
+        """
+        self._supervisor = supervisor
+
+        os.makedirs(os.path.dirname(self._socket_path) or ".", exist_ok=True)
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+        server = await asyncio.start_unix_server(self.__handle, path=self._socket_path)
+        logging.info(f"control API listening on {self._socket_path}")
+        try:
+            await asyncio.Future()
+        finally:
+            self._cancel.set()
+            server.close()
+            os.unlink(self._socket_path)
+
+    def add(self, request: dict) -> tuple[int, dict]:
+        """Start a session, the container cgroup is resolved in the background."""
+        try:
+            session = Session(
+                request["namespace"],
+                request["pod"],
+                request["container"],
+                request.get("filter_command"),
+            )
+        except (KeyError, TypeError):
+            return HTTPStatus.BAD_REQUEST, {
+                "error": "namespace, pod and container are required"
+            }
+
+        current = self._sessions.get(session.key())
+        if current is not None and current.state not in ("stopped", "failed"):
+            return HTTPStatus.CONFLICT, current.status(self._tracers)
+
+        self._sessions[session.key()] = session
+        task = asyncio.create_task(self.__resolve(session))
+        self._resolving.add(task)
+        task.add_done_callback(self._resolving.discard)
+        return HTTPStatus.ACCEPTED, session.status(self._tracers)
+
+    def remove(self, key: str) -> tuple[int, dict]:
+        """Stop a session, its output is closed once bpftrace acknowledges it."""
+        session = self._sessions.get(key)
+        if session is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"no session {key}"}
+
+        if session.state == "resolving":
+            session.state = "stopped"
+        elif session.state == "tracing":
+            session.state = "stopping"
+            for tracer in self._tracers:
+                tracer.remove_target(session.target.cgid)
+        return HTTPStatus.OK, session.status(self._tracers)
+
+    def status(self) -> dict:
+        """Get the daemon status."""
+        return {
+            "tracers": [tracer.report()._asdict() for tracer in self._tracers],
+            "sessions": [s.status(self._tracers) for s in self._sessions.values()],
+        }
+
+    async def __resolve(self, session: Session):
+        try:
+            cgid = await asyncio.to_thread(
+                resolve_pod_cgroup,
+                session.namespace,
+                session.pod,
+                session.container,
+                self._resolve_timeout,
+                self._crictl,
+                self._cancel,
+            )
+        except CgroupNotFound as e:
+            logging.error(f"[{session.key()}] {e}")
+            session.state, session.error = "failed", str(e)
+            return
+
+        if session.state != "resolving":
+            return  # removed while resolving
+
+        if any(cgid in tracer.targets() for tracer in self._tracers):
+            session.state = "failed"
+            session.error = f"cgroup {cgid} is traced already"
+            return
+
+        name = session.key().replace("/", "_")
+        session.target = Target(
+            cgid,
+            self.__session_dir(name),
+            name=name,
+            comm=session.filter_command,
+        )
+        for tracer in self._tracers:
+            tracer.add_target(session.target)
+        session.state = "tracing"
+
+    def __session_dir(self, name: str) -> str:
+        """Get a new output directory for a session, the traces of the previous sessions
+        of the same container are kept (<name>, then <name>_2, <name>_3, ...)."""
+        used = {s.target.output_dir for s in self._sessions.values() if s.target}
+        path = os.path.join(self._output_dir, name)
+        n = 1
+        while os.path.exists(path) or path in used:
+            n += 1
+            path = os.path.join(self._output_dir, f"{name}_{n}")
+        return path
+
+    def __route(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        parts = [p for p in path.split("?")[0].split("/") if p]
+
+        if parts == ["sessions"] and method == "GET":
+            return HTTPStatus.OK, self.status()["sessions"]
+        if parts == ["sessions"] and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError as e:
+                return HTTPStatus.BAD_REQUEST, {"error": f"invalid JSON: {e}"}
+            return self.add(request)
+
+        if len(parts) == 4 and parts[0] == "sessions":
+            key = "/".join(parts[1:])
+            if method == "DELETE":
+                return self.remove(key)
+            if method == "GET" and key in self._sessions:
+                return HTTPStatus.OK, self._sessions[key].status(self._tracers)
+            return HTTPStatus.NOT_FOUND, {"error": f"no session {key}"}
+
+        if parts == ["status"] and method == "GET":
+            return HTTPStatus.OK, self.status()
+        if parts == ["stop"] and method == "POST":
+            logging.info("stop requested by the control API")
+            self._supervisor.stop()
+            return HTTPStatus.OK, {"state": "stopping"}
+
+        return HTTPStatus.NOT_FOUND, {"error": f"no route {method} {path}"}
+
+    async def __handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Serve one HTTP/1.1 request per connection."""
+        try:
+            request = await reader.readline()
+            method, path, _ = request.decode().split(" ", 2)
+
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode().partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            if length > MAX_REQUEST_SIZE:
+                raise ValueError("request too large")
+            body = await reader.readexactly(length) if length else b""
+
+            code, payload = self.__route(method, path, body)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            code, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+        data = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {code.value} {code.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = 10):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+def request(
+    socket_path: str, method: str, path: str, payload: dict = None
+) -> tuple[int, dict]:
+    """Call the control API of a running daemon.
+
+    :param socket_path: the control API socket
+    :param method: HTTP method
+    :param path: API path, e.g. /sessions
+    :param payload: JSON body (None for no body)
+    :return: (HTTP status, decoded response)
+    """
+    conn = _UnixHTTPConnection(socket_path)
+    try:
+        body = json.dumps(payload) if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
@@ -0,0 +1,395 @@
+import ast
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+from array import array
+
+from src.parser import NA, StringTable, TraceReader, trace_files
+from src.timestamp import ClockConverter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+if pa is not None:
+    _ARROW_TYPES = {"q": pa.int64, "d": pa.float64, "b": pa.int8, "i": pa.int32}
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+# header columns of every exported trace
+HEADER_COLUMNS = ("ts", "wall", "kind", "pid", "tid", "phase", "op", "comm")
+
+# string columns (dictionary-encoded)
+STRING_COLUMNS = ("op", "comm")
+
+# npy dtypes of array typecodes
+_DTYPES = {"q": "<i8", "d": "<f8", "b": "|i1", "i": "<i4"}
+_TYPECODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+# missing values of array typecodes
+_MISSING = {"q": NA, "d": float("nan"), "b": -1, "i": -1}
+
+
+def arg_column(key: str) -> str:
+    """Return the column name of an argument (prefixed when it clashes with a header column).
+
+    :param key: argument name
+    """
+    return f"arg_{key}" if key in HEADER_COLUMNS else key
+
+
+def batch_columns(batch, clock: ClockConverter) -> dict[str, array]:
+    """Convert a batch into named typed columns.
+
+    :param batch: a batch returned by the TraceReader
+    :param clock: converter of the trace clock (None to fill wall with NaN)
+    :return: column name => array (string columns hold StringTable codes)
+    """
+    if clock is None:
+        wall = array("d", [float("nan")]) * len(batch)
+    else:
+        wall = clock.to_seconds(batch.ts)
+
+    columns = {
+        "ts": batch.ts,
+        "wall": wall,
+        "kind": batch.kind,
+        "pid": batch.pid,
+        "tid": batch.tid,
+        "phase": batch.phase,
+        "op": batch.op,
+        "comm": batch.comm,
+    }
+    for key, col in batch.ints.items():
+        columns[arg_column(key)] = col
+    for key, col in batch.strs.items():
+        columns[arg_column(key)] = col
+
+    return columns
+
+
+class NpzWriter:
+    """NpzWriter streams columns into a .npz archive without numpy.
+
+    Columns are spooled to temporary files and copied into the archive on close,
+    so memory stays bounded by the batch size. String columns are stored as int32
+    codes into the `strings` array (-1 is missing) and integer arguments use
+    int64 min as the missing value.
+    """
+
+    def __init__(self, path: str):
+        """NpzWriter constructor.
+
+        :param path: output .npz path
+        """
+        self._path = path
+        self._tmp = tempfile.mkdtemp(prefix=".flap-export-", dir=os.path.dirname(path))
+        self._spools = {}  # column => (typecode, file)
+        self._rows = 0
+
+    def write(self, columns: dict[str, array]):
+        """Append a batch of columns.
+
+        :param columns: column name => array
+        """
+        n = len(columns["ts"])
+        for name, col in columns.items():
+            spool = self._spools.get(name)
+            if spool is None:
+                path = os.path.join(self._tmp, f"{name}.bin")
+                spool = self._spools[name] = (col.typecode, open(path, "wb"))
+                # backfill the rows written before this column first appeared
+                _fill(spool[1], col.typecode, self._rows)
+            col.tofile(spool[1])
+
+        # pad the columns that are missing from this batch
+        for name, (typecode, f) in self._spools.items():
+            if name not in columns:
+                _fill(f, typecode, n)
+
+        self._rows += n
+
+    def close(self, strings: list[str]):
+        """Write the archive and remove the spool files.
+
+        :param strings: the string table of the exported trace
+        """
+        try:
+            with zipfile.ZipFile(
+                self._path, "w", compression=zipfile.ZIP_STORED, allowZip64=True
+            ) as zf:
+                for name, (typecode, f) in self._spools.items():
+                    f.close()
+                    with zf.open(f"{name}.npy", "w", force_zip64=True) as out:
+                        out.write(_npy_header(_DTYPES[typecode], self._rows))
+                        with open(f.name, "rb") as src:
+                            shutil.copyfileobj(src, out, 1024 * 1024)
+
+                width = max([len(s) for s in strings] + [1])
+                with zf.open("strings.npy", "w", force_zip64=True) as out:
+                    out.write(_npy_header(f"<U{width}", len(strings)))
+                    for s in strings:
+                        out.write(s.ljust(width, "\0").encode("utf-32-le"))
+        finally:
+            self.abort()
+
+    def abort(self):
+        """Remove the spool files without writing the archive."""
+        for _, f in self._spools.values():
+            f.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+class ParquetWriter:
+    """ParquetWriter streams columns into Parquet files with dictionary-encoded strings.
+
+    A new part file is started when a column appears that the current part
+    does not have, readers unify the schemas of all parts.
+    """
+
+    def __init__(self, path: str):
+        """ParquetWriter constructor.
+
+        :param path: output directory of the part files
+        """
+        self._path = path
+        self._writer = None
+        self._schema = None
+        self._parts = 0
+
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, columns: dict[str, array], string_columns: set[str], lookup):
+        """Append a batch of columns.
+
+        :param columns: column name => array
+        :param string_columns: names of the columns that hold string codes
+        :param lookup: function to map a string code to its value
+        """
+        arrays = {}
+        for name, col in columns.items():
+            if name in string_columns:
+                arrays[name] = pa.array(
+                    [lookup(code) for code in col], pa.string()
+                ).dictionary_encode()
+            elif col.typecode == "q" and name not in HEADER_COLUMNS:
+                arrays[name] = pa.array(col, pa.int64(), mask=[v == NA for v in col])
+            else:
+                # zero-copy view of the array buffer
+                arrays[name] = pa.Array.from_buffers(
+                    _ARROW_TYPES[col.typecode](), len(col), [None, pa.py_buffer(col)]
+                )
+
+        table = pa.table(arrays)
+        if self._schema is not None and set(table.schema.names) - set(
+            self._schema.names
+        ):
+            self._writer.close()
+            self._writer = None
+            self._schema = pa.unify_schemas([self._schema, table.schema])
+
+        if self._writer is None:
+            self._schema = self._schema or table.schema
+            table = _conform(table, self._schema)
+            self._writer = pq.ParquetWriter(
+                os.path.join(self._path, f"part-{self._parts:05d}.parquet"),
+                self._schema,
+                use_dictionary=True,
+                compression="zstd",
+            )
+            self._parts += 1
+        else:
+            table = _conform(table, self._schema)
+
+        self._writer.write_table(table)
+
+    def close(self, strings: list[str]):
+        """Close the current part file.
+
+        :param strings: the string table of the exported trace (unused, values are inlined)
+        """
+        if self._writer is not None:
+            self._writer.close()
+
+    def abort(self):
+        """Close the current part file (parts already written are kept)."""
+        self.close([])
+
+
+def resolve_format(fmt: str) -> str:
+    """Pick the export format (exits when the format is not available).
+
+    :param fmt: parquet, npz, or auto (parquet when pyarrow is installed)
+    """
+    if fmt == "auto":
+        fmt = "parquet" if pa is not None else "npz"
+    if fmt == "parquet" and pa is None:
+        logging.error("pyarrow is not installed, use --format npz")
+        sys.exit(1)
+    return fmt
+
+
+def write_batches(
+    batches, strings: StringTable, target: str, fmt: str, clock: ClockConverter
+) -> int:
+    """Write batches into a Parquet directory or a .npz archive.
+
+    :param batches: batches returned by a TraceReader
+    :param strings: the string table of the reader
+    :param target: the parquet directory or the .npz path
+    :param fmt: parquet or npz
+    :param clock: converter of the trace clock (None to fill wall with NaN)
+    :return: the number of written records
+    """
+    writer = ParquetWriter(target) if fmt == "parquet" else NpzWriter(target)
+
+    rows = 0
+    try:
+        for batch in batches:
+            columns = batch_columns(batch, clock)
+            if fmt == "parquet":
+                codes = {arg_column(key) for key in batch.strs}
+                writer.write(columns, codes | set(STRING_COLUMNS), strings.lookup)
+            else:
+                writer.write(columns)
+            rows += len(batch)
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.close(list(strings._strings))
+    return rows
+
+
+def export_trace(
+    input_dir: str,
+    output_dir: str,
+    fmt: str = "auto",
+    tracers: list[str] = None,
+    batch_size: int = 64 * 1024,
+) -> list[str]:
+    """Convert the trace logs of an output directory into a columnar format.
+
+    :param input_dir: the tracing output directory (trace_<tracer>_<n>.log files)
+    :param output_dir: the directory to write the exported files
+    :param fmt: parquet, npz, or auto (parquet when pyarrow is installed)
+    :param tracers: tracer names to export (default: all tracers)
+    :param batch_size: number of records per batch
+    :return: list of exported paths
+    """
+    fmt = resolve_format(fmt)
+
+    os.makedirs(output_dir, exist_ok=True)
+    clock = ClockConverter.load(input_dir)
+
+    exported = []
+    for tracer, paths in sorted(trace_files(input_dir).items()):
+        if tracers and tracer not in tracers:
+            continue
+
+        if fmt == "parquet":
+            target = os.path.join(output_dir, tracer)
+        else:
+            target = os.path.join(output_dir, f"{tracer}.npz")
+
+        logging.info(f"exporting {tracer} ({len(paths)} files) to {target}")
+
+        reader = TraceReader(batch_size=batch_size)
+        rows = write_batches(reader.read(paths), reader.strings, target, fmt, clock)
+        logging.info(f"exported {rows} records of {tracer}")
+        exported.append(target)
+
+    return exported
+
+
+def load_export(path: str) -> dict:
+    """Load an exported trace.
+
+    Parquet exports are returned as a pyarrow Table. Npz exports are returned
+    as a dict of numpy arrays (or array.array objects if numpy is not installed),
+    with the `strings` entry holding the values of string codes.
+
+    :param path: a <tracer>.npz file or a <tracer> parquet directory
+    """
+    if os.path.isdir(path):
+        if pa is None:
+            logging.error("pyarrow is not installed")
+            sys.exit(1)
+
+        parts = sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.endswith(".parquet")
+        )
+        tables = [pq.read_table(part) for part in parts]
+        schema = pa.unify_schemas([table.schema for table in tables])
+        return pa.concat_tables([_conform(table, schema) for table in tables])
+
+    if np is not None:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    columns = {}
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            with zf.open(member) as f:
+                dtype, count = _read_npy_header(f)
+                raw = f.read()
+            name = member[: -len(".npy")]
+            if dtype.startswith("<U"):
+                width = int(dtype[2:])
+                text = raw.decode("utf-32-le")
+                columns[name] = [
+                    text[i * width : (i + 1) * width].rstrip("\0") for i in range(count)
+                ]
+            else:
+                col = array(_TYPECODES[dtype])
+                col.frombytes(raw)
+                columns[name] = col
+    return columns
+
+
+def _conform(table, schema):
+    """Add the missing columns of a schema to a table as nulls (in schema order)."""
+    columns = []
+    for field in schema:
+        if field.name in table.schema.names:
+            columns.append(table.column(field.name).cast(field.type))
+        else:
+            columns.append(pa.nulls(len(table), field.type))
+    return pa.table(columns, schema=schema)
+
+
+def _fill(f, typecode: str, count: int):
+    """Write count missing values to a spool file."""
+    chunk = 64 * 1024
+    block = array(typecode, [_MISSING[typecode]]) * min(count, chunk)
+    while count > 0:
+        block[: min(count, chunk)].tofile(f)
+        count -= chunk
+
+
+def _npy_header(dtype: str, count: int) -> bytes:
+    """Build a version 1.0 .npy header for a 1-d array."""
+    header = f"{{'descr': '{dtype}', 'fortran_order': False, 'shape': ({count},), }}"
+    header += " " * (64 - (10 + len(header) + 1) % 64) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode()
+
+
+def _read_npy_header(f) -> tuple[str, int]:
+    """Read a .npy header and return the dtype and the number of items."""
+    magic = f.read(8)
+    if magic[:6] != b"\x93NUMPY":
+        raise ValueError("not a npy file")
+    size = int.from_bytes(f.read(2 if magic[6] == 1 else 4), "little")
+    header = ast.literal_eval(f.read(size).decode())
+    return header["descr"], header["shape"][0]
@@ -0,0 +1,214 @@
+import logging
+
+from src.pairing import FLAG_ONESHOT, LatencyStats, Pairer, pair_events
+from src.parser import read_trace
+
+# fds that the tracers seed for every tracked process
+STD_FDS = {0: "STDIN", 1: "STDOUT", 2: "STDERR"}
+
+OPEN_OPS = ("open", "openat", "creat")
+DUP_OPS = ("dup", "dup2", "dup3")
+READ_OPS = ("read", "pread64", "readv", "preadv")
+WRITE_OPS = ("write", "pwrite64", "writev", "pwritev")
+# copies between two fds, fd is the source and out_fd the destination
+TRANSFER_OPS = ("sendfile64", "splice", "copy_file_range")
+SYNC_OPS = ("fsync", "fdatasync", "sync_file_range")
+
+# io_uring request flag set when the fd of the request is a registered file index
+URING_FIXED_FILE = 1
+
+
+def unknown_path(pid: int, fd: int) -> str:
+    """Name of a fd that was opened before tracing started.
+
+    :param pid: process id
+    :param fd: file descriptor
+    """
+    return f"<pid {pid} fd {fd}>"
+
+
+class FdTable:
+    """FdTable keeps the live file descriptors of every traced process.
+
+    Memory is bounded by the number of live fds, the table is updated by
+    open/openat/creat/dup/dup2/dup3/close, and fork/exec/process exit records.
+    """
+
+    def __init__(self):
+        self._tables = {}  # pid => {fd: path}
+
+    def resolve(self, pid: int, fd: int) -> str:
+        """Return the path of a fd.
+
+        :param pid: process id
+        :param fd: file descriptor
+        """
+        path = self._table(pid).get(fd)
+        return path if path is not None else unknown_path(pid, fd)
+
+    def update(self, record) -> str:
+        """Update the table with a paired record and return the path it refers to.
+
+        :param record: a Latency record returned by a Pairer
+        :return: the path of the fd used by the record (None if it has no fd)
+        """
+        op = record.op
+        args = record.args
+        ret = record.ret
+
+        if record.flags & FLAG_ONESHOT:
+            self._process_event(record)
+            return None
+
+        if op in OPEN_OPS:
+            if ret is not None and ret >= 0 and "fname" in args:
+                self._table(record.pid)[ret] = args["fname"]
+            return args.get("fname")
+
+        if op in DUP_OPS:
+            oldfd = args.get("fd", args.get("oldfd"))
+            if oldfd is None:
+                return None
+            path = self.resolve(record.pid, oldfd)
+            if ret is not None and ret >= 0:
+                self._table(record.pid)[ret] = path
+            return path
+
+        fd = args.get("fd")
+        if fd is None:
+            return None
+        if op == "io_uring_sqe" and (fd < 0 or args.get("flags", 0) & URING_FIXED_FILE):
+            return None
+
+        path = self.resolve(record.pid, fd)
+        if op == "close" and ret == 0:
+            self._table(record.pid).pop(fd, None)
+        return path
+
+    def files(self, pid: int) -> dict[int, str]:
+        """Return the live fds of a process (fd => path).
+
+        :param pid: process id
+        """
+        return dict(self._tables.get(pid, {}))
+
+    def live(self) -> int:
+        """Return the number of live fds in all tables."""
+        return sum(len(table) for table in self._tables.values())
+
+    def _table(self, pid: int) -> dict:
+        table = self._tables.get(pid)
+        if table is None:
+            table = self._tables[pid] = dict(STD_FDS)
+        return table
+
+    def _process_event(self, record):
+        if record.op == "fork":
+            # child processes inherit the fd table of the parent
+            child = record.args.get("pid")
+            if child is not None:
+                self._tables[child] = dict(self._table(record.pid))
+        elif record.op == "exec":
+            # fds stay open across exec, only the pid may change
+            new_pid = record.args.get("pid")
+            if new_pid is not None and new_pid != record.pid:
+                self._tables[new_pid] = self._tables.pop(record.pid, dict(STD_FDS))
+        elif record.op == "process":
+            # the table of a process (or the copy made for a new thread) dies with it
+            self._tables.pop(record.tid, None)
+
+
+class FileSummary:
+    """FileSummary holds the access statistics of a single file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ops = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.latencies = LatencyStats()
+
+    def record(self, op: str, ret: int, latency: int):
+        """Record a syscall on the file.
+
+        :param op: syscall name
+        :param ret: syscall return value
+        :param latency: syscall latency in nanoseconds
+        """
+        self.ops[op] = self.ops.get(op, 0) + 1
+        if ret is not None and ret > 0:
+            if op in READ_OPS or op in TRANSFER_OPS:
+                self.bytes_read += ret
+            elif op in WRITE_OPS:
+                self.bytes_written += ret
+        if latency is not None:
+            self.latencies.record(op, latency)
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "ops": dict(sorted(self.ops.items())),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "latency": self.latencies.summary(),
+        }
+
+
+class FileResolver:
+    """FileResolver tags paired records with file paths and summarizes them per file."""
+
+    def __init__(self, pairer: Pairer = None):
+        """FileResolver constructor.
+
+        :param pairer: the pairer to use (it must emit oneshot records)
+        """
+        self.pairer = pairer if pairer is not None else Pairer(emit_oneshots=True)
+        self.fds = FdTable()
+        self.files = {}  # path => FileSummary
+
+    def resolve(self, batches):
+        """Pair the batches and yield (record, path) for every record that uses a file.
+
+        :param batches: batches returned by the TraceReader
+        """
+        files = self.files
+        for record in pair_events(batches, self.pairer):
+            path = self.fds.update(record)
+            if path is None or record.latency is None:
+                continue
+
+            summary = files.get(path)
+            if summary is None:
+                summary = files[path] = FileSummary(path)
+            summary.record(record.op, record.ret, record.latency)
+
+            yield record, path
+
+    def summary(self) -> list[dict]:
+        """Return the per-file summaries, the most accessed files first."""
+        return [
+            summary.as_dict()
+            for summary in sorted(
+                self.files.values(),
+                key=lambda s: (s.bytes_read + s.bytes_written, sum(s.ops.values())),
+                reverse=True,
+            )
+        ]
+
+
+def summarize_files(output_dir: str, tracer: str = "io") -> FileResolver:
+    """Build the per-file summary of a tracer output in a single pass.
+
+    :param output_dir: the tracing output directory
+    :param tracer: tracer name (e.g. io or memory)
+    :return: the resolver with the per-file results
+    """
+    resolver = FileResolver()
+    for _ in resolver.resolve(read_trace(output_dir, tracer)):
+        pass
+
+    logging.info(
+        f"resolved {len(resolver.files)} files, {resolver.fds.live()} live fds left"
+    )
+
+    return resolver
@@ -12,12 +12,35 @@ def create_dir(directory: str):
     os.makedirs(directory, exist_ok=True)
 
 
-def get_tracing_scripts(dir_path: str) -> dict[str:str]:
+def get_tracing_scripts(
+    dir_path: str, mode: str = "trace", block: bool = False, uring: bool = False
+) -> dict[str:str]:
     """Return the path of tracing scripts based on input directory path.
 
     :param dir_path: base directory of the target tracer
+    :param mode: trace (a record per event), combined (trace with one script for
+        io and memory) or aggregate (periodic map dumps)
+    :param block: add the page cache and block tracer (trace and combined modes)
+    :param uring: use the io scripts that trace every io_uring request (Linux 5.19+)
     """
-    return {
-        "io": os.path.join(dir_path, "io_trace.bt"),
+    io = "io_uring" if uring else "io"
+
+    if mode == "combined":
+        name = "combined"
+        name += "_uring" if uring else ""
+        name += "_block" if block else ""
+        return {"combined": os.path.join(dir_path, f"{name}_trace.bt")}
+
+    if mode == "aggregate":
+        return {
+            "io_aggregate": os.path.join(dir_path, f"{io}_aggregate.bt"),
+            "memory_aggregate": os.path.join(dir_path, "memory_aggregate.bt"),
+        }
+
+    scripts = {
+        "io": os.path.join(dir_path, f"{io}_trace.bt"),
         "memory": os.path.join(dir_path, "memory_trace.bt"),
     }
+    if block:
+        scripts["block"] = os.path.join(dir_path, "block_trace.bt")
+    return scripts
@@ -1,13 +1,19 @@
+import logging
+import os
+import sys
+
 from src.files import get_tracing_scripts
-from src.tracer import MonoTracer, RotateTracer, Tracer
+from src.options import TracerOptions
+from src.scripts import must_know_ops, probed_ops, script_outputs, select_script
+from src.targets import Target
+from src.tracer import MonoTracer, MultiTracer, RotateTracer, SplitTracer, Tracer
 from src.utils import ensure_script
 
 
 def handle_execute(
     output_dir: str,
     execute: str,
-    rotate: bool = False,
-    rotate_size: int = 100 * 1024 * 1024,
+    options: TracerOptions = None,
 ) -> list[Tracer]:
     """Handle the execute command.
 
@@ -15,14 +21,14 @@ def handle_execute(
 
     :param output_dir: tracing output directory
     :param execute: the command to execute
-    :param rotate: enable rotate tracing
-    :param rotate_size: set the rotation size
+    :param options: tracer options (rotation, compression, retention)
     :return: list of tracing scripts
     """
     tracers = []
 
-    for tname, tpath in get_tracing_scripts("bpftrace/execute").items():
-        tracer = __new_tracer(tname, tpath, output_dir, rotate, rotate_size)
+    scripts = __scripts("bpftrace/execute", options)
+    for tname, tpath in scripts.items():
+        tracer = __new_tracer(tname, tpath, output_dir, options)
         tracer.with_options(["-c", execute])
         tracers.append(tracer)
 
@@ -32,8 +38,7 @@ def handle_execute(
 def handle_pid(
     output_dir: str,
     pid: str,
-    rotate: bool = False,
-    rotate_size: int = 100 * 1024 * 1024,
+    options: TracerOptions = None,
 ) -> list[Tracer]:
     """Handle the pid tracing.
 
@@ -41,14 +46,14 @@ def handle_pid(
 
     :param output_dir: tracing output directory
     :param pid: the pid to trace
-    :param rotate: enable rotate tracing
-    :param rotate_size: set the rotation size
+    :param options: tracer options (rotation, compression, retention)
     :return: list of tracing scripts
     """
     tracers = []
 
-    for tname, tpath in get_tracing_scripts("bpftrace/pid").items():
-        tracer = __new_tracer(tname, tpath, output_dir, rotate, rotate_size)
+    scripts = __scripts("bpftrace/pid", options)
+    for tname, tpath in scripts.items():
+        tracer = __new_tracer(tname, tpath, output_dir, options)
         tracer.with_args([pid])
         tracers.append(tracer)
 
@@ -58,8 +63,7 @@ def handle_pid(
 def handle_command(
     output_dir: str,
     command: str,
-    rotate: bool = False,
-    rotate_size: int = 100 * 1024 * 1024,
+    options: TracerOptions = None,
 ) -> list[Tracer]:
     """Handle the command tracing.
 
@@ -67,14 +71,14 @@ def handle_command(
 
     :param output_dir: tracing output directory
     :param command: the command to trace
-    :param rotate: enable rotate tracing
-    :param rotate_size: set the rotation size
+    :param options: tracer options (rotation, compression, retention)
     :return: list of tracing scripts
     """
     tracers = []
 
-    for tname, tpath in get_tracing_scripts("bpftrace/command").items():
-        tracer = __new_tracer(tname, tpath, output_dir, rotate, rotate_size)
+    scripts = __scripts("bpftrace/command", options)
+    for tname, tpath in scripts.items():
+        tracer = __new_tracer(tname, tpath, output_dir, options)
         tracer.with_args([command])
         tracers.append(tracer)
 
@@ -85,8 +89,7 @@ def handle_cgroup_and_command(
     output_dir: str,
     cgid: str,
     filter_command: str,
-    rotate: bool = False,
-    rotate_size: int = 100 * 1024 * 1024,
+    options: TracerOptions = None,
 ) -> list[Tracer]:
     """Handle the cgroup and command tracing.
 
@@ -95,14 +98,14 @@ def handle_cgroup_and_command(
     :param output_dir: tracing output directory
     :param cgid: the cgroup to trace
     :param filter_command: the command to filter
-    :param rotate: enable rotate tracing
-    :param rotate_size: set the rotation size
+    :param options: tracer options (rotation, compression, retention)
     :return: list of tracing scripts
     """
     tracers = []
 
-    for tname, tpath in get_tracing_scripts("bpftrace/cgroup_and_command").items():
-        tracer = __new_tracer(tname, tpath, output_dir, rotate, rotate_size)
+    scripts = __scripts("bpftrace/cgroup_and_command", options)
+    for tname, tpath in scripts.items():
+        tracer = __new_tracer(tname, tpath, output_dir, options)
         tracer.with_args([cgid, filter_command])
         tracers.append(tracer)
 
@@ -112,8 +115,7 @@ def handle_cgroup_and_command(
 def handle_cgroup(
     output_dir: str,
     cgid: str,
-    rotate: bool = False,
-    rotate_size: int = 100 * 1024 * 1024,
+    options: TracerOptions = None,
 ) -> list[Tracer]:
     """Handle the cgroup tracing.
 
@@ -121,32 +123,122 @@ def handle_cgroup(
 
     :param output_dir: tracing output directory
     :param cgid: the cgroup to trace
-    :param rotate: enable rotate tracing
-    :param rotate_size: set the rotation size
+    :param options: tracer options (rotation, compression, retention)
     :return: list of tracing scripts
     """
     tracers = []
 
-    for tname, tpath in get_tracing_scripts("bpftrace/cgroup").items():
-        tracer = __new_tracer(tname, tpath, output_dir, rotate, rotate_size)
+    scripts = __scripts("bpftrace/cgroup", options)
+    for tname, tpath in scripts.items():
+        tracer = __new_tracer(tname, tpath, output_dir, options)
         tracer.with_args([cgid])
         tracers.append(tracer)
 
     return tracers
 
 
+def handle_multi(
+    output_dir: str,
+    targets: list[Target],
+    options: TracerOptions = None,
+) -> list[Tracer]:
+    """Handle the multi-target tracing (one bpftrace per tracer for all cgroups).
+
+    running: bpftrace bpftrace/multi/<tracer>.bt <controller pid>
+
+    :param output_dir: tracing output directory
+    :param targets: the cgroups to trace (more can be added at runtime)
+    :param options: tracer options (rotation, compression, retention)
+    :return: list of tracing scripts
+    """
+    options = options if options is not None else TracerOptions()
+    if options.mode != "trace":
+        logging.error(f"{options.mode} mode does not support multiple targets")
+        sys.exit(1)
+
+    tracers = []
+
+    scripts = __scripts("bpftrace/multi", options)
+    for tname, tpath in scripts.items():
+        ensure_script(tpath)
+
+        tracer = MultiTracer(tname, tpath, output_dir)
+        tracer.with_args([str(os.getpid())])
+        tracer.with_sampling(options.sample_rate, options.sample_by)
+        if options.rotate:
+            tracer.with_rotate_size(rotate_size=options.rotate_size)
+            tracer.with_segment_worker(
+                options.compress, options.retention, options.index
+            )
+        else:
+            tracer.with_segment_worker(index=options.index)
+        for target in targets:
+            tracer.add_target(target)
+        tracers.append(tracer)
+
+    return tracers
+
+
+def __scripts(dir_path: str, options: TracerOptions = None) -> dict[str:str]:
+    """Get the tracing scripts for the mode and operation selection of the options.
+    tracers that have none of the selected operations are left out.
+    """
+    options = options if options is not None else TracerOptions()
+
+    scripts = get_tracing_scripts(dir_path, options.mode, options.block, options.uring)
+    if not options.selects_ops():
+        return scripts
+
+    available = set()
+    for path in scripts.values():
+        ensure_script(path)
+        with open(path) as f:
+            available.update(probed_ops(f.read()))
+    must_know_ops((options.syscalls or []) + (options.exclude or []), available)
+
+    selected = {}
+    for name, path in scripts.items():
+        rendered = select_script(
+            path, options.syscalls, options.exclude, options.script_cache
+        )
+        if rendered is None:
+            logging.info(f"no selected operations in {name} tracer, skipping it")
+            continue
+        selected[name] = rendered
+
+    return selected
+
+
 def __new_tracer(
-    name: str, path: str, output_dir: str, rotate: str, rotate_size: int
+    name: str, path: str, output_dir: str, options: TracerOptions = None
 ) -> Tracer:
     """Create a new tracer based on the inputs.
     it also checks if the tracer script exists.
     """
     ensure_script(path)
 
-    if rotate:
+    options = options if options is not None else TracerOptions()
+
+    if options.mode == "combined":
+        tracer = SplitTracer(name, path, output_dir)
+        with open(path) as f:
+            tracer.with_outputs(script_outputs(f.read()))
+        if options.rotate:
+            tracer.with_rotate_size(rotate_size=options.rotate_size)
+            tracer.with_segment_worker(
+                options.compress, options.retention, options.index
+            )
+        else:
+            tracer.with_segment_worker(index=options.index)
+    elif options.rotate:
         tracer = RotateTracer(name, path, output_dir)
-        tracer.with_rotate_size(rotate_size=rotate_size)
+        tracer.with_rotate_size(rotate_size=options.rotate_size)
+        tracer.with_segment_worker(options.compress, options.retention, options.index)
     else:
         tracer = MonoTracer(name, path, output_dir)
+        if options.index:
+            tracer.with_index()
+
+    tracer.with_sampling(options.sample_rate, options.sample_by)
 
     return tracer
@@ -0,0 +1,121 @@
+# number of sub-buckets per power of two is 2^SUB_BITS (relative error <= 1/2^SUB_BITS)
+SUB_BITS = 3
+
+_EXACT = 1 << (SUB_BITS + 1)
+
+
+def bucket_index(value: int) -> int:
+    """Map a non-negative value to its log-linear bucket.
+
+    :param value: the value to map
+    """
+    if value < _EXACT:
+        return value if value > 0 else 0
+
+    shift = value.bit_length() - 1 - SUB_BITS
+    return (shift << SUB_BITS) + (value >> shift)
+
+
+def bucket_bounds(index: int) -> tuple[int, int]:
+    """Return the [low, high) range of a bucket.
+
+    :param index: the bucket index
+    """
+    if index < _EXACT:
+        return index, index + 1
+
+    shift = (index >> SUB_BITS) - 1
+    mantissa = index - (shift << SUB_BITS)
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class LogHistogram:
+    """LogHistogram is a streaming log-linear histogram for latencies and sizes.
+
+    Memory is fixed (a few hundred counters), no matter how many values are recorded.
+    """
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value: int, times: int = 1):
+        """Record a value.
+
+        :param value: the value to record (negative values are recorded as 0)
+        :param times: number of occurrences
+        """
+        value = max(value, 0)
+        index = bucket_index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += times
+
+        self.count += times
+        self.total += value * times
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogHistogram"):
+        """Add the values of another histogram to this one.
+
+        :param other: the histogram to merge
+        """
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, q: float) -> int:
+        """Return the value at a percentile (e.g. 50, 99, 99.9).
+
+        :param q: the percentile in [0, 100]
+        """
+        if self.count == 0:
+            return None
+
+        rank = max(1, int(round(self.count * q / 100.0)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low, high = bucket_bounds(index)
+                return min(max((low + high - 1) // 2, self.min), self.max)
+
+        return self.max
+
+    def mean(self) -> float:
+        """Return the mean of recorded values."""
+        return self.total / self.count if self.count else None
+
+    def buckets(self):
+        """Yield (low, high, count) for every non-empty bucket."""
+        for index, count in enumerate(self.counts):
+            if count:
+                low, high = bucket_bounds(index)
+                yield low, high, count
+
+    def summary(self) -> dict:
+        """Return count, mean, min, max and the p50/p99/p999 percentiles."""
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "min": self.min,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+        }
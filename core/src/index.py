@@ -0,0 +1,287 @@
+import bisect
+import itertools
+import json
+import logging
+import os
+import re
+
+from src.compression import EXTENSIONS, index_path, open_segment
+from src.parser import trace_files
+
+INDEX_VERSION = 1
+DEFAULT_INTERVAL = 4096  # events per checkpoint block
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+
+_EVENT = re.compile(
+    rb"^(\d+) \{pid=(-?\d+) tid=(-?\d+) proc=(.*?)\}\{E[NX] (\w+)\}", re.M
+)
+
+
+class SegmentIndex:
+    """SegmentIndex summarizes a trace segment so queries can skip it or seek into it.
+
+    It holds the time range, the pids, tids, comms, and the event count per
+    operation of the segment, plus a checkpoint every `interval` events:
+    (byte offset, events, min ts, max ts) of the block that starts there.
+    Offsets are positions in the uncompressed segment.
+    """
+
+    def __init__(self, segment: str, interval: int = DEFAULT_INTERVAL):
+        """SegmentIndex constructor.
+
+        :param segment: the segment file name
+        :param interval: events per checkpoint block
+        """
+        self.segment = segment
+        self.interval = interval
+
+        self.size = 0  # indexed bytes
+        self.events = 0
+        self.min_ts = None
+        self.max_ts = None
+        self.pids = set()
+        self.tids = set()
+        self.comms = set()
+        self.ops = {}  # op => events
+        self.checkpoints = []  # [offset, events, min ts, max ts]
+
+    def feed(self, data: bytes):
+        """Index a chunk of complete lines that follows the previous chunk.
+
+        :param data: segment content ending with a newline
+        """
+        pids, tids, comms, ops = self.pids, self.tids, self.comms, self.ops
+        checkpoints = self.checkpoints
+        block = checkpoints[-1] if checkpoints else None
+
+        for m in _EVENT.finditer(data):
+            ts, pid, tid, comm, op = m.groups()
+            ts = int(ts)
+
+            if block is None or block[1] == self.interval:
+                block = [self.size + m.start(), 0, ts, ts]
+                checkpoints.append(block)
+            block[1] += 1
+            if ts < block[2]:
+                block[2] = ts
+            elif ts > block[3]:
+                block[3] = ts
+
+            pids.add(pid)
+            tids.add(tid)
+            comms.add(comm)
+            ops[op] = ops.get(op, 0) + 1
+
+        self.size += len(data)
+
+    def finish(self):
+        """Compute the totals after the last chunk."""
+        self.pids = {int(pid) for pid in self.pids}
+        self.tids = {int(tid) for tid in self.tids}
+        self.comms = {comm.decode(errors="replace") for comm in self.comms}
+        self.ops = {op.decode(): n for op, n in sorted(self.ops.items())}
+        self.events = sum(block[1] for block in self.checkpoints)
+        if self.checkpoints:
+            self.min_ts = min(block[2] for block in self.checkpoints)
+            self.max_ts = max(block[3] for block in self.checkpoints)
+
+    def may_match(
+        self,
+        pids: set[int] = None,
+        tids: set[int] = None,
+        comms: set[str] = None,
+        ops: set[str] = None,
+        start: int = None,
+        end: int = None,
+    ) -> bool:
+        """Check if the segment may have events that match a query (None matches all).
+
+        :param pids: process ids
+        :param tids: thread ids
+        :param comms: command names
+        :param ops: operations
+        :param start: first timestamp (nsecs)
+        :param end: last timestamp (nsecs)
+        """
+        if not self.events:
+            return False
+        if start is not None and self.max_ts < start:
+            return False
+        if end is not None and self.min_ts > end:
+            return False
+        if pids is not None and not pids & self.pids:
+            return False
+        if tids is not None and not tids & self.tids:
+            return False
+        if comms is not None and not comms & self.comms:
+            return False
+        if ops is not None and not ops & set(self.ops):
+            return False
+        return True
+
+    def ranges(self, start: int = None, end: int = None) -> list[tuple[int, int]]:
+        """Get the byte ranges of the blocks that overlap a time range.
+
+        :param start: first timestamp (nsecs, None for the beginning)
+        :param end: last timestamp (nsecs, None for the end)
+        :return: merged (begin, end) byte offsets
+        """
+        bounds = [block[0] for block in self.checkpoints] + [self.size]
+
+        ranges = []
+        for i, (_, _, low, high) in enumerate(self.checkpoints):
+            if (start is not None and high < start) or (end is not None and low > end):
+                continue
+            if ranges and ranges[-1][1] == bounds[i]:
+                ranges[-1] = (ranges[-1][0], bounds[i + 1])
+            else:
+                ranges.append((bounds[i], bounds[i + 1]))
+        return ranges
+
+    def first_ts(self, begin: int, end: int = None) -> int:
+        """Get the smallest timestamp of the blocks that overlap a byte range.
+
+        :param begin: first offset
+        :param end: end offset (None for the end of the segment)
+        :return: the timestamp, None if no block overlaps the range
+        """
+        end = self.size if end is None else end
+        bounds = [block[0] for block in self.checkpoints] + [self.size]
+        return min(
+            (
+                low
+                for i, (_, _, low, _) in enumerate(self.checkpoints)
+                if bounds[i] < end and bounds[i + 1] > begin
+            ),
+            default=None,
+        )
+
+    def seek(self, ts: int) -> int:
+        """Get the offset of the first block that may have events at or after a timestamp.
+
+        :param ts: timestamp (nsecs)
+        """
+        # blocks are not sorted by min ts (CPU buffers interleave), but by max ts almost
+        running = list(itertools.accumulate((b[3] for b in self.checkpoints), max))
+        i = bisect.bisect_left(running, ts)
+        return self.checkpoints[i][0] if i < len(self.checkpoints) else self.size
+
+    def to_dict(self) -> dict:
+        """Get the index as a JSON document (after finish())."""
+        return {
+            "version": INDEX_VERSION,
+            "segment": self.segment,
+            "interval": self.interval,
+            "size": self.size,
+            "events": self.events,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "pids": sorted(self.pids),
+            "tids": sorted(self.tids),
+            "comms": sorted(self.comms),
+            "ops": self.ops,
+            "checkpoints": self.checkpoints,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SegmentIndex":
+        """Load an index from its JSON document."""
+        index = cls(data["segment"], data["interval"])
+        index.size = data["size"]
+        index.events = data["events"]
+        index.min_ts = data["min_ts"]
+        index.max_ts = data["max_ts"]
+        index.pids = set(data["pids"])
+        index.tids = set(data["tids"])
+        index.comms = set(data["comms"])
+        index.ops = data["ops"]
+        index.checkpoints = data["checkpoints"]
+        return index
+
+
+def build_index(path: str, interval: int = DEFAULT_INTERVAL) -> SegmentIndex:
+    """Index a (possibly compressed) trace segment.
+
+    :param path: the segment path
+    :param interval: events per checkpoint block
+    """
+    name = os.path.basename(path)
+    for ext in EXTENSIONS.values():
+        if name.endswith(ext):
+            name = name[: -len(ext)]
+
+    index = SegmentIndex(name, interval)
+    tail = b""
+    with open_segment(path) as f:
+        while data := f.read(READ_CHUNK_SIZE):
+            data = tail + data
+            end = data.rfind(b"\n") + 1
+            tail = data[end:]
+            if end:
+                index.feed(data[:end])
+    if tail:
+        index.feed(tail + b"\n")
+        index.size -= 1  # the segment has no trailing newline
+    index.finish()
+    return index
+
+
+def write_index(path: str, interval: int = DEFAULT_INTERVAL) -> SegmentIndex:
+    """Index a segment and store the index next to it.
+
+    :param path: the segment path
+    :param interval: events per checkpoint block
+    """
+    index = build_index(path, interval)
+
+    target = index_path(path)
+    tmp = target + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp, target)
+
+    logging.debug(f"indexed {index.events} events of {path}")
+    return index
+
+
+def load_index(path: str) -> SegmentIndex:
+    """Load the sidecar index of a segment.
+
+    :param path: the segment path
+    :return: the index, None if the segment has none (or an outdated one)
+    """
+    try:
+        with open(index_path(path)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != INDEX_VERSION:
+        return None
+
+    index = SegmentIndex.from_dict(data)
+    # an index of a segment that was still growing is not valid
+    if not path.endswith(tuple(EXTENSIONS.values())):
+        if os.path.getsize(path) != index.size:
+            return None
+    return index
+
+
+def index_dir(
+    output_dir: str, interval: int = DEFAULT_INTERVAL, force: bool = False
+) -> int:
+    """Index the segments of a tracing output directory that have no valid index.
+
+    :param output_dir: the tracing output directory
+    :param interval: events per checkpoint block
+    :param force: index all segments again
+    :return: the number of indexed segments
+    """
+    count = 0
+    for tracer, paths in trace_files(output_dir).items():
+        for path in paths:
+            if not force and load_index(path) is not None:
+                continue
+            index = write_index(path, interval)
+            logging.info(f"[{tracer}] indexed {path}: {index.events} events")
+            count += 1
+    return count
@@ -0,0 +1,382 @@
+import bisect
+import logging
+
+from collections import namedtuple
+
+from src.fdtable import DUP_OPS, OPEN_OPS, FdTable
+from src.histogram import LogHistogram
+from src.pairing import FLAG_ONESHOT, ONESHOT_OPS, Latency
+from src.parser import KIND_EVENT, NA, PHASE_EN, read_trace
+
+PAGE_SIZE = 4096
+
+# paths of the faults that do not hit a file mapping
+ANONYMOUS = "<anonymous>"
+UNMAPPED = "<unmapped>"  # mapped before tracing started (binaries, heap, stacks)
+
+FAULT_OP = "page_fault_user"
+FAULT_EXIT_OP = "handle_mm_fault"
+
+# calls that change the fd and mapping tables
+CALL_OPS = OPEN_OPS + DUP_OPS + ("close", "mmap", "munmap")
+
+Fault = namedtuple("Fault", ["ts", "pid", "tid", "address", "path", "page", "latency"])
+
+
+class MappingTable:
+    """MappingTable keeps the live mappings of a process as sorted, non-overlapping intervals.
+
+    Mappings of an address space never overlap (a new mapping replaces the
+    pages it covers), so a sorted list searched with bisect is the interval
+    structure: lookups are O(log n), and mmap/munmap only shift the entries
+    after the changed range.
+    """
+
+    def __init__(self, page_size: int = PAGE_SIZE):
+        """MappingTable constructor.
+
+        :param page_size: the page size of the traced host
+        """
+        self._page_size = page_size
+        self._starts = []  # sorted start addresses
+        self._entries = []  # (start, end, path, file offset of start)
+
+    def copy(self) -> "MappingTable":
+        """Get a copy of the table (fork)."""
+        table = MappingTable(self._page_size)
+        table._starts = list(self._starts)
+        table._entries = list(self._entries)
+        return table
+
+    def map(self, start: int, length: int, path: str, offset: int):
+        """Add a mapping, it replaces the mappings it overlaps.
+
+        :param start: the address returned by mmap
+        :param length: the mapping length (rounded up to pages)
+        :param path: the mapped file (ANONYMOUS for anonymous memory)
+        :param offset: the file offset of the first page
+        """
+        length = self._round(length)
+        self.unmap(start, length)
+
+        i = bisect.bisect_left(self._starts, start)
+        self._starts.insert(i, start)
+        self._entries.insert(i, (start, start + length, path, offset))
+
+    def unmap(self, start: int, length: int):
+        """Remove an address range, the mappings it covers partially are split.
+
+        :param start: the first address
+        :param length: the range length (rounded up to pages)
+        """
+        end = start + self._round(length)
+        starts, entries = self._starts, self._entries
+
+        i = bisect.bisect_right(starts, start) - 1
+        if i < 0 or entries[i][1] <= start:
+            i += 1
+        j = i
+        kept = []
+        while j < len(entries) and entries[j][0] < end:
+            low, high, path, offset = entries[j]
+            if low < start:
+                kept.append((low, start, path, offset))
+            if high > end:
+                kept.append((end, high, path, offset + end - low))
+            j += 1
+
+        if j > i:
+            entries[i:j] = kept
+            starts[i:j] = [entry[0] for entry in kept]
+
+    def lookup(self, address: int) -> tuple:
+        """Find the mapping of an address.
+
+        :param address: the faulting address
+        :return: (path, file offset of the address), None if it is not mapped
+        """
+        i = bisect.bisect_right(self._starts, address) - 1
+        if i < 0:
+            return None
+        start, end, path, offset = self._entries[i]
+        if address >= end:
+            return None
+        return path, offset + address - start
+
+    def _round(self, length: int) -> int:
+        return -(-length // self._page_size) * self._page_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FileFaults:
+    """FileFaults holds the page faults of a file: counts, latencies, and a page heatmap.
+
+    The heatmap counts faults in cells of `time_bin` nsecs by `page_bin` pages,
+    so its size depends on the touched range and not on the number of faults.
+    """
+
+    def __init__(self, path: str, time_bin: int, page_bin: int):
+        """FileFaults constructor.
+
+        :param path: the file path (or ANONYMOUS/UNMAPPED)
+        :param time_bin: nsecs per heatmap row
+        :param page_bin: pages per heatmap column
+        """
+        self.path = path
+        self.time_bin = time_bin
+        self.page_bin = page_bin
+
+        self.faults = 0
+        self.pages = set()
+        self.latency = LogHistogram()
+        self.cells = {}  # (time bin, page bin) => faults
+
+    def record(self, ts: int, page: int, latency: int):
+        """Record a fault.
+
+        :param ts: fault timestamp (nsecs)
+        :param page: the file page (None for faults outside file mappings)
+        :param latency: handle_mm_fault latency in nsecs (None if unknown)
+        """
+        self.faults += 1
+        if latency is not None:
+            self.latency.record(latency)
+        if page is not None:
+            self.pages.add(page)
+            key = (ts // self.time_bin, page // self.page_bin)
+            self.cells[key] = self.cells.get(key, 0) + 1
+
+    def heatmap(self) -> list[tuple[int, int, int]]:
+        """Get the heatmap cells as (first nsecs, first page, faults), ordered by time."""
+        return [
+            (t * self.time_bin, p * self.page_bin, n)
+            for (t, p), n in sorted(self.cells.items())
+        ]
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "faults": self.faults,
+            "pages": len(self.pages),
+            # faults beyond the first one of each page (evicted or reclaimed pages)
+            "refaults": self.faults - len(self.pages) if self.pages else None,
+            "first_page": min(self.pages) if self.pages else None,
+            "last_page": max(self.pages) if self.pages else None,
+            "latency": self.latency.summary(),
+        }
+
+
+class FaultResolver:
+    """FaultResolver attributes page faults to the file and page they hit.
+
+    mmap exits add mappings to per-process MappingTable objects (fds are
+    resolved by an FdTable), munmap removes them, fork copies them and exec
+    drops them. Each page_fault_user event is looked up in the table of its
+    process and paired with the next handle_mm_fault exit of its thread for
+    the latency.
+
+    Faults are most of the memory trace, so the batches are walked column by
+    column instead of through a Pairer, only the calls that change the fd and
+    mapping tables are paired into Latency records.
+    """
+
+    def __init__(
+        self,
+        page_size: int = PAGE_SIZE,
+        time_bin: int = 1_000_000_000,
+        page_bin: int = 256,
+    ):
+        """FaultResolver constructor.
+
+        :param page_size: the page size of the traced host
+        :param time_bin: nsecs per heatmap row
+        :param page_bin: pages per heatmap column
+        """
+        self.page_size = page_size
+        self.time_bin = time_bin
+        self.page_bin = page_bin
+
+        self.fds = FdTable()
+        self.files = {}  # path => FileFaults
+        self._tables = {}  # pid => MappingTable
+        self._faults = {}  # tid => (ts, pid, address) of the pending fault
+        self._calls = {}  # (tid, op) => (ts, pid, args) of the pending calls
+
+    def resolve(self, batches):
+        """Yield a Fault for every page fault of the batches.
+
+        :param batches: batches returned by the TraceReader
+        """
+        for batch in batches:
+            yield from self._feed(batch)
+
+        # faults without handle_mm_fault exit
+        for tid, entry in self._faults.items():
+            yield self._fault(tid, entry, None)
+        self._faults.clear()
+
+    def summary(self) -> list[dict]:
+        """Return the per-file fault summaries, the most faulted files first."""
+        return [
+            summary.as_dict()
+            for summary in sorted(
+                self.files.values(), key=lambda s: s.faults, reverse=True
+            )
+        ]
+
+    def mappings(self) -> int:
+        """Return the number of live mappings in all tables."""
+        return sum(len(table) for table in self._tables.values())
+
+    def _feed(self, batch):
+        strings = batch.strings
+        lookup = strings.lookup
+        fault_en = strings.code(FAULT_OP)
+        fault_ex = strings.code(FAULT_EXIT_OP)
+        calls = {strings.code(op) for op in CALL_OPS} - {-1}
+        oneshots = {strings.code(op) for op in ONESHOT_OPS} - {-1}
+
+        faults = self._faults
+        pending = self._calls
+        fault = self._fault
+        addrs = batch.ints.get("addr")
+        rets = batch.ints.get("ret")
+        kinds, ts_col, pid_col, tid_col = batch.kind, batch.ts, batch.pid, batch.tid
+        phase_col, op_col = batch.phase, batch.op
+
+        for i in range(len(ts_col)):
+            if kinds[i] != KIND_EVENT:
+                continue
+            op = op_col[i]
+
+            if op == fault_en:
+                tid = tid_col[i]
+                entry = faults.pop(tid, None)
+                if entry is not None:
+                    yield fault(tid, entry, None)
+                faults[tid] = (ts_col[i], pid_col[i], addrs[i])
+
+            elif op == fault_ex:
+                tid = tid_col[i]
+                entry = faults.pop(tid, None)
+                if entry is not None:
+                    yield fault(tid, entry, ts_col[i] - entry[0])
+
+            elif op in calls:
+                key = (tid_col[i], op)
+                if phase_col[i] == PHASE_EN:
+                    pending[key] = (ts_col[i], pid_col[i], batch.args(i))
+                    continue
+                entry = pending.pop(key, None)
+                if entry is None:
+                    continue
+                ts, pid, args = entry
+                ret = rets[i] if rets is not None and rets[i] != NA else None
+                self._call(
+                    Latency(
+                        ts, pid, key[0], None, lookup(op), ts_col[i] - ts, ret, args, 0
+                    )
+                )
+
+            elif op in oneshots:
+                record = Latency(
+                    ts_col[i],
+                    pid_col[i],
+                    tid_col[i],
+                    None,
+                    lookup(op),
+                    0,
+                    None,
+                    batch.args(i),
+                    FLAG_ONESHOT,
+                )
+                if record.op == "process":
+                    entry = faults.pop(record.tid, None)
+                    if entry is not None:
+                        yield fault(record.tid, entry, None)
+                self._process_event(record)
+                self.fds.update(record)
+
+    def _fault(self, tid: int, entry: tuple, latency: int) -> Fault:
+        ts, pid, address = entry
+        table = self._tables.get(pid)
+        hit = table.lookup(address) if table is not None and address != NA else None
+        if hit is None:
+            path, page = UNMAPPED, None
+        else:
+            path, offset = hit
+            page = offset // self.page_size if path != ANONYMOUS else None
+
+        summary = self.files.get(path)
+        if summary is None:
+            summary = self.files[path] = FileFaults(path, self.time_bin, self.page_bin)
+        summary.record(ts, page, latency)
+        return Fault(ts, pid, tid, address, path, page, latency)
+
+    def _call(self, record: Latency):
+        args = record.args
+        if record.op == "mmap":
+            if record.ret is None or record.ret < 0:
+                return
+            fd = args.get("fd", -1)
+            path = ANONYMOUS if fd < 0 else self.fds.resolve(record.pid, fd)
+            self._table(record.pid).map(
+                record.ret, args.get("len", 0), path, args.get("off", 0)
+            )
+        elif record.op == "munmap":
+            table = self._tables.get(record.pid)
+            if table is not None and record.ret == 0 and "addr" in args:
+                table.unmap(args["addr"], args.get("len", 0))
+        else:
+            self.fds.update(record)
+
+    def _table(self, pid: int) -> MappingTable:
+        table = self._tables.get(pid)
+        if table is None:
+            table = self._tables[pid] = MappingTable(self.page_size)
+        return table
+
+    def _process_event(self, record: Latency):
+        if record.op == "fork":
+            # threads and child processes start with the mappings of the parent
+            child = record.args.get("pid")
+            if child is not None:
+                self._tables[child] = self._table(record.pid).copy()
+        elif record.op == "exec":
+            # exec replaces the address space
+            self._tables.pop(record.pid, None)
+            new_pid = record.args.get("pid")
+            if new_pid is not None:
+                self._tables.pop(new_pid, None)
+        elif record.op == "process":
+            self._tables.pop(record.tid, None)
+
+
+def attribute_faults(
+    output_dir: str,
+    tracer: str = "memory",
+    page_size: int = PAGE_SIZE,
+    time_bin: int = 1_000_000_000,
+    page_bin: int = 256,
+) -> FaultResolver:
+    """Attribute the page faults of a memory tracer output in a single pass.
+
+    :param output_dir: the tracing output directory
+    :param tracer: tracer name (memory, or a tracer with mmap and fault events)
+    :param page_size: the page size of the traced host
+    :param time_bin: nsecs per heatmap row
+    :param page_bin: pages per heatmap column
+    :return: the resolver with the per-file results
+    """
+    resolver = FaultResolver(page_size, time_bin, page_bin)
+    faults = 0
+    for _ in resolver.resolve(read_trace(output_dir, tracer)):
+        faults += 1
+
+    logging.info(
+        f"attributed {faults} faults to {len(resolver.files)} files, "
+        f"{resolver.mappings()} live mappings left"
+    )
+    return resolver
@@ -1,15 +1,205 @@
+import asyncio
 import logging
+import time
 
+from src.backpressure import BackpressurePolicy
 from src.files import create_dir
-from src.timestamp import export_reference_timestamps
-from src.tracer import Tracer
+from src.metadata import update_metadata
+from src.timestamp import anchor_service, export_reference_timestamps
+from src.tracer import Tracer, TracerReport
 
 
-def ignite_tracing(output_dir: str, tracers: list[Tracer]):
-    """Start the tracers.
+class Supervisor:
+    """Supervisor runs all bpftrace processes of a session on a single event loop.
+
+    Tracers are spawned concurrently and their stdout/stderr are streamed as they
+    arrive. On stop every tracer gets SIGTERM at once and they share one
+    termination deadline, the ones still running after it are killed.
+    With a backpressure policy, tracers that lose too many events are restarted
+    with cheaper settings.
+    """
+
+    def __init__(
+        self,
+        tracers: list[Tracer],
+        termination_timeout: float = None,
+        policy: BackpressurePolicy = None,
+    ):
+        """Supervisor constructor.
+
+        :param tracers: a list of tracers to run
+        :param termination_timeout: shared termination deadline in seconds
+            (default: the largest timeout of the tracers)
+        :param policy: backpressure policy (None to never restart tracers)
+        """
+        self._policy = policy
+        self._restarting = {}  # tracer => kill timer of the terminated process
+        self._tracers = tracers
+        self._tto = termination_timeout
+        if self._tto is None:
+            self._tto = max((t.termination_timeout() for t in tracers), default=2)
+
+        self._loop = None
+        self._stop_event = None
+        self._stop_requested = False
+
+        for tracer in tracers:
+            tracer._supervisor = self
+
+    def stop(self):
+        """Request a shutdown (safe to call from signal handlers and other threads)."""
+        self._stop_requested = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def run(self) -> list[TracerReport]:
+        """Run the tracers until they exit or a stop is requested.
+
+        :return: a report per tracer
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self._stop_requested:
+            self._stop_event.set()
+
+        # start all tracers at once
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(tracer.spawn() for tracer in self._tracers), return_exceptions=True
+        )
+
+        running = []
+        for tracer, result in zip(self._tracers, results):
+            if isinstance(result, BaseException):
+                logging.error(f"[{tracer.name()}] failed to start: {result}")
+            else:
+                running.append(tracer)
+        logging.info(
+            f"{len(running)}/{len(self._tracers)} tracers started in {time.perf_counter() - start:.3f}s"
+        )
+
+        pumps = {
+            asyncio.create_task(self.__supervise(tracer)): tracer for tracer in running
+        }
+        stopper = asyncio.create_task(self._stop_event.wait())
+        monitor = None
+        if self._policy is not None:
+            monitor = asyncio.create_task(self.__monitor(pumps))
+
+        try:
+            pending = set(pumps)
+            while pending and not self._stop_event.is_set():
+                _, pending = await asyncio.wait(
+                    pending | {stopper}, return_when=asyncio.FIRST_COMPLETED
+                )
+                pending.discard(stopper)
+
+            if pending:
+                await self.__shutdown(pumps, pending)
+        finally:
+            stopper.cancel()
+            if monitor is not None:
+                monitor.cancel()
+            for timer in self._restarting.values():
+                timer.cancel()
+            for task in pumps:
+                if not task.done():
+                    task.cancel()
+            for tracer in self._tracers:
+                try:
+                    tracer.close()
+                except Exception as e:
+                    logging.error(f"[{tracer.name()}] failed to close: {e}")
+
+        reports = [tracer.report() for tracer in self._tracers]
+        for report in reports:
+            logging.info(
+                f"[{report.name}] exit status: {report.returncode}, events: {report.events}, "
+                f"lost events: {report.lost_events}, restarts: {report.restarts}"
+            )
+        return reports
+
+    async def __supervise(self, tracer: Tracer) -> int:
+        """Stream a tracer until it exits, restart it when the policy asked for it."""
+        while True:
+            returncode = await tracer.pump()
+
+            timer = self._restarting.pop(tracer, None)
+            if timer is None or self._stop_event.is_set():
+                return returncode
+            timer.cancel()
+
+            try:
+                await tracer.respawn()
+            except Exception as e:
+                logging.error(f"[{tracer.name()}] failed to restart: {e}")
+                return returncode
+
+            if self._stop_event.is_set():
+                tracer.terminate()
+
+    async def __monitor(self, pumps: dict):
+        """Check the loss ratio of every tracer once per policy window."""
+        seen = {}
+        while True:
+            await asyncio.sleep(self._policy.window)
+
+            for task, tracer in pumps.items():
+                if task.done() or tracer in self._restarting:
+                    continue
+
+                events, lost = await asyncio.to_thread(tracer.loss)
+                prev_events, prev_lost = seen.get(tracer, (0, 0))
+                seen[tracer] = (events, lost)
+
+                window_events, window_lost = events - prev_events, lost - prev_lost
+                if not self._policy.exceeded(window_events, window_lost):
+                    continue
+
+                logging.warning(
+                    f"[{tracer.name()}] lost {window_lost} events out of {window_events + window_lost}"
+                )
+                if self._policy.adapt(tracer):
+                    self._restarting[tracer] = self._loop.call_later(
+                        self._tto, tracer.kill
+                    )
+                    tracer.terminate()
+
+    async def __shutdown(self, pumps: dict, pending: set):
+        """Terminate the running tracers with one shared deadline."""
+        start = time.perf_counter()
+        for task in pending:
+            pumps[task].terminate()
+
+        _, pending = await asyncio.wait(pending, timeout=self._tto)
+        if pending:
+            for task in pending:
+                logging.warning(
+                    f"[{pumps[task].name()}] not stopped after {self._tto}s, killing"
+                )
+                pumps[task].kill()
+            await asyncio.wait(pending)
+
+        logging.info(f"tracers stopped in {time.perf_counter() - start:.3f}s")
+
+
+def ignite_tracing(
+    output_dir: str,
+    tracers: list[Tracer],
+    policy: BackpressurePolicy = None,
+    metadata: dict = None,
+    services: list = None,
+) -> list[TracerReport]:
+    """Start the tracers and wait until they are done.
 
     :param output_dir: the output directory to store tracing results
     :param tracers: a list of tracers to run
+    :param policy: backpressure policy (None to never restart tracers)
+    :param metadata: extra session fields to store in the metadata file
+    :param services: coroutine functions to run next to the tracers, they get the
+        supervisor and are cancelled when the tracers are done (the clock anchors
+        of the session are recorded by one of them)
+    :return: a report per tracer
     """
     # create the output directory
     create_dir(output_dir)
@@ -19,16 +209,40 @@ def ignite_tracing(output_dir: str, tracers: list[Tracer]):
     export_reference_timestamps(output_dir)
     logging.debug("reference timestamps exported")
 
-    # loop over tracers and start
-    for tracer in tracers:
-        logging.info(f"starting {tracer.name()} ...")
-        tracer.start()
-    
-    logging.info("all tracers started")
+    # store the tracer settings that downstream analysis needs (e.g., sampling rates)
+    update_metadata(
+        output_dir,
+        tracers={t.name(): t.metadata() for t in tracers},
+        **(metadata or {}),
+    )
+
+    # run all tracers under one supervisor
+    supervisor = Supervisor(tracers, policy=policy)
+    services = [anchor_service(output_dir)] + (services or [])
+    reports = asyncio.run(__run(supervisor, services))
+
+    # store the exit status and the lost events of every tracer
+    entries = {}
+    for tracer, report in zip(tracers, reports):
+        entries[tracer.name()] = tracer.metadata() | {
+            "returncode": report.returncode,
+            "events": report.events,
+            "lost_events": report.lost_events,
+            "restarts": report.restarts,
+        }
+    update_metadata(output_dir, tracers=entries)
+
+    return reports
+
 
-    # wait for all tracers
-    for tracer in tracers:
-        tracer.wait()
+async def __run(supervisor: Supervisor, services: list) -> list[TracerReport]:
+    tasks = [asyncio.create_task(service(supervisor)) for service in services]
+    try:
+        return await supervisor.run()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 def extinguish_tracing(tracers: list[Tracer]):
@@ -42,11 +256,8 @@ def extinguish_tracing(tracers: list[Tracer]):
         if signum is not None:
             logging.info(f"received signal {signum}, shutting down safely ...")
 
-        # loop over tracers and stop them
+        # the supervisor stops every tracer concurrently
         for tracer in tracers:
-            logging.info(f"stopping {tracer.name()} ...")
             tracer.stop()
-        
-        logging.info("all tracers stopped")
 
     return handle_shutdown
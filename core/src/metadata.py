@@ -0,0 +1,33 @@
+import json
+import os
+
+METADATA_FILE = "metadata.json"
+
+
+def update_metadata(output_dir: str, **fields):
+    """Merge fields into the run metadata (written next to reference_timestamps.json).
+
+    :param output_dir: the tracing output directory
+    :param fields: top-level keys to set
+    """
+    metadata = load_metadata(output_dir)
+    metadata.update(fields)
+
+    path = os.path.join(output_dir, METADATA_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_metadata(output_dir: str) -> dict:
+    """Read the run metadata of a tracing output directory.
+
+    :param output_dir: the tracing output directory
+    :return: the metadata, empty if the run has none
+    """
+    try:
+        with open(os.path.join(output_dir, METADATA_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
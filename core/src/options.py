@@ -0,0 +1,225 @@
+import argparse
+import logging
+import sys
+
+from src.backpressure import BackpressurePolicy
+from src.compression import RetentionPolicy, must_support_compression
+from src.scripts import DEFAULT_CACHE_DIR
+
+
+class TracerOptions:
+    """TracerOptions holds the user options that are shared by every tracer of a session."""
+
+    def __init__(
+        self,
+        rotate: bool = False,
+        rotate_size: int = 100 * 1024 * 1024,
+        compress: str = None,
+        retention: RetentionPolicy = None,
+        mode: str = "trace",
+        syscalls: list[str] = None,
+        exclude: list[str] = None,
+        script_cache: str = DEFAULT_CACHE_DIR,
+        sample_rate: int = 1,
+        sample_by: str = "tid",
+        policy: BackpressurePolicy = None,
+        index: bool = False,
+        block: bool = False,
+        uring: bool = False,
+    ):
+        """TracerOptions constructor.
+
+        :param rotate: enable rotate tracing
+        :param rotate_size: set the rotation size
+        :param compress: compress closed segments with gzip or zstd (only with rotate)
+        :param retention: retention policy of closed segments (only with rotate)
+        :param mode: trace (a record per event), combined (trace with one bpftrace
+            for io and memory) or aggregate (periodic map dumps)
+        :param syscalls: only attach the probes of these operations (None for all)
+        :param exclude: do not attach the probes of these operations
+        :param script_cache: directory of the scripts rendered for a selection
+        :param sample_rate: record the syscalls of 1-in-N threads or processes
+        :param sample_by: sample threads (tid) or processes (pid)
+        :param policy: restart tracers that lose events with cheaper settings (None to disable)
+        :param index: write a sidecar index of every closed output file
+        :param block: also trace the page cache and block layer (trace and combined modes)
+        :param uring: also trace every io_uring request (Linux 5.19+)
+        """
+        self.rotate = rotate
+        self.rotate_size = rotate_size
+        self.compress = compress
+        self.retention = retention
+        self.mode = mode
+        self.syscalls = syscalls
+        self.exclude = exclude
+        self.script_cache = script_cache
+        self.sample_rate = sample_rate
+        self.sample_by = sample_by
+        self.policy = policy
+        self.index = index
+        self.block = block
+        self.uring = uring
+
+    def selects_ops(self) -> bool:
+        """Check if only a part of the probes must be attached."""
+        return bool(self.syscalls or self.exclude)
+
+
+def __op_list(value: str) -> list[str]:
+    return [op.strip() for op in value.split(",") if op.strip()]
+
+
+def add_tracer_arguments(parser: argparse.ArgumentParser):
+    """Add the tracer options to an argument parser.
+
+    :param parser: the entrypoint argument parser
+    """
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=["trace", "combined", "aggregate"],
+        default="trace",
+        help="trace prints every event, combined does it with one bpftrace for io and memory, aggregate dumps in-kernel counters and latency histograms periodically (default: trace)",
+    )
+    parser.add_argument(
+        "--syscalls",
+        type=__op_list,
+        help="Comma separated operations to trace, e.g. read,pread64,openat (default: all)",
+    )
+    parser.add_argument(
+        "--exclude",
+        type=__op_list,
+        help="Comma separated operations to not trace, e.g. statx,newstat",
+    )
+    parser.add_argument(
+        "--script_cache",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Folder to cache the scripts rendered for --syscalls/--exclude (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "-s",
+        "--sample",
+        type=int,
+        default=1,
+        help="Record the syscalls of 1-in-N threads/processes, chosen in-kernel (default: 1, no sampling)",
+    )
+    parser.add_argument(
+        "--sample_by",
+        choices=["tid", "pid"],
+        default="tid",
+        help="Sample threads or whole processes (default: tid)",
+    )
+    parser.add_argument(
+        "-a",
+        "--adaptive",
+        action="store_true",
+        help="Restart tracers that lose events with a larger perf buffer, then coarser sampling",
+    )
+    parser.add_argument(
+        "--max_loss",
+        type=float,
+        default=0.01,
+        help="Lost events ratio that triggers an adaptive restart (default: 0.01)",
+    )
+    parser.add_argument(
+        "--loss_window",
+        type=float,
+        default=10,
+        help="Seconds between two lost events checks (default: 10)",
+    )
+    parser.add_argument(
+        "-r",
+        "--rotate",
+        action="store_true",
+        help="Enable log rotation (useful to break large tracing log output)",
+    )
+    parser.add_argument(
+        "-rs",
+        "--rotate_size",
+        type=int,
+        default=100 * 1024 * 1024,
+        help="Setting the rotate size (default is 100MB)",
+    )
+    parser.add_argument(
+        "-i",
+        "--index",
+        action="store_true",
+        help="Write a sidecar index (time range, pids, comms, ops, offsets) of every closed output file",
+    )
+    parser.add_argument(
+        "-b",
+        "--block",
+        action="store_true",
+        help="Also trace page cache insertions, writeback, and block requests (see entrypoint/blockio.py)",
+    )
+    parser.add_argument(
+        "-u",
+        "--uring",
+        action="store_true",
+        help="Also trace every io_uring request from submission to completion (Linux 5.19+)",
+    )
+    parser.add_argument(
+        "-z",
+        "--compress",
+        choices=["gzip", "zstd"],
+        help="Compress rotated segments in the background (only works with -r|--rotate)",
+    )
+    parser.add_argument(
+        "--retain_bytes",
+        type=int,
+        help="Maximum total size of rotated segments, oldest are removed first",
+    )
+    parser.add_argument(
+        "--retain_segments",
+        type=int,
+        help="Maximum number of rotated segments, oldest are removed first",
+    )
+    parser.add_argument(
+        "--retain_age",
+        type=int,
+        help="Maximum age of rotated segments in seconds",
+    )
+
+
+def tracer_options(args: argparse.Namespace) -> TracerOptions:
+    """Build the tracer options from parsed arguments.
+
+    :param args: arguments parsed by a parser that has the tracer arguments
+    """
+    if args.compress:
+        must_support_compression(args.compress)
+    if args.block and args.mode == "aggregate":
+        logging.error("aggregate mode does not support block tracing")
+        sys.exit(1)
+
+    retention = RetentionPolicy(
+        max_bytes=args.retain_bytes,
+        max_segments=args.retain_segments,
+        max_age=args.retain_age,
+    )
+    if not args.rotate and (args.compress or retention.enabled()):
+        logging.error(
+            "-z/--compress and --retain_* only apply to rotated segments, add -r/--rotate"
+        )
+        sys.exit(1)
+
+    return TracerOptions(
+        rotate=args.rotate,
+        rotate_size=args.rotate_size,
+        compress=args.compress,
+        retention=retention if retention.enabled() else None,
+        mode=args.mode,
+        syscalls=args.syscalls,
+        exclude=args.exclude,
+        script_cache=args.script_cache,
+        sample_rate=max(args.sample, 1),
+        sample_by=args.sample_by,
+        policy=(
+            BackpressurePolicy(threshold=args.max_loss, window=args.loss_window)
+            if args.adaptive
+            else None
+        ),
+        index=args.index,
+        block=args.block,
+        uring=args.uring,
+    )
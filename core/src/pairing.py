@@ -0,0 +1,302 @@
+import logging
+from collections import OrderedDict, namedtuple
+
+from src.histogram import LogHistogram
+from src.parser import KIND_EVENT, KIND_LOST, NA, PHASE_EN, EventBatch
+
+# events that are printed once and never paired
+ONESHOT_OPS = ("fork", "exec", "process", "cache_add", "inode_dirty")
+
+# exit ops that close an enter op with a different name
+PAIR_ALIASES = {
+    "handle_mm_fault": "page_fault_user",
+    "io_uring_cqe": "io_uring_sqe",
+}
+
+# exit arguments kept in the records of the other ops (their exit only gives ret),
+# e.g. the file position read/write started at
+EXIT_ARGS = ("pos",)
+
+# asynchronous ops paired by request id arguments instead of the thread (io_uring
+# requests, block requests, and inode writebacks complete in another context, the
+# exit prints the thread the request was made for)
+REQUEST_OPS = {
+    "io_uring_sqe": ("req",),
+    "block_rq": ("dev", "sector"),
+    "writeback": ("ino",),
+}
+
+# latency record flags
+FLAG_LOST = 1  # events were lost while the call was pending
+FLAG_ORPHAN_EN = 2  # enter without exit (thread exited, replaced, or evicted)
+FLAG_ORPHAN_EX = 4  # exit without enter
+FLAG_ONESHOT = 8  # fork, exec, and process exit records (no latency)
+
+Latency = namedtuple(
+    "Latency", ["ts", "pid", "tid", "comm", "op", "latency", "ret", "args", "flags"]
+)
+
+
+class PairingStats:
+    """PairingStats counts what happened to the events fed into a Pairer."""
+
+    def __init__(self):
+        self.paired = 0
+        self.orphan_en = 0
+        self.orphan_ex = 0
+        self.evicted = 0
+        self.lost = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class LatencyStats:
+    """LatencyStats keeps a streaming histogram of latencies per op."""
+
+    def __init__(self):
+        self.histograms = {}
+
+    def record(self, op: str, latency: int):
+        """Record a latency for an op.
+
+        :param op: syscall name
+        :param latency: latency in nanoseconds
+        """
+        hist = self.histograms.get(op)
+        if hist is None:
+            hist = self.histograms[op] = LogHistogram()
+        hist.record(latency)
+
+    def summary(self) -> dict[str, dict]:
+        """Return count, mean and percentiles per op."""
+        return {op: hist.summary() for op, hist in sorted(self.histograms.items())}
+
+
+class Pairer:
+    """Pairer matches EN and EX events per (tid, op) and emits Latency records.
+
+    The ops of REQUEST_OPS are matched per (request ids, op) instead, the
+    arguments of their exit (except ret) are added to the record.
+
+    Pending enters are kept in a bounded table, the oldest one is evicted
+    when the table is full, so memory does not grow with the trace size.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 64 * 1024,
+        emit_orphans: bool = False,
+        emit_oneshots: bool = False,
+        histograms: bool = True,
+    ):
+        """Pairer constructor.
+
+        :param max_pending: maximum number of pending enter events
+        :param emit_orphans: yield orphan records (latency is None) instead of only counting them
+        :param emit_oneshots: yield fork, exec, and process exit records (latency is 0)
+        :param histograms: keep per-op latency histograms
+        """
+        self._max_pending = max_pending
+        self._emit_orphans = emit_orphans
+        self._emit_oneshots = emit_oneshots
+
+        # (tid, op) or (request ids, op) => (ts, pid, tid, comm, args, epoch)
+        self._pending = OrderedDict()
+        self._threads = {}  # tid => pending (tid, op) keys, for thread exits
+        self._epoch = 0  # increased on every lost events record
+
+        self._lookup = None
+
+        self.stats = PairingStats()
+        self.latencies = LatencyStats() if histograms else None
+
+    def feed(self, batch: EventBatch):
+        """Pair the events of a batch.
+
+        :param batch: a batch returned by the TraceReader
+        :return: a generator of Latency records
+        """
+        strings = batch.strings
+        lookup = self._lookup = strings.lookup
+        oneshot = {strings.code(op) for op in ONESHOT_OPS}
+        aliases = {
+            strings.code(ex): strings.code(en) for ex, en in PAIR_ALIASES.items()
+        }
+        requests = {strings.code(op): keys for op, keys in REQUEST_OPS.items()}
+        process_exit = strings.code("process")
+
+        pending = self._pending
+        stats = self.stats
+        latencies = self.latencies
+        emit_orphans = self._emit_orphans
+        emit_oneshots = self._emit_oneshots
+        rets = batch.ints.get("ret")
+        exit_args = [(k, batch.ints[k]) for k in EXIT_ARGS if k in batch.ints]
+
+        kinds, ts_col, pid_col, tid_col = batch.kind, batch.ts, batch.pid, batch.tid
+        phase_col, op_col, comm_col = batch.phase, batch.op, batch.comm
+
+        for i in range(len(ts_col)):
+            kind = kinds[i]
+            if kind != KIND_EVENT:
+                if kind == KIND_LOST:
+                    self._epoch += 1
+                    stats.lost += batch.int_arg("lost", i, 0)
+                continue
+
+            op = op_col[i]
+            tid = tid_col[i]
+
+            if op in oneshot:
+                if op == process_exit:
+                    yield from self._drop_thread(tid)
+                if emit_oneshots:
+                    yield Latency(
+                        ts_col[i],
+                        pid_col[i],
+                        tid,
+                        lookup(comm_col[i]),
+                        lookup(op),
+                        0,
+                        None,
+                        batch.args(i),
+                        FLAG_ONESHOT,
+                    )
+                continue
+
+            if phase_col[i] == PHASE_EN:
+                keys = requests.get(op)
+                if keys is None:
+                    key = (tid, op)
+                else:
+                    key = (tuple(batch.int_arg(k, i) for k in keys), op)
+                entry = pending.pop(key, None)
+                if entry is not None:
+                    yield from self._orphan(key, entry)
+
+                if keys is None:
+                    self._threads.setdefault(tid, set()).add(key)
+                pending[key] = (
+                    ts_col[i],
+                    pid_col[i],
+                    tid,
+                    comm_col[i],
+                    batch.args(i),
+                    self._epoch,
+                )
+                if len(pending) > self._max_pending:
+                    stats.evicted += 1
+                    evicted, entry = pending.popitem(last=False)
+                    self._unindex(evicted)
+                    yield from self._orphan(evicted, entry)
+                continue
+
+            en_op = aliases.get(op, op)
+            keys = requests.get(en_op)
+            if keys is None:
+                key = (tid, en_op)
+            else:
+                key = (tuple(batch.int_arg(k, i) for k in keys), en_op)
+            entry = pending.pop(key, None)
+            ret = rets[i] if rets is not None and rets[i] != NA else None
+            if entry is not None and keys is None:
+                self._unindex(key)
+
+            if entry is None:
+                stats.orphan_ex += 1
+                if emit_orphans:
+                    yield Latency(
+                        ts_col[i],
+                        pid_col[i],
+                        tid,
+                        lookup(comm_col[i]),
+                        lookup(key[1]),
+                        None,
+                        ret,
+                        {},
+                        FLAG_ORPHAN_EX,
+                    )
+                continue
+
+            ts, pid, tid, comm, args, epoch = entry
+            name = lookup(key[1])
+            latency = ts_col[i] - ts
+            if keys is not None:
+                args = {**args, **batch.args(i)}
+                args.pop("ret", None)
+            else:
+                for k, col in exit_args:
+                    if col[i] != NA:
+                        args = {**args, k: col[i]}
+
+            stats.paired += 1
+            if latencies is not None:
+                latencies.record(name, latency)
+
+            yield Latency(
+                ts,
+                pid,
+                tid,
+                lookup(comm),
+                name,
+                latency,
+                ret,
+                args,
+                FLAG_LOST if epoch != self._epoch else 0,
+            )
+
+    def flush(self):
+        """Report all pending enter events as orphans (call at the end of the trace)."""
+        self._threads.clear()
+        while self._pending:
+            yield from self._orphan(*self._pending.popitem(last=False))
+
+    def pending(self) -> int:
+        """Return the number of pending enter events."""
+        return len(self._pending)
+
+    def _drop_thread(self, tid: int):
+        """Drop the pending calls of an exited thread (requests are kept, they can still complete)."""
+        for key in self._threads.pop(tid, ()):
+            yield from self._orphan(key, self._pending.pop(key))
+
+    def _unindex(self, key: tuple):
+        """Remove a pending key from the index of its thread."""
+        keys = self._threads.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._threads[key[0]]
+
+    def _orphan(self, key: tuple, entry: tuple):
+        self.stats.orphan_en += 1
+        if self._emit_orphans:
+            ts, pid, tid, comm, args, epoch = entry
+            flags = FLAG_ORPHAN_EN | (FLAG_LOST if epoch != self._epoch else 0)
+            yield Latency(
+                ts,
+                pid,
+                tid,
+                self._lookup(comm),
+                self._lookup(key[1]),
+                None,
+                None,
+                args,
+                flags,
+            )
+
+
+def pair_events(batches, pairer: Pairer = None):
+    """Pair a stream of batches, including the orphans left at the end.
+
+    :param batches: batches returned by the TraceReader
+    :param pairer: an existing pairer (a new one is created if None)
+    :return: a generator of Latency records
+    """
+    pairer = pairer if pairer is not None else Pairer()
+    for batch in batches:
+        yield from pairer.feed(batch)
+    yield from pairer.flush()
+
+    logging.debug(f"pairing done: {pairer.stats.as_dict()}")
@@ -0,0 +1,427 @@
+import io
+import logging
+import mmap
+import os
+import re
+from array import array
+from collections import namedtuple
+
+from src.compression import EXTENSIONS, open_segment
+
+# record kinds
+KIND_EVENT = 0
+KIND_START = 1
+KIND_LOST = 2
+KIND_OTHER = 3
+
+# event phases
+PHASE_NONE = -1
+PHASE_EN = 0
+PHASE_EX = 1
+
+# marker for missing integer arguments
+NA = -(2**63)
+
+# arguments that hold strings, they are always printed last by the templates
+STRING_ARGS = (b"fname", b"comm")
+
+DEFAULT_BATCH_SIZE = 64 * 1024
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+_INT64_MAX = 2**63 - 1
+_UINT64 = 2**64
+_TRACE_FILE = re.compile(
+    r"^trace_(?P<tracer>.+)_(?P<index>\d+)\.log(?P<ext>%s)?$"
+    % "|".join(re.escape(ext) for ext in EXTENSIONS.values())
+)
+_LOST = re.compile(rb"^Lost (\d+) events")
+
+Event = namedtuple("Event", ["kind", "ts", "pid", "tid", "phase", "op", "comm", "args"])
+
+
+class StringTable:
+    """StringTable interns strings (ops, comms, file names) into integer codes."""
+
+    def __init__(self):
+        self._codes = {}
+        self._strings = []
+
+    def intern(self, value: bytes) -> int:
+        """Return the code of a value, adding it to the table if it is new.
+
+        :param value: raw bytes from the trace
+        :return: the integer code
+        """
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._codes[value] = code
+            self._strings.append(value.decode(errors="replace"))
+        return code
+
+    def lookup(self, code: int) -> str:
+        """Return the string of a code (None for -1).
+
+        :param code: the integer code
+        """
+        if code < 0:
+            return None
+        return self._strings[code]
+
+    def code(self, value: str) -> int:
+        """Return the code of a string without interning it (-1 if unknown).
+
+        :param value: the string to look for
+        """
+        return self._codes.get(value.encode(), -1)
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class EventBatch:
+    """EventBatch holds a fixed number of trace records as typed columns.
+
+    ts, pid, and tid are int64 arrays, op and comm are StringTable codes.
+    Integer arguments are stored in `ints` (NA when missing) and string
+    arguments are stored as codes in `strs` (-1 when missing).
+    """
+
+    def __init__(self, strings: StringTable):
+        """EventBatch constructor.
+
+        :param strings: the table used to intern strings
+        """
+        self.strings = strings
+
+        self.kind = array("b")
+        self.ts = array("q")
+        self.pid = array("q")
+        self.tid = array("q")
+        self.phase = array("b")
+        self.op = array("i")
+        self.comm = array("i")
+
+        self.ints = {}  # argument name => array("q")
+        self.strs = {}  # argument name => array("i")
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def int_arg(self, key: str, i: int, default: int = None) -> int:
+        """Get an integer argument of a record.
+
+        :param key: argument name
+        :param i: record index
+        :param default: returned when the record does not have the argument
+        """
+        col = self.ints.get(key)
+        if col is None or col[i] == NA:
+            return default
+        return col[i]
+
+    def str_arg(self, key: str, i: int, default: str = None) -> str:
+        """Get a string argument of a record.
+
+        :param key: argument name
+        :param i: record index
+        :param default: returned when the record does not have the argument
+        """
+        col = self.strs.get(key)
+        if col is None or col[i] < 0:
+            return default
+        return self.strings.lookup(col[i])
+
+    def args(self, i: int) -> dict:
+        """Get all arguments of a record as a dictionary.
+
+        :param i: record index
+        """
+        res = {}
+        for key, col in self.ints.items():
+            if col[i] != NA:
+                res[key] = col[i]
+        for key, col in self.strs.items():
+            if col[i] >= 0:
+                res[key] = self.strings.lookup(col[i])
+        return res
+
+    def event(self, i: int) -> Event:
+        """Get a record as an Event tuple (slow path, for convenience).
+
+        :param i: record index
+        """
+        return Event(
+            self.kind[i],
+            self.ts[i],
+            self.pid[i],
+            self.tid[i],
+            self.phase[i],
+            self.strings.lookup(self.op[i]),
+            self.strings.lookup(self.comm[i]),
+            self.args(i),
+        )
+
+    def events(self):
+        """Iterate over the records as Event tuples."""
+        for i in range(len(self)):
+            yield self.event(i)
+
+    def _int_col(self, key: str, n: int) -> array:
+        col = self.ints.get(key)
+        if col is None:
+            col = self.ints[key] = array("q", [NA]) * n
+        elif len(col) < n:
+            col.extend(array("q", [NA]) * (n - len(col)))
+        return col
+
+    def _str_col(self, key: str, n: int) -> array:
+        col = self.strs.get(key)
+        if col is None:
+            col = self.strs[key] = array("i", [-1]) * n
+        elif len(col) < n:
+            col.extend(array("i", [-1]) * (n - len(col)))
+        return col
+
+    def finalize(self):
+        """Pad the argument columns to the batch length."""
+        n = len(self)
+        for key in self.ints:
+            self._int_col(key, n)
+        for key in self.strs:
+            self._str_col(key, n)
+
+
+class TraceReader:
+    """TraceReader streams trace logs as EventBatch objects.
+
+    The log format is the one made by templates/bpftrace/*.j2:
+    <nsecs> {pid=<pid> tid=<tid> proc=<comm>}{<EN|EX> <op>}{<key=value ...>}
+    """
+
+    def __init__(
+        self, batch_size: int = DEFAULT_BATCH_SIZE, strings: StringTable = None
+    ):
+        """TraceReader constructor.
+
+        :param batch_size: number of records per batch
+        :param strings: an existing string table to share codes with
+        """
+        self._batch_size = batch_size
+        self.strings = strings if strings is not None else StringTable()
+
+        self._batch = None
+        self._last_ts = 0
+
+    def read(self, paths: list[str]):
+        """Read the given files in order and yield batches.
+
+        :param paths: ordered list of trace files
+        """
+        self._batch = EventBatch(self.strings)
+        for path in paths:
+            yield from self._read_lines(read_lines(path))
+
+        if len(self._batch) > 0:
+            yield self._flush()
+
+    def parse(self, lines):
+        """Parse trace lines that do not come from a file (e.g. query results) and yield batches.
+
+        :param lines: iterable of raw lines
+        """
+        self._batch = EventBatch(self.strings)
+        yield from self._read_lines(lines)
+
+        if len(self._batch) > 0:
+            yield self._flush()
+
+    def _read_lines(self, lines):
+        """Parse lines into the current batch, yielding every full batch.
+
+        This is the hot loop of every analyzer, so lookups are bound to locals.
+        """
+        size = self._batch_size
+        codes = self.strings._codes
+        intern = self.strings.intern
+        keys = {}
+
+        batch = self._batch
+        kind, ts_col, pid_col, tid_col = batch.kind, batch.ts, batch.pid, batch.tid
+        phase_col, op_col, comm_col, ints = (
+            batch.phase,
+            batch.op,
+            batch.comm,
+            batch.ints,
+        )
+
+        for line in lines:
+            try:
+                head, op, body = line.split(b"}{", 2)
+                ts, pid, tid, comm = head.split(b" ", 3)
+                ts = int(ts)
+                pid = int(pid[5:])
+                tid = int(tid[4:])
+            except ValueError:
+                self._append_other(line)
+            else:
+                n = len(ts_col)
+                self._last_ts = ts
+
+                kind.append(KIND_EVENT)
+                ts_col.append(ts)
+                pid_col.append(pid)
+                tid_col.append(tid)
+                phase_col.append(PHASE_EN if op[1] == 78 else PHASE_EX)  # N
+
+                op = op[3:]
+                code = codes.get(op)
+                op_col.append(code if code is not None else intern(op))
+                comm = comm[5:]
+                code = codes.get(comm)
+                comm_col.append(code if code is not None else intern(comm))
+
+                body = body.rstrip(b"\r\n")
+                if body.endswith(b"}"):
+                    body = body[:-1]
+                if body:
+                    for token in body.split(b" "):
+                        key, _, value = token.partition(b"=")
+                        name = keys.get(key)
+                        if name is None:
+                            name = keys[key] = key.decode()
+
+                        if key in STRING_ARGS:
+                            # string arguments may contain spaces, they take the rest of the line
+                            value = body[body.index(key + b"=") + len(key) + 1 :]
+                            batch._str_col(name, n).append(intern(value))
+                            break
+
+                        try:
+                            num = int(value)
+                        except ValueError:
+                            batch._str_col(name, n).append(intern(value))
+                            continue
+                        if num > _INT64_MAX:
+                            num -= _UINT64  # unsigned printf of a negative value (e.g. mmap errors)
+
+                        col = ints.get(name)
+                        if col is None:
+                            col = batch._int_col(name, n)
+                        else:
+                            gap = n - len(col)
+                            if gap == 1:
+                                col.append(NA)
+                            elif gap:
+                                col.extend(array("q", [NA]) * gap)
+                        col.append(num)
+
+            if len(ts_col) >= size:
+                yield self._flush()
+                batch = self._batch
+                kind, ts_col, pid_col, tid_col = (
+                    batch.kind,
+                    batch.ts,
+                    batch.pid,
+                    batch.tid,
+                )
+                phase_col, op_col, comm_col, ints = (
+                    batch.phase,
+                    batch.op,
+                    batch.comm,
+                    batch.ints,
+                )
+
+    def _flush(self) -> EventBatch:
+        batch = self._batch
+        batch.finalize()
+        self._batch = EventBatch(self.strings)
+        return batch
+
+    def _append_other(self, line: bytes):
+        """Append a non-event line (START banner, lost events, and bpftrace messages)."""
+        line = line.rstrip(b"\r\n")
+        if not line:
+            return
+
+        batch = self._batch
+        n = len(batch.ts)
+
+        lost = _LOST.match(line)
+        if lost:
+            self._append_record(KIND_LOST)
+            batch._int_col("lost", n).append(int(lost.group(1)))
+        elif b" START " in line:
+            self._append_record(KIND_START)
+            batch._str_col("text", n).append(self.strings.intern(line))
+        else:
+            self._append_record(KIND_OTHER)
+            batch._str_col("text", n).append(self.strings.intern(line))
+
+    def _append_record(self, kind: int):
+        batch = self._batch
+        batch.kind.append(kind)
+        batch.ts.append(self._last_ts)
+        batch.pid.append(-1)
+        batch.tid.append(-1)
+        batch.phase.append(PHASE_NONE)
+        batch.op.append(-1)
+        batch.comm.append(-1)
+
+
+def read_lines(path: str):
+    """Yield the lines of a trace file using mmap (compressed segments are streamed).
+
+    :param path: the trace file path
+    """
+    if path.endswith(tuple(EXTENSIONS.values())):
+        with open_segment(path) as f:
+            yield from io.BufferedReader(f, STREAM_BUFFER_SIZE)
+        return
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b"")
+
+
+def trace_files(output_dir: str) -> dict[str, list[str]]:
+    """Find the trace logs of an output directory, grouped by tracer and ordered by rotation index.
+
+    :param output_dir: the tracing output directory
+    :return: tracer name => ordered list of trace files
+    """
+    found = {}
+    for name in os.listdir(output_dir):
+        match = _TRACE_FILE.match(name)
+        if match:
+            files = found.setdefault(match.group("tracer"), {})
+            index = int(match.group("index"))
+            # a segment being compressed exists twice, prefer the original
+            if index not in files or not match.group("ext"):
+                files[index] = os.path.join(output_dir, name)
+
+    logging.debug(f"found trace files for {list(found.keys())} in {output_dir}")
+
+    return {
+        tracer: [files[index] for index in sorted(files)]
+        for tracer, files in found.items()
+    }
+
+
+def read_trace(
+    output_dir: str,
+    tracer: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    strings: StringTable = None,
+):
+    """Read all rotated logs of a tracer in an output directory.
+
+    :param output_dir: the tracing output directory
+    :param tracer: tracer name (e.g. io or memory)
+    :param batch_size: number of records per batch
+    :param strings: an existing string table to share codes with
+    """
+    paths = trace_files(output_dir).get(tracer, [])
+    return TraceReader(batch_size=batch_size, strings=strings).read(paths)
@@ -0,0 +1,336 @@
+import logging
+
+from collections import namedtuple
+
+from src.fdtable import DUP_OPS, OPEN_OPS, READ_OPS, WRITE_OPS, FdTable
+from src.histogram import LogHistogram
+from src.pairing import FLAG_ONESHOT, ONESHOT_OPS, Latency
+from src.parser import KIND_EVENT, NA, PHASE_EN, read_trace
+
+SEQUENTIAL = "sequential"
+STRIDED = "strided"
+REVERSE = "reverse"
+RANDOM = "random"
+PATTERNS = (SEQUENTIAL, STRIDED, REVERSE, RANDOM)
+
+# calls that take the file offset from their pos argument (the others use f_pos)
+POSITIONED_OPS = ("pread64", "pwrite64", "preadv", "pwritev")
+
+# calls that change the fd table
+CALL_OPS = OPEN_OPS + DUP_OPS + ("close",)
+
+# offset is None when it is unknown
+Access = namedtuple("Access", ["ts", "pid", "path", "direction", "offset", "size"])
+
+
+class AccessStream:
+    """AccessStream classifies the accesses of a process to a file in one direction.
+
+    Every access after the first one is a transition from the previous one:
+    sequential if it starts where the previous one ended, reverse if it ends
+    where the previous one started, strided if it moved by the same non-zero
+    distance as the previous transition, random otherwise. The stream pattern
+    is the most frequent transition. Sequential runs (accesses chained by
+    sequential transitions) are measured in bytes and requests.
+    """
+
+    __slots__ = (
+        "pid",
+        "path",
+        "direction",
+        "requests",
+        "bytes",
+        "unknown",
+        "transitions",
+        "strides",
+        "sizes",
+        "run_bytes",
+        "run_requests",
+        "_offset",
+        "_end",
+        "_stride",
+        "_run",
+    )
+
+    def __init__(self, pid: int, path: str, direction: str):
+        """AccessStream constructor.
+
+        :param pid: process id
+        :param path: the file path
+        :param direction: read or write
+        """
+        self.pid = pid
+        self.path = path
+        self.direction = direction
+
+        self.requests = 0
+        self.bytes = 0
+        self.unknown = 0  # accesses without a known offset
+        self.transitions = dict.fromkeys(PATTERNS, 0)
+        self.strides = {}  # stride => strided transitions
+        self.sizes = LogHistogram()
+        self.run_bytes = LogHistogram()
+        self.run_requests = LogHistogram()
+
+        self._offset = None  # offset of the previous access
+        self._end = None  # end offset of the previous access
+        self._stride = None  # distance of the previous transition
+        self._run = None  # [bytes, requests] of the current sequential run
+
+    def record(self, offset: int, size: int):
+        """Record an access.
+
+        :param offset: the file offset (None if unknown)
+        :param size: bytes transferred
+        """
+        self.requests += 1
+        self.bytes += size
+        self.sizes.record(size)
+        if offset is None:
+            self.unknown += 1
+            self._close_run()
+            self._offset = self._end = self._stride = None
+            return
+
+        if self._end is not None:
+            stride = offset - self._offset
+            if offset == self._end:
+                kind = SEQUENTIAL
+            elif offset + size == self._offset:
+                kind = REVERSE
+            elif stride and stride == self._stride:
+                kind = STRIDED
+                self.strides[stride] = self.strides.get(stride, 0) + 1
+            else:
+                kind = RANDOM
+            self.transitions[kind] += 1
+            self._stride = stride
+
+            if kind == SEQUENTIAL:
+                self._run[0] += size
+                self._run[1] += 1
+            else:
+                self._close_run()
+        if self._run is None:
+            self._run = [size, 1]
+
+        self._offset = offset
+        self._end = offset + size
+
+    def finish(self):
+        """Close the current sequential run (end of the trace)."""
+        self._close_run()
+
+    def pattern(self) -> str:
+        """Return the most frequent transition (None for a single access)."""
+        if not any(self.transitions.values()):
+            return None
+        return max(PATTERNS, key=lambda kind: self.transitions[kind])
+
+    def as_dict(self) -> dict:
+        stride = max(self.strides, key=self.strides.get) if self.strides else None
+        return {
+            "pid": self.pid,
+            "path": self.path,
+            "direction": self.direction,
+            "pattern": self.pattern(),
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "unknown_offsets": self.unknown,
+            "transitions": dict(self.transitions),
+            "stride": stride,
+            "sizes": self.sizes.summary(),
+            "run_bytes": self.run_bytes.summary(),
+            "run_requests": self.run_requests.summary(),
+        }
+
+    def _close_run(self):
+        if self._run is not None:
+            self.run_bytes.record(self._run[0])
+            self.run_requests.record(self._run[1])
+            self._run = None
+
+
+class AccessResolver:
+    """AccessResolver follows the file offsets of the read and write calls.
+
+    pread64/pwrite64/preadv/pwritev give their offset on enter, read/write
+    give the file position on exit (pos, -1 for files without one). readv/
+    writev, and the read/write calls of traces recorded before the pos
+    arguments existed, fall back to the offsets implied by open, lseek and
+    the previous accesses of the fd.
+
+    Like the FaultResolver, the batches are walked column by column, only the
+    calls that change the fd table are paired into Latency records.
+    """
+
+    def __init__(self):
+        self.fds = FdTable()
+        self._offsets = {}  # (pid, fd) => offset implied by the previous calls
+        self._calls = {}  # (tid, op) => enter of the pending calls
+
+    def resolve(self, batches):
+        """Yield an Access for every successful read and write of the batches.
+
+        :param batches: batches returned by the TraceReader
+        """
+        for batch in batches:
+            yield from self._feed(batch)
+
+    def _feed(self, batch):
+        strings = batch.strings
+        lookup = strings.lookup
+        directions = {strings.code(op): "read" for op in READ_OPS}
+        directions.update({strings.code(op): "write" for op in WRITE_OPS})
+        directions.pop(-1, None)
+        positioned = {strings.code(op) for op in POSITIONED_OPS}
+        lseek = strings.code("lseek")
+        calls = {strings.code(op) for op in CALL_OPS} - {-1}
+        oneshots = {strings.code(op) for op in ONESHOT_OPS} - {-1}
+
+        pending = self._calls
+        offsets = self._offsets
+        fd_col = batch.ints.get("fd")
+        pos_col = batch.ints.get("pos")
+        rets = batch.ints.get("ret")
+        kinds, ts_col, pid_col, tid_col = batch.kind, batch.ts, batch.pid, batch.tid
+        phase_col, op_col = batch.phase, batch.op
+
+        for i in range(len(ts_col)):
+            if kinds[i] != KIND_EVENT:
+                continue
+            op = op_col[i]
+
+            if op in directions or op == lseek:
+                key = (tid_col[i], op)
+                if phase_col[i] == PHASE_EN:
+                    fd = fd_col[i] if fd_col is not None else NA
+                    pos = pos_col[i] if pos_col is not None else NA
+                    pending[key] = (ts_col[i], pid_col[i], fd, pos)
+                    continue
+                entry = pending.pop(key, None)
+                if entry is None or rets is None or rets[i] == NA or rets[i] < 0:
+                    continue
+                ts, pid, fd, pos = entry
+                if fd == NA:
+                    continue
+                ret = rets[i]
+
+                if op == lseek:
+                    offsets[(pid, fd)] = ret
+                    continue
+                if op not in positioned:
+                    # f_pos at the start of the call, read by the kprobe
+                    pos = pos_col[i] if pos_col is not None else NA
+                if pos == NA:
+                    offset = offsets.get((pid, fd))
+                else:
+                    offset = pos if pos >= 0 else None
+                if op not in positioned:
+                    offsets[(pid, fd)] = offset + ret if offset is not None else None
+                if ret == 0:
+                    continue  # end of file
+
+                path = self.fds.resolve(pid, fd)
+                yield Access(ts, pid, path, directions[op], offset, ret)
+
+            elif op in calls:
+                key = (tid_col[i], op)
+                if phase_col[i] == PHASE_EN:
+                    pending[key] = (ts_col[i], pid_col[i], batch.args(i))
+                    continue
+                entry = pending.pop(key, None)
+                if entry is None:
+                    continue
+                ts, pid, args = entry
+                ret = rets[i] if rets is not None and rets[i] != NA else None
+                self._call(
+                    Latency(
+                        ts, pid, key[0], None, lookup(op), ts_col[i] - ts, ret, args, 0
+                    )
+                )
+
+            elif op in oneshots:
+                self.fds.update(
+                    Latency(
+                        ts_col[i],
+                        pid_col[i],
+                        tid_col[i],
+                        None,
+                        lookup(op),
+                        0,
+                        None,
+                        batch.args(i),
+                        FLAG_ONESHOT,
+                    )
+                )
+
+    def _call(self, record: Latency):
+        self.fds.update(record)
+        if record.ret is None or record.ret < 0:
+            return
+        if record.op in OPEN_OPS:
+            self._offsets[(record.pid, record.ret)] = 0
+        elif record.op in DUP_OPS:
+            self._offsets.pop((record.pid, record.ret), None)
+        elif record.op == "close":
+            self._offsets.pop((record.pid, record.args.get("fd")), None)
+
+
+class PatternClassifier:
+    """PatternClassifier sorts the accesses into AccessStream objects."""
+
+    def __init__(self):
+        self.streams = {}  # (pid, path, direction) => AccessStream
+
+    def classify(self, accesses):
+        """Feed the accesses of a trace.
+
+        :param accesses: Access records returned by an AccessResolver
+        """
+        streams = self.streams
+        for access in accesses:
+            key = (access.pid, access.path, access.direction)
+            stream = streams.get(key)
+            if stream is None:
+                stream = streams[key] = AccessStream(*key)
+            stream.record(access.offset, access.size)
+        for stream in streams.values():
+            stream.finish()
+
+    def summary(self, min_requests: int = 1) -> list[dict]:
+        """Return the stream summaries, the largest streams first.
+
+        :param min_requests: skip the streams with fewer accesses
+        """
+        return [
+            stream.as_dict()
+            for stream in sorted(
+                self.streams.values(), key=lambda s: s.bytes, reverse=True
+            )
+            if stream.requests >= min_requests
+        ]
+
+    def patterns(self) -> dict[str, int]:
+        """Return the number of streams per pattern."""
+        counts = dict.fromkeys(PATTERNS, 0)
+        for stream in self.streams.values():
+            pattern = stream.pattern()
+            if pattern is not None:
+                counts[pattern] += 1
+        return counts
+
+
+def classify_patterns(output_dir: str, tracer: str = "io") -> PatternClassifier:
+    """Classify the access patterns of an io tracer output in a single pass.
+
+    :param output_dir: the tracing output directory
+    :param tracer: tracer name (io, or a tracer with the read and write events)
+    :return: the classifier with the per-stream results
+    """
+    classifier = PatternClassifier()
+    classifier.classify(AccessResolver().resolve(read_trace(output_dir, tracer)))
+
+    counts = ", ".join(f"{n} {kind}" for kind, n in classifier.patterns().items())
+    logging.info(f"classified {len(classifier.streams)} streams: {counts}")
+    return classifier
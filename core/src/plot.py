@@ -0,0 +1,127 @@
+import math
+from xml.sax.saxutils import escape
+
+WIDTH = 720
+HEIGHT = 420
+MARGIN = (60, 20, 40, 60)  # top, right, bottom, left
+COLORS = (
+    "#1f77b4",
+    "#ff7f0e",
+    "#2ca02c",
+    "#d62728",
+    "#9467bd",
+    "#8c564b",
+    "#e377c2",
+    "#7f7f7f",
+    "#bcbd22",
+    "#17becf",
+)
+
+
+def __ticks(low: float, high: float, log: bool) -> list[float]:
+    """Get the tick positions of an axis (decades on a log axis)."""
+    if log:
+        return list(range(math.floor(low), math.ceil(high) + 1))
+    step = (high - low) / 5 or 1
+    return [low + i * step for i in range(6)]
+
+
+def __label(value: float, log: bool) -> str:
+    if not log:
+        return f"{value:g}"
+    for unit, scale in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+        if value >= scale:
+            return f"{value / scale:g}{unit}"
+    return f"{value:g}"
+
+
+def line_plot(
+    path: str,
+    series: dict[str, list[tuple[float, float]]],
+    title: str,
+    xlabel: str,
+    ylabel: str,
+    xlog: bool = False,
+    ylim: tuple[float, float] = None,
+):
+    """Write a line plot as an SVG file (no plotting library needed).
+
+    :param path: the SVG file path
+    :param series: label => (x, y) points
+    :param title: the plot title
+    :param xlabel: the x axis label
+    :param ylabel: the y axis label
+    :param xlog: use a log10 x axis (x values must be positive)
+    :param ylim: (min, max) of the y axis (default: the range of the points)
+    """
+    top, right, bottom, left = MARGIN
+    width, height = WIDTH - left - right, HEIGHT - top - bottom
+
+    def fx(x):
+        return math.log10(x) if xlog else x
+
+    xs = [fx(x) for points in series.values() for x, _ in points]
+    ys = [y for points in series.values() for _, y in points]
+    x_low, x_high = (min(xs), max(xs)) if xs else (0, 1)
+    y_low, y_high = ylim or ((min(ys), max(ys)) if ys else (0, 1))
+    if xlog:
+        x_low, x_high = math.floor(x_low), math.ceil(x_high)
+    x_span = (x_high - x_low) or 1
+    y_span = (y_high - y_low) or 1
+
+    def px(x):
+        return left + (fx(x) - x_low) / x_span * width
+
+    def py(y):
+        return top + height - (y - y_low) / y_span * height
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+        'font-family="sans-serif" font-size="11">',
+        '<rect width="100%" height="100%" fill="white"/>',
+        f'<text x="{WIDTH / 2}" y="20" text-anchor="middle" font-size="14">{escape(title)}</text>',
+        f'<text x="{left + width / 2}" y="{HEIGHT - 8}" text-anchor="middle">{escape(xlabel)}</text>',
+        f'<text x="14" y="{top + height / 2}" text-anchor="middle" '
+        f'transform="rotate(-90 14 {top + height / 2})">{escape(ylabel)}</text>',
+        f'<rect x="{left}" y="{top}" width="{width}" height="{height}" fill="none" stroke="black"/>',
+    ]
+
+    for tick in __ticks(x_low, x_high, xlog):
+        x = left + (tick - x_low) / x_span * width
+        value = 10**tick if xlog else tick
+        out.append(
+            f'<line x1="{x:.1f}" y1="{top}" x2="{x:.1f}" y2="{top + height}" stroke="#ddd"/>'
+        )
+        out.append(
+            f'<text x="{x:.1f}" y="{top + height + 15}" text-anchor="middle">'
+            f"{__label(value, xlog)}</text>"
+        )
+    for tick in __ticks(y_low, y_high, False):
+        y = py(tick)
+        out.append(
+            f'<line x1="{left}" y1="{y:.1f}" x2="{left + width}" y2="{y:.1f}" stroke="#ddd"/>'
+        )
+        out.append(
+            f'<text x="{left - 5}" y="{y + 4:.1f}" text-anchor="end">{tick:.2g}</text>'
+        )
+
+    for i, (label, points) in enumerate(series.items()):
+        color = COLORS[i % len(COLORS)]
+        coords = " ".join(f"{px(x):.1f},{py(y):.1f}" for x, y in sorted(points))
+        out.append(
+            f'<polyline points="{coords}" fill="none" stroke="{color}" stroke-width="1.5"/>'
+        )
+        # legend in the bottom right corner
+        lx = left + width - 10
+        ly = top + height - 14 * (len(series) - i) + 4
+        out.append(
+            f'<line x1="{lx - 20}" y1="{ly - 4}" x2="{lx}" y2="{ly - 4}" '
+            f'stroke="{color}" stroke-width="2"/>'
+        )
+        out.append(
+            f'<text x="{lx - 25}" y="{ly}" text-anchor="end">{escape(label)}</text>'
+        )
+
+    out.append("</svg>")
+    with open(path, "w") as f:
+        f.write("\n".join(out) + "\n")
@@ -0,0 +1,492 @@
+import fnmatch
+import heapq
+import itertools
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from operator import itemgetter
+
+from src.compression import EXTENSIONS, open_segment
+from src.fdtable import DUP_OPS, OPEN_OPS, FdTable
+from src.index import load_index
+from src.pairing import ONESHOT_OPS, PAIR_ALIASES, Pairer, pair_events
+from src.parser import TraceReader, trace_files
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024  # bytes per worker task
+TASKS_PER_WORKER = 2  # tasks submitted ahead of the one being merged
+MAX_SPOOLS = 128  # spooled task results merged at once
+
+# ops that change the fd tables, they are scanned first to resolve paths
+FD_OPS = OPEN_OPS + DUP_OPS + ("close",) + ONESHOT_OPS
+
+_FD = re.compile(rb"[{ ](?:old)?fd=(\d+)")
+_FNAME = b"fname="
+
+_query = None  # the query of a worker process
+
+
+class Query:
+    """Query holds the filters of a trace query (None matches all).
+
+    Paths are shell patterns, they match the fname argument of an event, or
+    the path its fd refers to once `fds` is set by resolve_fds.
+    """
+
+    def __init__(
+        self,
+        pids: set[int] = None,
+        tids: set[int] = None,
+        comms: set[str] = None,
+        ops: set[str] = None,
+        paths: list[str] = None,
+        start: int = None,
+        end: int = None,
+    ):
+        """Query constructor.
+
+        :param pids: process ids
+        :param tids: thread ids
+        :param comms: command names
+        :param ops: operations
+        :param paths: file path patterns
+        :param start: first timestamp (nsecs)
+        :param end: last timestamp (nsecs)
+        """
+        self.pids = pids
+        self.tids = tids
+        self.comms = comms
+        self.ops = ops
+        self.paths = paths
+        self.start = start
+        self.end = end
+
+        self.fds = None  # (pid, fd) => [[first ts, last ts (None if open)], ...]
+
+    def pattern(self) -> bytes:
+        """Build the regex that selects the event lines of the header filters."""
+        # an exit event may have a different op than its enter event
+        ops = self.ops
+        if ops is not None:
+            ops = set(ops) | {ex for ex, en in PAIR_ALIASES.items() if en in ops}
+
+        return rb"^(\d+) \{pid=(%s) tid=(%s) proc=%s\}\{E([NX]) (%s)\}(.*)$" % (
+            _alternatives(self.pids, rb"-?\d+"),
+            _alternatives(self.tids, rb"-?\d+"),
+            _alternatives(self.comms, rb".*?"),
+            _alternatives(ops, rb"\w+"),
+        )
+
+    def match_path(self, path: str) -> bool:
+        """Check if a path matches one of the path patterns.
+
+        :param path: the file path
+        """
+        return any(fnmatch.fnmatchcase(path, pattern) for pattern in self.paths)
+
+    def in_time(self, ts: int) -> bool:
+        """Check if a timestamp is in the time range of the query.
+
+        :param ts: timestamp (nsecs)
+        """
+        return (self.start is None or ts >= self.start) and (
+            self.end is None or ts <= self.end
+        )
+
+
+def _alternatives(values, default: bytes) -> bytes:
+    if values is None:
+        return default
+    return b"(?:%s)" % b"|".join(re.escape(str(v).encode()) for v in sorted(values))
+
+
+def plan(
+    output_dir: str,
+    query: Query,
+    tracers: list[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> list[tuple]:
+    """Split the trace segments into byte ranges, skipping what the indexes rule out.
+
+    Segments without an index are scanned entirely, compressed segments are
+    one task since they cannot be read from an offset.
+
+    :param output_dir: the tracing output directory
+    :param query: the query
+    :param tracers: tracer names to query (default: all event tracers)
+    :param chunk_size: bytes per task
+    :return: ordered (tracer, path, begin, end, first ts) tasks, end is None for the
+        end of the segment, first ts is None for the segments without an index
+    """
+    tasks = []
+    skipped = 0
+    for tracer, paths in sorted(trace_files(output_dir).items()):
+        if tracers and tracer not in tracers:
+            continue
+        if not tracers and tracer.endswith("_aggregate"):
+            continue
+
+        for path in paths:
+            index = load_index(path)
+            if index is None:
+                ranges = [(0, None)]
+            elif index.may_match(
+                query.pids,
+                query.tids,
+                query.comms,
+                query.ops,
+                query.start,
+                query.end,
+            ):
+                ranges = index.ranges(query.start, query.end)
+            else:
+                ranges = []
+            if not ranges:
+                skipped += 1
+                continue
+
+            if path.endswith(tuple(EXTENSIONS.values())):
+                begin, stop = ranges[0][0], ranges[-1][1]
+                first = index.first_ts(begin, stop) if index else None
+                tasks.append((tracer, path, begin, stop, first))
+                continue
+
+            for begin, stop in ranges:
+                if stop is None:
+                    stop = os.path.getsize(path)
+                for offset in range(begin, stop, chunk_size):
+                    end = min(offset + chunk_size, stop)
+                    first = index.first_ts(offset, end) if index else None
+                    tasks.append((tracer, path, offset, end, first))
+
+    logging.debug(f"{len(tasks)} tasks, {skipped} segments skipped by their index")
+    return tasks
+
+
+def read_range(path: str, begin: int, end: int) -> bytes:
+    """Read the lines of a segment that start in a byte range.
+
+    :param path: the segment path
+    :param begin: first offset
+    :param end: end offset (None for the end of the segment)
+    :return: complete lines (offsets of compressed segments are uncompressed offsets)
+    """
+    if path.endswith(tuple(EXTENSIONS.values())):
+        with open_segment(path) as f:
+            data = f.read()
+        if begin and data[begin - 1 : begin] != b"\n":
+            begin = data.find(b"\n", begin) + 1 or len(data)
+        if end is not None and end < len(data) and data[end - 1 : end] != b"\n":
+            end = data.find(b"\n", end) + 1 or len(data)
+        return data[begin:end]
+
+    with open(path, "rb") as f:
+        if begin:
+            f.seek(begin - 1)
+            if f.read(1) != b"\n":
+                f.readline()  # the line belongs to the previous range
+        start = f.tell()
+        if end is None:
+            return f.read()
+        if end <= start:
+            return b""
+        data = f.read(end - start)
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+        return data
+
+
+def _init_worker(query: Query):
+    global _query
+    _query = query
+
+
+def _scan_fds(task: tuple) -> list[bytes]:
+    """Collect the lines of the ops that change the fd tables (first pass)."""
+    _, path, begin, end, _ = task
+    pattern = re.compile(_query.pattern(), re.M)
+    return [m.group(0) for m in pattern.finditer(read_range(path, begin, end))]
+
+
+def _scan(task: tuple) -> tuple:
+    """Filter a byte range (second pass).
+
+    :return: (ts, line) matches sorted by timestamp, and with a path filter, the
+        enters without exit at the end of the range, the exits without enter at
+        its beginning, and the calls entered in the range
+    """
+    tracer, path, begin, end, _ = task
+    query = _query
+    pattern = re.compile(query.pattern(), re.M)
+    data = read_range(path, begin, end)
+
+    matches = []
+    if not query.paths:
+        for m in pattern.finditer(data):
+            ts = int(m.group(1))
+            if query.in_time(ts):
+                matches.append((ts, m.group(0)))
+        matches.sort(key=itemgetter(0))
+        return matches, set(), {}, set()
+
+    fds = query.fds
+    pending = set()  # (tid, op) entered with a matching path
+    entered = set()  # (tid, op) entered in the range
+    leading = {}  # (tid, op) => (ts, line) of the first exit without enter
+    for m in pattern.finditer(data):
+        ts, pid, tid, phase, op, body = m.groups()
+        ts = int(ts)
+        tid = int(tid)
+
+        if phase == b"X":
+            key = (tid, PAIR_ALIASES.get(op.decode(), op.decode()))
+            if key in pending:
+                pending.discard(key)
+                if query.in_time(ts):
+                    matches.append((ts, m.group(0)))
+            elif key not in entered and key not in leading:
+                leading[key] = (ts, m.group(0))
+            continue
+
+        key = (tid, op.decode())
+        entered.add(key)
+        pending.discard(key)
+
+        matched = False
+        at = body.find(_FNAME)
+        if at >= 0:
+            fname = body[at + len(_FNAME) :].rstrip(b"}").decode(errors="replace")
+            matched = query.match_path(fname)
+        if not matched:
+            fd = _FD.search(body)
+            if fd is not None:
+                for first, last in fds.get((int(pid), int(fd.group(1))), ()):
+                    if first <= ts and (last is None or ts <= last):
+                        matched = True
+                        break
+        if matched:
+            pending.add(key)
+            if query.in_time(ts):
+                matches.append((ts, m.group(0)))
+
+    matches.sort(key=itemgetter(0))
+    return matches, pending, leading, entered
+
+
+def __follows(previous: tuple, task: tuple) -> bool:
+    """Check if a task starts where the previous one ended (in the same or the next segment)."""
+    if previous is None or previous[0] != task[0]:
+        return False
+    if previous[1] == task[1]:
+        return previous[3] == task[2]
+    return task[2] == 0 and previous[3] in (None, os.path.getsize(previous[1]))
+
+
+def resolve_fds(tasks: list[tuple], query: Query, executor: ProcessPoolExecutor):
+    """Find when the fds of every process referred to a path of the query.
+
+    The open, dup, close, fork, exec, and exit events are collected in
+    parallel, then replayed in order through an FdTable.
+
+    :param tasks: the tasks of the fd ops (see plan)
+    :param query: the query, its `fds` are set
+    :param executor: the worker pool
+    """
+    fds = FdTable()
+    intervals = {}  # (pid, fd) => [[first ts, last ts], ...]
+    current = {}  # pid => fds that refer to a matching path
+    matched = {}  # path => matches the query
+
+    tracers = {}
+    for task, lines in zip(tasks, executor.map(_scan_fds, tasks)):
+        tracers.setdefault(task[0], []).extend(lines)
+
+    for tracer, lines in tracers.items():
+        reader = TraceReader()
+        for record in pair_events(reader.parse(lines), Pairer(emit_oneshots=True)):
+            fds.update(record)
+
+            if record.op == "process":
+                pids = [record.tid]
+            elif record.op in ("fork", "exec"):
+                pids = [record.pid, record.args.get("pid")]
+            else:
+                pids = [record.pid]
+
+            ts = record.ts + (record.latency or 0)
+            for pid in pids:
+                if pid is None:
+                    continue
+                live = set()
+                for fd, path in fds.files(pid).items():
+                    match = matched.get(path)
+                    if match is None:
+                        match = matched[path] = query.match_path(path)
+                    if match:
+                        live.add(fd)
+                before = current.get(pid, set())
+                for fd in live - before:
+                    intervals.setdefault((pid, fd), []).append([ts, None])
+                for fd in before - live:
+                    intervals[(pid, fd)][-1][1] = ts
+                current[pid] = live
+
+    logging.info(f"{len(intervals)} fds refer to {', '.join(query.paths)}")
+    query.fds = intervals
+
+
+def run_query(
+    output_dir: str,
+    query: Query,
+    tracers: list[str] = None,
+    jobs: int = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    limit: int = None,
+):
+    """Run a query over the trace segments of an output directory with a process pool.
+
+    Tasks are submitted a few per worker ahead of the one being merged, and
+    the sorted matches of every task are spooled to a temporary file, so
+    memory does not grow with the matches. With a limit, only the first
+    matches are kept, and the tasks whose index shows they start after
+    them are not scanned.
+
+    :param output_dir: the tracing output directory
+    :param query: the query
+    :param tracers: tracer names to query (default: all event tracers)
+    :param jobs: worker processes (default: one per CPU)
+    :param chunk_size: bytes per task
+    :param limit: maximum number of matches (None for all)
+    :return: a generator of (ts, tracer, line) in timestamp order
+    """
+    start = time.monotonic()
+    jobs = jobs or os.cpu_count()
+
+    if query.paths:
+        # fd tables need the history of every process from the beginning of the trace
+        fd_query = Query(ops=set(FD_OPS), end=query.end)
+        fd_tasks = plan(output_dir, fd_query, tracers, chunk_size)
+        with ProcessPoolExecutor(
+            jobs, initializer=_init_worker, initargs=(fd_query,)
+        ) as executor:
+            resolve_fds(fd_tasks, query, executor)
+
+    tasks = plan(output_dir, query, tracers, chunk_size)
+
+    with tempfile.TemporaryDirectory(prefix="flap-query-") as spool_dir:
+        spools = []
+        first = []  # with a limit, max-heap of (-ts, -seq, tracer, line)
+        seq = itertools.count()
+        matched = scanned = 0
+
+        def done(task: tuple) -> bool:
+            # the limit is reached by matches older than every event of the task
+            return (
+                limit is not None
+                and len(first) >= limit
+                and task[4] is not None
+                and task[4] > -first[0][0]
+            )
+
+        carry, previous = set(), None
+        with ProcessPoolExecutor(
+            jobs, initializer=_init_worker, initargs=(query,)
+        ) as executor:
+            for task, result in __scan_window(
+                tasks, executor, jobs * TASKS_PER_WORKER, done
+            ):
+                matches, pending, leading, entered = result
+                _, path, begin, end, _ = task
+                scanned += (end if end is not None else os.path.getsize(path)) - begin
+
+                # exits of the calls entered with a matching path in the previous range
+                if not __follows(previous, task):
+                    carry = set()
+                for key, (ts, line) in leading.items():
+                    if key in carry and query.in_time(ts):
+                        matches.append((ts, line))
+                matches.sort(key=itemgetter(0))
+                carry = pending | (carry - entered - set(leading))
+                previous = task
+
+                matched += len(matches)
+                if limit is not None:
+                    for ts, line in matches:
+                        row = (-ts, -next(seq), task[0], line)
+                        if len(first) < limit:
+                            heapq.heappush(first, row)
+                        elif ts < -first[0][0]:
+                            heapq.heapreplace(first, row)
+                elif matches:
+                    spool = os.path.join(spool_dir, f"{len(spools)}.tsv")
+                    _write_spool(spool, ((ts, task[0], line) for ts, line in matches))
+                    spools.append(spool)
+
+        logging.info(
+            f"scanned {scanned / 1e6:.1f} MB of {len(tasks)} tasks with {jobs} workers, "
+            f"{matched} matches in {time.monotonic() - start:.2f}s"
+        )
+
+        if limit is not None:
+            for ts, _, tracer, line in sorted(
+                first, key=lambda row: (-row[0], -row[1])
+            ):
+                yield -ts, tracer, line
+            return
+
+        # merge the oldest spools first so the ties keep the task order
+        while len(spools) > MAX_SPOOLS:
+            merged = os.path.join(spool_dir, f"{len(spools)}_merged.tsv")
+            _write_spool(
+                merged,
+                heapq.merge(*map(_read_spool, spools[:MAX_SPOOLS]), key=itemgetter(0)),
+            )
+            for spool in spools[:MAX_SPOOLS]:
+                os.remove(spool)
+            spools = [merged] + spools[MAX_SPOOLS:]
+
+        with ExitStack() as stack:
+            readers = [stack.enter_context(open(spool, "rb")) for spool in spools]
+            yield from heapq.merge(*map(_read_rows, readers), key=itemgetter(0))
+
+
+def __scan_window(tasks: list[tuple], executor: ProcessPoolExecutor, window: int, done):
+    """Scan the tasks with at most `window` of them submitted, in task order.
+
+    :param done: tells when a task does not need to be scanned anymore
+    :return: a generator of (task, result of _scan)
+    """
+    submitted = deque()
+    remaining = iter(tasks)
+    while True:
+        while len(submitted) < window:
+            task = next(remaining, None)
+            if task is None:
+                break
+            if not done(task):
+                submitted.append((task, executor.submit(_scan, task)))
+        if not submitted:
+            return
+        task, future = submitted.popleft()
+        yield task, future.result()
+
+
+def _write_spool(path: str, rows):
+    with open(path, "wb") as f:
+        for ts, tracer, line in rows:
+            f.write(b"%d\t%s\t%s\n" % (ts, tracer.encode(), line))
+
+
+def _read_spool(path: str):
+    with open(path, "rb") as f:
+        yield from _read_rows(f)
+
+
+def _read_rows(f):
+    for row in f:
+        ts, tracer, line = row.rstrip(b"\n").split(b"\t", 2)
+        yield int(ts), tracer.decode(), line
@@ -0,0 +1,496 @@
+import logging
+import mmap
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from src.fdtable import DUP_OPS, OPEN_OPS, READ_OPS, WRITE_OPS, FdTable
+from src.histogram import LogHistogram
+from src.mappings import FAULT_OP, PAGE_SIZE, MappingTable
+from src.pairing import FLAG_ONESHOT, Pairer, pair_events
+from src.parser import NA, read_trace
+from src.patterns import POSITIONED_OPS
+
+ORIGINAL = "original"
+SCALED = "scaled"
+FAST = "afap"  # as fast as possible
+TIMINGS = (ORIGINAL, SCALED, FAST)
+
+SYNC_OPS = ("fsync", "fdatasync")
+
+# files of pseudo filesystems are not replayed
+SKIPPED_PREFIXES = ("/proc/", "/sys/", "/dev/")
+
+FILL_CHUNK = 1024 * 1024
+
+# extra is the whence of lseek, the new fd of dup, and the address of mmap/munmap/faults
+Action = namedtuple(
+    "Action",
+    ["ts", "pid", "op", "fd", "path", "size", "offset", "extra", "latency"],
+)
+
+
+def scratch_path(root: str, path: str) -> str:
+    """Map a traced path into the scratch directory.
+
+    :param root: the scratch directory
+    :param path: the traced path (relative paths are taken from the root)
+    """
+    return os.path.join(root, os.path.normpath(os.path.join("/", path)).lstrip("/"))
+
+
+def replayable(path: str) -> bool:
+    """Check if a traced path is a file that can be replayed.
+
+    :param path: the traced path (None, STDOUT and unknown fds are not)
+    """
+    if not path or path in ("STDIN", "STDOUT", "STDERR") or path.startswith("<"):
+        return False
+    return not os.path.normpath(os.path.join("/", path)).startswith(SKIPPED_PREFIXES)
+
+
+class Workload:
+    """Workload holds the per-thread call sequences of a trace.
+
+    Calls are rebuilt from the paired records: fds are resolved to paths by an
+    FdTable so a replay thread can open a file it did not see opened, and the
+    bytes every file must hold for the reads (and mappings) are tracked
+    through the file offsets.
+    """
+
+    def __init__(self):
+        self.sequences = {}  # tid => [Action]
+        self.extents = {}  # path => bytes the replay reads from the file
+        self.paths = set()  # paths opened or accessed
+        self.skipped = 0  # calls on files that are not replayed
+        self.first_ts = None
+        self.last_ts = None
+
+    def actions(self) -> int:
+        """Return the number of calls to replay."""
+        return sum(len(actions) for actions in self.sequences.values())
+
+    def duration(self) -> float:
+        """Return the traced duration in seconds."""
+        if self.first_ts is None:
+            return 0.0
+        return (self.last_ts - self.first_ts) / 1e9
+
+    def add(self, tid: int, action: Action):
+        self.sequences.setdefault(tid, []).append(action)
+        if self.first_ts is None or action.ts < self.first_ts:
+            self.first_ts = action.ts
+        end = action.ts + (action.latency or 0)
+        if self.last_ts is None or end > self.last_ts:
+            self.last_ts = end
+
+    def extend(self, path: str, end: int):
+        if end > self.extents.get(path, 0):
+            self.extents[path] = end
+
+
+def build_workload(output_dir: str, tracer: str = "io") -> Workload:
+    """Rebuild the call sequences of every thread of a tracer output.
+
+    :param output_dir: the tracing output directory
+    :param tracer: tracer name (io, or combined for the mmap and page fault events)
+    """
+    records = sorted(
+        pair_events(read_trace(output_dir, tracer), Pairer(emit_oneshots=True)),
+        key=lambda record: record.ts,
+    )
+
+    workload = Workload()
+    fds = FdTable()
+    positions = {}  # (pid, fd) => file offset
+    maps = {}  # pid => MappingTable of the replayed mappings
+
+    for record in records:
+        op, pid, args = record.op, record.pid, record.args
+        if record.flags & FLAG_ONESHOT:
+            fds.update(record)
+            continue
+        if record.latency is None:
+            continue
+        ret = record.ret if record.ret is not None and record.ret != NA else -1
+
+        fd = args.get("fd")
+        action = None
+        if op in OPEN_OPS:
+            path = fds.update(record)
+            if ret >= 0 and replayable(path):
+                action = Action(record.ts, pid, op, ret, path, 0, None, None, 0)
+                positions[(pid, ret)] = 0
+        elif op in DUP_OPS:
+            path = fds.update(record)
+            oldfd = args.get("fd", args.get("oldfd"))
+            if ret >= 0 and replayable(path):
+                action = Action(record.ts, pid, op, oldfd, path, 0, None, ret, 0)
+                positions[(pid, ret)] = positions.get((pid, oldfd))
+        elif op == "close":
+            path = fds.update(record)
+            positions.pop((pid, fd), None)
+            if replayable(path):
+                action = Action(record.ts, pid, op, fd, path, 0, None, None, 0)
+        elif op in READ_OPS or op in WRITE_OPS:
+            path = fds.resolve(pid, fd)
+            if ret >= 0 and replayable(path):
+                # pos is the argument of the positioned ops, and the file position
+                # the others started at (printed on their exit)
+                offset = args.get("pos")
+                if offset is not None and offset < 0:
+                    offset = None
+                start = offset if offset is not None else positions.get((pid, fd))
+                if op not in POSITIONED_OPS and start is not None:
+                    positions[(pid, fd)] = start + ret
+                if op in READ_OPS and start is not None:
+                    workload.extend(path, start + ret)
+                action = Action(record.ts, pid, op, fd, path, ret, offset, None, 0)
+        elif op == "lseek":
+            path = fds.resolve(pid, fd)
+            if ret >= 0 and replayable(path):
+                positions[(pid, fd)] = ret
+                action = Action(
+                    record.ts,
+                    pid,
+                    op,
+                    fd,
+                    path,
+                    0,
+                    args.get("offset", 0),
+                    args.get("whence", os.SEEK_SET),
+                    0,
+                )
+        elif op in SYNC_OPS:
+            path = fds.resolve(pid, fd)
+            if ret == 0 and replayable(path):
+                action = Action(record.ts, pid, op, fd, path, 0, None, None, 0)
+        elif op == "mmap":
+            path = fds.resolve(pid, fd) if fd is not None and fd >= 0 else None
+            if ret > 0 and replayable(path):
+                offset = args.get("off", 0)
+                size = args.get("len", 0)
+                workload.extend(path, offset + size)
+                maps.setdefault(pid, MappingTable()).map(ret, size, path, offset)
+                action = Action(record.ts, pid, op, fd, path, size, offset, ret, 0)
+        elif op == "munmap":
+            if ret == 0 and "addr" in args and pid in maps:
+                maps[pid].unmap(args["addr"], args.get("len", 0))
+                action = Action(
+                    record.ts,
+                    pid,
+                    op,
+                    None,
+                    None,
+                    args.get("len", 0),
+                    None,
+                    args["addr"],
+                    0,
+                )
+        elif op == FAULT_OP:
+            # only the faults on replayed mappings (not anonymous memory)
+            table = maps.get(pid)
+            if table is not None and table.lookup(args.get("addr", NA)) is not None:
+                action = Action(
+                    record.ts, pid, op, None, None, 0, None, args["addr"], 0
+                )
+        else:
+            continue
+
+        if action is None:
+            workload.skipped += 1
+            continue
+        if action.path is not None:
+            workload.paths.add(action.path)
+        workload.add(record.tid, action._replace(latency=record.latency))
+
+    logging.info(
+        f"rebuilt {workload.actions()} calls of {len(workload.sequences)} threads "
+        f"on {len(workload.paths)} files, {workload.skipped} calls skipped"
+    )
+    return workload
+
+
+class OpStats:
+    """OpStats holds the traced and replayed latencies and bytes of an operation."""
+
+    def __init__(self):
+        self.count = 0
+        self.traced_bytes = 0
+        self.bytes = 0
+        self.errors = 0
+        self.original = LogHistogram()
+        self.replay = LogHistogram()
+
+    def merge(self, other: "OpStats"):
+        self.count += other.count
+        self.traced_bytes += other.traced_bytes
+        self.bytes += other.bytes
+        self.errors += other.errors
+        self.original.merge(other.original)
+        self.replay.merge(other.replay)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "traced_bytes": self.traced_bytes,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "original_latency": self.original.summary(),
+            "replay_latency": self.replay.summary(),
+        }
+
+
+class Replayer:
+    """Replayer runs the call sequences of a Workload against a scratch directory.
+
+    Every traced thread is replayed by a thread of a pool, with the traced
+    timing (original), the traced timing sped up (scaled), or without waiting
+    between calls (afap). The fds of a traced process are shared by its
+    replay threads, a fd that was opened before tracing started, or by a call
+    that is not replayed yet, is opened on first use.
+    """
+
+    def __init__(
+        self,
+        workload: Workload,
+        scratch_dir: str,
+        timing: str = FAST,
+        speed: float = 1.0,
+        jobs: int = None,
+    ):
+        """Replayer constructor.
+
+        :param workload: the workload to replay
+        :param scratch_dir: the directory the traced paths are mapped into
+        :param timing: original, scaled or afap
+        :param speed: time compression factor of the scaled timing
+        :param jobs: replay threads (default: one per traced thread)
+        """
+        self.workload = workload
+        self.scratch_dir = scratch_dir
+        self.timing = timing
+        self.speed = speed if timing == SCALED else 1.0
+        self.jobs = jobs or max(1, len(workload.sequences))
+
+        self._lock = threading.Lock()
+        self._fds = {}  # (pid, fd) => replay fd
+        self._maps = {}  # pid => MappingTable of mmap handles
+        self._mmaps = {}  # handle => mmap object
+        self._buffer = b""
+        self._start = None
+
+    def prepare(self):
+        """Create the scratch files with enough data for the traced reads and mappings."""
+        sizes = {}
+        for path in self.workload.paths:
+            target = scratch_path(self.scratch_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            extent = self.workload.extents.get(path, 0)
+            if os.path.isdir(target):
+                continue
+            size = os.path.getsize(target) if os.path.exists(target) else 0
+            if size < extent:
+                with open(target, "ab") as f:
+                    chunk = b"\xa5" * FILL_CHUNK
+                    while size < extent:
+                        size += f.write(chunk[: min(FILL_CHUNK, extent - size)])
+            sizes[path] = size
+
+        largest = max(
+            (
+                action.size
+                for actions in self.workload.sequences.values()
+                for action in actions
+                if action.op in WRITE_OPS
+            ),
+            default=0,
+        )
+        self._buffer = b"\x5a" * largest
+        logging.info(
+            f"prepared {len(sizes)} files in {self.scratch_dir} "
+            f"({sum(sizes.values()) / 1e6:.1f} MB)"
+        )
+
+    def run(self) -> dict:
+        """Replay the workload and return the report."""
+        self.prepare()
+        sequences = list(self.workload.sequences.values())
+
+        self._start = time.monotonic_ns()
+        with ThreadPoolExecutor(self.jobs) as executor:
+            results = list(executor.map(self._replay, sequences))
+        elapsed = (time.monotonic_ns() - self._start) / 1e9
+
+        for fd in list(self._fds.values()):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        for mm in self._mmaps.values():
+            mm.close()
+
+        ops, lag = {}, LogHistogram()
+        for thread_ops, thread_lag in results:
+            lag.merge(thread_lag)
+            for op, stats in thread_ops.items():
+                ops.setdefault(op, OpStats()).merge(stats)
+        return self._report(ops, lag, elapsed)
+
+    def _replay(self, actions: list[Action]) -> tuple[dict, LogHistogram]:
+        ops = {}  # op => OpStats
+        lag = LogHistogram()
+        first_ts = self.workload.first_ts
+        timed = self.timing != FAST
+
+        for action in actions:
+            if timed:
+                due = self._start + int((action.ts - first_ts) / self.speed)
+                wait = due - time.monotonic_ns()
+                if wait > 0:
+                    time.sleep(wait / 1e9)
+                lag.record(max(0, -wait))
+
+            stats = ops.get(action.op)
+            if stats is None:
+                stats = ops[action.op] = OpStats()
+            stats.count += 1
+            stats.original.record(action.latency)
+            if action.op in READ_OPS or action.op in WRITE_OPS:
+                stats.traced_bytes += action.size
+
+            start = time.perf_counter_ns()
+            try:
+                stats.bytes += self._call(action)
+            except (OSError, ValueError, IndexError):
+                stats.errors += 1
+                continue
+            stats.replay.record(time.perf_counter_ns() - start)
+        return ops, lag
+
+    def _call(self, action: Action) -> int:
+        """Run one call and return the bytes it read or wrote."""
+        op = action.op
+        if op in OPEN_OPS:
+            fd = os.open(
+                scratch_path(self.scratch_dir, action.path),
+                os.O_RDWR | os.O_CREAT,
+                0o644,
+            )
+            with self._lock:
+                previous = self._fds.get((action.pid, action.fd))
+                self._fds[(action.pid, action.fd)] = fd
+            if previous is not None:
+                os.close(previous)
+            return 0
+        if op == FAULT_OP:
+            table = self._maps.get(action.pid)
+            hit = table.lookup(action.extra) if table is not None else None
+            if hit is not None:
+                handle, offset = hit
+                self._mmaps[handle][offset]
+            return 0
+        if op == "munmap":
+            table = self._maps.get(action.pid)
+            if table is not None:
+                table.unmap(action.extra, action.size)
+            return 0
+
+        fd = self._fd(action)
+        if op in ("read", "readv"):
+            if action.offset is not None:
+                os.lseek(fd, action.offset, os.SEEK_SET)
+            return len(os.read(fd, action.size))
+        if op in ("pread64", "preadv"):
+            if action.offset is None:
+                return len(os.read(fd, action.size))
+            return len(os.pread(fd, action.size, action.offset))
+        if op in ("write", "writev"):
+            if action.offset is not None:
+                os.lseek(fd, action.offset, os.SEEK_SET)
+            return os.write(fd, memoryview(self._buffer)[: action.size])
+        if op in ("pwrite64", "pwritev"):
+            data = memoryview(self._buffer)[: action.size]
+            if action.offset is None:
+                return os.write(fd, data)
+            return os.pwrite(fd, data, action.offset)
+        if op == "lseek":
+            os.lseek(fd, action.offset, action.extra)
+        elif op == "fsync":
+            os.fsync(fd)
+        elif op == "fdatasync":
+            os.fdatasync(fd)
+        elif op in DUP_OPS:
+            new = os.dup(fd)
+            with self._lock:
+                previous = self._fds.get((action.pid, action.extra))
+                self._fds[(action.pid, action.extra)] = new
+            if previous is not None:
+                os.close(previous)
+        elif op == "close":
+            with self._lock:
+                fd = self._fds.pop((action.pid, action.fd), None)
+            if fd is not None:
+                os.close(fd)
+        elif op == "mmap":
+            mm = mmap.mmap(
+                fd, action.size, access=mmap.ACCESS_READ, offset=action.offset
+            )
+            with self._lock:
+                handle = len(self._mmaps)
+                self._mmaps[handle] = mm
+                table = self._maps.get(action.pid)
+                if table is None:
+                    table = self._maps[action.pid] = MappingTable(PAGE_SIZE)
+            table.map(action.extra, action.size, handle, 0)
+        return 0
+
+    def _fd(self, action: Action) -> int:
+        """Get the replay fd of a traced fd, the file is opened on first use."""
+        key = (action.pid, action.fd)
+        fd = self._fds.get(key)
+        if fd is not None:
+            return fd
+        fd = os.open(
+            scratch_path(self.scratch_dir, action.path), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        with self._lock:
+            if key in self._fds:
+                os.close(fd)
+                return self._fds[key]
+            self._fds[key] = fd
+        return fd
+
+    def _report(self, ops: dict, lag: LogHistogram, elapsed: float) -> dict:
+        def throughput(duration: float, traced: bool) -> dict:
+            def total(names):
+                return sum(
+                    s.traced_bytes if traced else s.bytes
+                    for op, s in ops.items()
+                    if op in names
+                )
+
+            read, written = total(READ_OPS), total(WRITE_OPS)
+            calls = sum(s.count for s in ops.values())
+            return {
+                "duration": duration,
+                "read_bytes_per_sec": read / duration if duration else None,
+                "write_bytes_per_sec": written / duration if duration else None,
+                "calls_per_sec": calls / duration if duration else None,
+            }
+
+        return {
+            "timing": self.timing,
+            "speed": self.speed,
+            "threads": len(self.workload.sequences),
+            "calls": self.workload.actions(),
+            "skipped": self.workload.skipped,
+            "errors": sum(s.errors for s in ops.values()),
+            "original": throughput(self.workload.duration(), True),
+            "replay": throughput(elapsed, False),
+            # how late the timed calls started (nsecs)
+            "lag": lag.summary() if self.timing != FAST else None,
+            "ops": {op: stats.as_dict() for op, stats in sorted(ops.items())},
+        }
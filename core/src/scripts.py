@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+
+# a probe section starts with a comment at the beginning of a line, e.g. /* read enter + exit */
+_SECTION = re.compile(r"^/\* (.+?) \*/$", re.M)
+_SECTION_OP = re.compile(r"^([a-z0-9_ ]+?)(?: enter \+ exit)?$")
+_PROBE = re.compile(r"^\w+:(?:\w+:)?(?:sys_enter_)?(\w+)$", re.M)
+_ASSIGNED_MAP = re.compile(r"@(\w+)(?:\[[^\]\n]*\])?\s*(?:[-+]?=[^=]|\+\+|--)")
+_MAP = re.compile(r"@(\w+)")
+_PROBE_BODY = re.compile(r"^\w+:[^\n]*\n(?:/[^\n]*/\n)?\{\n.*?^\}\n", re.M | re.S)
+_MAP_ACTION = re.compile(r"^\s*(?:print|clear)\(@(\w+)\);\n", re.M)
+_OUTPUT = re.compile(r"^// output (\w+): ([\w,]*)$", re.M)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "flap")
+
+
+def __split(text: str) -> list[tuple[str, str]]:
+    """Split a rendered script into (op, section) pairs.
+
+    op is None for the sections that are always kept (BEGIN, child-process
+    tracing, aggregation dumps, ...).
+    """
+    starts = [m.start() for m in _SECTION.finditer(text)]
+    bounds = [0] + starts + [len(text)]
+
+    sections = []
+    for begin, end in zip(bounds, bounds[1:]):
+        if begin == end:
+            continue
+        section = text[begin:end]
+
+        op = None
+        header = _SECTION.match(section)
+        if header:
+            m = _SECTION_OP.match(header.group(1))
+            name = m.group(1).replace(" ", "_") if m else None
+            # only sections that attach a probe of the same name are selectable
+            if name and name in _PROBE.findall(section):
+                op = name
+
+        sections.append((op, section))
+
+    return sections
+
+
+def probed_ops(text: str) -> list[str]:
+    """List the operations that can be selected in a rendered script.
+
+    :param text: the bpftrace script
+    """
+    return [op for op, _ in __split(text) if op is not None]
+
+
+def select_ops(text: str, syscalls: list[str] = None, exclude: list[str] = None):
+    """Keep only the selected probe sections of a rendered script.
+
+    :param text: the bpftrace script
+    :param syscalls: operations to keep (None keeps all)
+    :param exclude: operations to remove
+    :return: (the reduced script, the kept operations)
+    """
+    exclude = set(exclude or [])
+
+    kept = []
+    parts = []
+    for op, section in __split(text):
+        if op is not None:
+            if (syscalls is not None and op not in syscalls) or op in exclude:
+                continue
+            kept.append(op)
+        parts.append(section)
+    text = "".join(parts)
+
+    # probes of the kept sections reading maps filled by a removed one (e.g. the
+    # writeback bios without the writeback probes) would not compile
+    while True:
+        assigned = set(_ASSIGNED_MAP.findall(text))
+        reduced = _PROBE_BODY.sub(
+            lambda m: (
+                m.group(0)
+                if set(_MAP.findall(_MAP_ACTION.sub("", m.group(0)))) <= assigned
+                else ""
+            ),
+            text,
+        )
+        if reduced == text:
+            break
+        text = reduced
+
+    # print()/clear() of maps that are not filled anymore would not compile
+    assigned = set(_ASSIGNED_MAP.findall(text))
+    text = _MAP_ACTION.sub(lambda m: m.group(0) if m.group(1) in assigned else "", text)
+
+    return text, kept
+
+
+def script_outputs(text: str) -> dict[str, list[str]]:
+    """Read the outputs of a combined script (see scripts/gen_bpftrace.py).
+
+    :param text: the bpftrace script
+    :return: output name => operations printed only for this output
+    """
+    return {
+        m.group(1): [op for op in m.group(2).split(",") if op]
+        for m in _OUTPUT.finditer(text)
+    }
+
+
+def must_know_ops(ops: list[str], available: set[str]):
+    """Check if the requested operations are probed by the scripts.
+
+    :param ops: requested operations
+    :param available: operations of the scripts
+    """
+    unknown = sorted(set(ops) - available)
+    if unknown:
+        logging.error(
+            f"unknown syscalls {unknown}, available: {', '.join(sorted(available))}"
+        )
+        sys.exit(6)
+
+
+def select_script(
+    path: str,
+    syscalls: list[str] = None,
+    exclude: list[str] = None,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+) -> str:
+    """Render a script with the selected probes only, using an on-disk cache.
+
+    The cache key is a hash of the script content and the selection, so a
+    regenerated script or a different selection never hits a stale entry.
+
+    :param path: the generated bpftrace script
+    :param syscalls: operations to keep (None keeps all)
+    :param exclude: operations to remove
+    :param cache_dir: directory of the rendered scripts
+    :return: the rendered script path, None if no probe is left
+    """
+    with open(path, "rb") as f:
+        source = f.read()
+
+    key = hashlib.sha256(source)
+    key.update(b"\0" + ",".join(sorted(syscalls)).encode() if syscalls else b"\0*")
+    key.update(b"\0" + ",".join(sorted(exclude or [])).encode())
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    target = os.path.join(cache_dir, f"{name}-{key.hexdigest()[:16]}.bt")
+    empty = target + ".empty"
+
+    if os.path.isfile(target):
+        logging.debug(f"using cached script {target}")
+        return target
+    if os.path.isfile(empty):
+        return None
+
+    text, kept = select_ops(source.decode(), syscalls, exclude)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if not kept:
+        open(empty, "w").close()
+        return None
+
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, target)
+
+    logging.info(f"rendered {path} with {len(kept)} operations into {target}")
+    return target
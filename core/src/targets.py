@@ -0,0 +1,84 @@
+import logging
+import os
+
+from src.metadata import update_metadata
+from src.timestamp import export_reference_timestamps
+
+# lseek(-1, cgroup id, command) calls are caught by the multi-target scripts,
+# the kernel then rejects them with EBADF
+CONTROL_TRACK = 0x666C6101
+CONTROL_UNTRACK = 0x666C6100
+
+
+def __control(command: int, cgid: str):
+    try:
+        os.lseek(-1, int(cgid), command)
+    except OSError:
+        pass
+
+
+def track(cgid: str):
+    """Add a cgroup to the tracked cgroups of the running multi-target scripts.
+
+    :param cgid: the cgroup id
+    """
+    __control(CONTROL_TRACK, cgid)
+
+
+def untrack(cgid: str):
+    """Remove a cgroup from the tracked cgroups of the running multi-target scripts.
+
+    :param cgid: the cgroup id
+    """
+    __control(CONTROL_UNTRACK, cgid)
+
+
+class Target:
+    """Target is a cgroup traced by the multi-target tracers, with its own output directory.
+
+    The output directory looks like the one of a single-target session (reference
+    timestamps, metadata, trace files), so the analysis tools work on it as is.
+    """
+
+    def __init__(self, cgid: str, output_dir: str, name: str = None, comm: str = None):
+        """Target constructor.
+
+        :param cgid: the cgroup id
+        :param output_dir: the output directory of the target
+        :param name: a name for logs and metadata (default: the cgroup id)
+        :param comm: only keep the events of this command (None for all)
+        """
+        self.cgid = str(cgid)
+        self.output_dir = output_dir
+        self.name = name or self.cgid
+        self.comm = comm
+
+        self._prepared = False
+        self._tracers = {}  # tracer name => metadata entry
+
+    def prepare(self):
+        """Create the output directory (once) and store the reference timestamps.
+
+        an existing directory is never emptied, the daemon gives every session its own.
+        """
+        if self._prepared:
+            return
+        self._prepared = True
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        export_reference_timestamps(self.output_dir)
+        update_metadata(self.output_dir, target=self.metadata())
+        logging.debug(f"[{self.name}] output directory initialized")
+
+    def metadata(self) -> dict:
+        """Get the target entry of the run metadata."""
+        return {"cgroup": self.cgid, "name": self.name, "comm": self.comm}
+
+    def record(self, tracer: str, entry: dict):
+        """Store the metadata entry of a tracer in the target directory.
+
+        :param tracer: the tracer name
+        :param entry: the tracer entry (merged into the previous one)
+        """
+        self._tracers[tracer] = self._tracers.get(tracer, {}) | entry
+        update_metadata(self.output_dir, tracers=self._tracers)
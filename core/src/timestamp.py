@@ -1,7 +1,25 @@
+import asyncio
+import bisect
 import json
 import logging
 import os
+import re
 import time
+from array import array
+
+from src.compression import open_segment
+from src.parser import trace_files
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+TIMELINE_FILE = "timeline.jsonl"
+ANCHOR_INTERVAL = 60  # seconds between two host clock anchors
+CLOCK_SCAN_SIZE = 64 * 1024  # bytes of a trace file searched for the BEGIN anchor
+
+_CLOCK = re.compile(rb"^(\d+) CLOCK (\d+)\.(\d+)$")
 
 
 def export_reference_timestamps(output_dir: str):
@@ -27,3 +45,253 @@ def export_reference_timestamps(output_dir: str):
         json.dump({"ref_wall": ref_wall, "ref_mono": ref_mono}, mf, indent=2)
 
     logging.info("reference timestamps saved to: %s", meta_file)
+
+
+def load_reference_timestamps(output_dir: str) -> dict:
+    """Read the reference timestamps of a tracing output directory.
+
+    :param output_dir: the output directory that has the timestamps.json file
+    :return: a dict with ref_wall and ref_mono (ref_mono is None if unknown)
+    """
+    meta_file = os.path.join(output_dir, "reference_timestamps.json")
+    try:
+        with open(meta_file) as mf:
+            return json.load(mf)
+    except FileNotFoundError:
+        logging.warning(f"no reference timestamps in {output_dir}")
+        return {"ref_wall": None, "ref_mono": None}
+
+
+def wall_clock_offset(refs: dict) -> float:
+    """Return the offset (in seconds) to add to a bpftrace nsecs/1e9 value to get wall time.
+
+    :param refs: reference timestamps returned by load_reference_timestamps
+    :return: the offset, or None when the references are not complete
+    """
+    if refs.get("ref_wall") is None or refs.get("ref_mono") is None:
+        return None
+    return refs["ref_wall"] - refs["ref_mono"]
+
+
+def clock_anchor(samples: int = 3) -> tuple[int, int]:
+    """Read the monotonic clock (bpftrace nsecs) and the wall clock at the same instant.
+
+    The wall clock is read before and after the monotonic clock, the pair with
+    the shortest gap is kept and its midpoint is the wall time.
+
+    :param samples: number of reads
+    :return: (monotonic nsecs, wall clock nsecs)
+    """
+    best = None
+    for _ in range(samples):
+        before = time.time_ns()
+        mono = time.clock_gettime_ns(time.CLOCK_MONOTONIC)
+        after = time.time_ns()
+        if best is None or after - before < best[0]:
+            best = (after - before, mono, (before + after) // 2)
+    return best[1], best[2]
+
+
+def append_anchor(output_dir: str, mono: int, wall: int, source: str = "host"):
+    """Append a clock anchor to the timeline file of an output directory.
+
+    :param output_dir: the tracing output directory
+    :param mono: monotonic nsecs (the bpftrace nsecs clock)
+    :param wall: wall clock nsecs
+    :param source: host (sampled by FLAP) or the tracer that printed it
+    """
+    with open(os.path.join(output_dir, TIMELINE_FILE), "a") as f:
+        f.write(json.dumps({"source": source, "mono": mono, "wall": wall}) + "\n")
+
+
+def parse_clock_line(line: bytes) -> tuple[int, int]:
+    """Parse the "<nsecs> CLOCK <wall seconds>" line printed by the BEGIN block of the scripts.
+
+    :param line: a line of bpftrace output
+    :return: (monotonic nsecs, wall clock nsecs), None if it is not a clock line
+    """
+    match = _CLOCK.match(line.strip())
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2)) * 10**9 + int(
+        match.group(3).ljust(9, b"0")[:9]
+    )
+
+
+def anchor_service(output_dir: str, interval: float = ANCHOR_INTERVAL):
+    """Build the service (see ignite_tracing) that records the clock anchors of a session.
+
+    A host anchor is written at start, every `interval` seconds, and at the end.
+    The anchor printed by the BEGIN block of every tracer is copied from the
+    head of its first trace file once it shows up.
+
+    :param output_dir: the tracing output directory
+    :param interval: seconds between two host anchors
+    """
+
+    async def service(_):
+        found = set()  # tracers whose BEGIN anchor is in the timeline
+        start = last = time.monotonic()
+        append_anchor(output_dir, *clock_anchor())
+        try:
+            while True:
+                now = time.monotonic()
+                if now - last >= interval:
+                    append_anchor(output_dir, *clock_anchor())
+                    last = now
+
+                # the BEGIN block runs as soon as the probes are attached
+                for tracer, paths in trace_files(output_dir).items():
+                    if tracer in found or not paths or now - start > interval:
+                        continue
+                    anchor = __head_anchor(paths[0])
+                    if anchor is not None:
+                        append_anchor(output_dir, *anchor, source=tracer)
+                        found.add(tracer)
+
+                await asyncio.sleep(min(1.0, interval))
+        finally:
+            append_anchor(output_dir, *clock_anchor())
+
+    return service
+
+
+def __head_anchor(path: str) -> tuple[int, int]:
+    try:
+        with open_segment(path) as f:
+            head = f.read(CLOCK_SCAN_SIZE)
+    except (OSError, EOFError):
+        return None
+    for line in head.splitlines():
+        anchor = parse_clock_line(line)
+        if anchor is not None:
+            return anchor
+    return None
+
+
+def load_timeline(output_dir: str) -> list[tuple[int, int]]:
+    """Read the clock anchors of an output directory.
+
+    The directories of multi-target sessions use the timeline of the session
+    directory. Without a timeline, the reference timestamps are the only anchor.
+
+    :param output_dir: the tracing output directory
+    :return: (monotonic nsecs, wall clock nsecs) anchors ordered by monotonic time
+    """
+    anchors = {}
+    for directory in (output_dir, os.path.dirname(os.path.abspath(output_dir))):
+        try:
+            with open(os.path.join(directory, TIMELINE_FILE)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        anchors.setdefault(entry["mono"], entry["wall"])
+                    except (ValueError, KeyError):
+                        continue  # an anchor cut by a crash
+        except FileNotFoundError:
+            continue
+        break
+
+    if not anchors:
+        refs = load_reference_timestamps(output_dir)
+        offset = wall_clock_offset(refs)
+        if offset is not None:
+            anchors[int(refs["ref_mono"] * 1e9)] = int(refs["ref_wall"] * 1e9)
+
+    return sorted(anchors.items())
+
+
+class ClockConverter:
+    """ClockConverter maps bpftrace nsecs to wall clock nsecs and back.
+
+    Between two anchors the conversion is linear, so the drift of the clocks is
+    corrected, before the first and after the last anchor the closest segment
+    is extended. A single anchor is a constant offset.
+    """
+
+    def __init__(self, anchors: list[tuple[int, int]]):
+        """ClockConverter constructor.
+
+        :param anchors: (monotonic nsecs, wall clock nsecs) anchors ordered by monotonic time
+        """
+        if not anchors:
+            raise ValueError("no clock anchors")
+        self.anchors = anchors
+        self._mono = [mono for mono, _ in anchors]
+        self._wall = [wall for _, wall in anchors]
+
+        # rate of the wall clock per monotonic nsec for every segment
+        self._rates = [
+            (w1 - w0) / (m1 - m0) if m1 > m0 else 1.0
+            for (m0, w0), (m1, w1) in zip(anchors, anchors[1:])
+        ] or [1.0]
+        self._columns = None  # numpy copies of the anchors
+
+    @classmethod
+    def load(cls, output_dir: str) -> "ClockConverter":
+        """Build the converter of an output directory.
+
+        :param output_dir: the tracing output directory
+        :return: the converter, None if the directory has no anchors
+        """
+        anchors = load_timeline(output_dir)
+        return cls(anchors) if anchors else None
+
+    def to_wall(self, nsecs: int) -> int:
+        """Convert bpftrace nsecs to wall clock nsecs.
+
+        :param nsecs: monotonic nsecs
+        """
+        i = min(
+            max(bisect.bisect_right(self._mono, nsecs) - 1, 0), len(self._rates) - 1
+        )
+        return self._wall[i] + round((nsecs - self._mono[i]) * self._rates[i])
+
+    def to_mono(self, wall: int) -> int:
+        """Convert wall clock nsecs to bpftrace nsecs.
+
+        :param wall: wall clock nsecs
+        """
+        i = min(max(bisect.bisect_right(self._wall, wall) - 1, 0), len(self._rates) - 1)
+        return self._mono[i] + round((wall - self._wall[i]) / self._rates[i])
+
+    def to_wall_array(self, nsecs):
+        """Convert a column of bpftrace nsecs to wall clock nsecs.
+
+        With numpy the column is converted at once (int64 in, int64 out),
+        otherwise the values are converted one by one into an array("q").
+
+        :param nsecs: a numpy array or a sequence of monotonic nsecs
+        """
+        if np is None:
+            return array("q", [self.to_wall(value) for value in nsecs])
+
+        if self._columns is None:
+            self._columns = (
+                np.asarray(self._mono, dtype=np.int64),
+                np.asarray(self._wall, dtype=np.int64),
+                np.asarray(self._rates, dtype=np.float64),
+            )
+        mono, wall, rates = self._columns
+
+        nsecs = np.asarray(nsecs, dtype=np.int64)
+        i = np.searchsorted(mono, nsecs, side="right")
+        i -= 1
+        np.clip(i, 0, len(rates) - 1, out=i)
+
+        # offsets into a segment are exact in float64, only the product is rounded
+        delta = (nsecs - mono[i]).astype(np.float64)
+        delta *= rates[i]
+        np.rint(delta, out=delta)
+        result = delta.astype(np.int64)
+        result += wall[i]
+        return result
+
+    def to_seconds(self, nsecs) -> array:
+        """Convert a column of bpftrace nsecs to wall clock seconds (float64).
+
+        :param nsecs: a sequence of monotonic nsecs
+        """
+        if np is None:
+            return array("d", [self.to_wall(value) / 1e9 for value in nsecs])
+        return array("d", (self.to_wall_array(nsecs) / 1e9).tobytes())
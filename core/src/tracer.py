@@ -1,13 +1,70 @@
+import asyncio
 import logging
 import os
-import subprocess
-import threading
+import re
 import time
 from abc import ABC
+from collections import namedtuple
+
+from src.compression import RetentionPolicy, SegmentWorker
+from src.index import write_index
+from src.targets import Target, track, untrack
+from src.timestamp import append_anchor, parse_clock_line
+
+READ_CHUNK_SIZE = 1024 * 1024  # bytes per read from bpftrace stdout
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024  # output file buffer size
+
+_LOST_EVENTS = re.compile(rb"^Lost (\d+) events", re.M)
+_MAX_LOST_TAIL = 256  # longest partial line kept between chunks
+
+TracerReport = namedtuple(
+    "TracerReport", ["name", "returncode", "lost_events", "events", "restarts"]
+)
+
+
+class LostEventCounter:
+    """LostEventCounter counts the 'Lost N events' lines of bpftrace output chunks."""
+
+    def __init__(self):
+        self.total = 0
+        self._tail = b""
+
+    def scan(self, data: bytes) -> int:
+        """Scan a chunk of output (chunks may split lines).
+
+        :param data: output chunk
+        :return: number of lost events found in this chunk
+        """
+        found = 0
+        if self._tail:
+            cut = data.find(b"\n") + 1
+            found += self.__count(self._tail + data[:cut])
+            self._tail = b""
+        else:
+            cut = 0
+
+        end = data.rfind(b"\n") + 1
+        if end > cut:
+            found += self.__count(data, cut, end)
+        if len(data) - max(end, cut) < _MAX_LOST_TAIL:
+            self._tail = data[max(end, cut) :]
+
+        self.total += found
+        return found
+
+    def __count(self, data, start: int = 0, end: int = None) -> int:
+        if data.find(b"Lost ", start, end if end is not None else len(data)) < 0:
+            return 0
+        end = end if end is not None else len(data)
+        return sum(int(m.group(1)) for m in _LOST_EVENTS.finditer(data, start, end))
 
 
 class Tracer(ABC):
-    """Tracer runs bpftrace scripts."""
+    """Tracer runs bpftrace scripts.
+
+    A tracer only knows how to spawn its bpftrace process and how to consume its
+    output, the src/matchbox Supervisor runs all of them on a single event loop.
+    """
 
     def __init__(
         self, tid: str, script: str, output_dir: str, termination_timeout: int = 2
@@ -26,9 +83,16 @@ class Tracer(ABC):
 
         self._options = []  # bpftrace options
         self._args = []  # bpftrace input arguments
+        self._sample_rate = 1  # record 1-in-N threads or processes
+        self._sample_by = "tid"
+        self._env = {}  # extra environment variables of bpftrace
 
-        self._stop_event = None
-        self._t = None
+        self._proc = None
+        self._supervisor = None
+        self._lost = LostEventCounter()
+        self._events = 0  # output lines
+        self._generation = 0  # number of restarts
+        self._adaptations = []
 
     def with_options(self, options: list[str]):
         """
@@ -46,152 +110,691 @@ class Tracer(ABC):
         """
         self._args += args
 
-    def start(self):
-        """Start a tracer by calling the __start_tracer in a thread."""
-        self._stop_event = threading.Event()
-        self._t = threading.Thread(target=self.start_tracer, args=(), daemon=True)
-        self._t.start()
+    def with_sampling(self, rate: int = 1, by: str = "tid"):
+        """
+        Record the syscalls of 1-in-N threads (or processes) only.
 
-    def stop(self):
-        """Stop the tracer by terminating its process and thread."""
-        self._stop_event.set()
-        if self._t:
-            self._t.join()
+        :param rate: the sampling rate N (1 disables sampling)
+        :param by: tid or pid
+        """
+        self._sample_rate = rate
+        self._sample_by = by
+
+    def with_env(self, env: dict[str, str]):
+        """
+        Add environment variables to bpftrace (e.g., BPFTRACE_PERF_RB_PAGES).
+
+        :param env: variables to set
+        """
+        self._env.update(env)
+
+    def env(self, key: str, default: str = None) -> str:
+        """Get an environment variable as bpftrace sees it."""
+        return self._env.get(key, os.environ.get(key, default))
 
-    def wait(self):
-        """Wait for the tracing process to finish."""
-        if self._t:
-            self._t.join()
+    def sampling(self) -> tuple[int, str]:
+        """Get the sampling rate and key (tid or pid)."""
+        return self._sample_rate, self._sample_by
 
     def name(self) -> str:
         """Get the name of the tracer."""
         return self._tid
 
-    @classmethod
-    def start_tracer(self):
-        pass
+    def termination_timeout(self) -> int:
+        """Get the termination timeout of the tracer in seconds."""
+        return self._tto
+
+    def command(self) -> list[str]:
+        """Get the bpftrace command of the tracer."""
+        return ["bpftrace"] + self._options + [self._script] + self.positional_args()
+
+    def positional_args(self) -> list[str]:
+        """Get the script arguments, the sampling parameters come after the input arguments."""
+        by = "1" if self._sample_by == "pid" else "0"
+        return self._args + [str(self._sample_rate), by]
+
+    def metadata(self) -> dict:
+        """Get the tracer entry of the run metadata."""
+        metadata = {
+            "script": self._script,
+            "sample_rate": self._sample_rate,
+            "sample_by": self._sample_by,
+        }
+        if self._adaptations:
+            metadata["adaptations"] = self._adaptations
+        return metadata
+
+    def loss(self) -> tuple[int, int]:
+        """Get the number of output lines and lost events so far."""
+        return self._events, self._lost.total
+
+    def output_files(self) -> list[str]:
+        """Get the names of the files the current run writes to (its first segments)."""
+        return []
+
+    def adapted(self, action: str, **settings):
+        """Record a change of settings that applies from the next restart.
+
+        the files of the restarted run are added once it started.
+
+        :param action: description of the change
+        :param settings: the new settings for the run metadata
+        """
+        logging.warning(f"[{self._tid}] restarting: {action}")
+        self._adaptations.append(
+            {"generation": self._generation + 1, "action": action, **settings}
+        )
+
+    def stop(self):
+        """Ask the supervisor to stop the tracers (safe to call from signal handlers)."""
+        if self._supervisor is not None:
+            self._supervisor.stop()
+
+    async def spawn(self):
+        """Start the bpftrace process."""
+        cmd = self.command()
+        logging.debug(f"[{self._tid}] starting tracer: {' '.join(cmd)}")
+
+        self._proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=READ_CHUNK_SIZE,
+            env={**os.environ, **self._env} if self._env else None,
+        )
 
+    async def respawn(self):
+        """Start a new bpftrace process with the current settings."""
+        self._generation += 1
+        await self.spawn()
 
-class MonoTracer(Tracer):
-    """Tracer runs bpftrace in a separate thread with output by bpftrace."""
+        files = self.output_files()
+        for adaptation in self._adaptations:
+            if adaptation["generation"] == self._generation:
+                adaptation["files"] = files
 
-    def start_tracer(self):
-        """Start tracer in a new process and wait until its over or the stop event is received."""
-        self.with_options(
-            ["-o", os.path.join(self._output_dir, f"trace_{self._tid}_0.log")]
+    async def pump(self) -> int:
+        """Stream stdout and stderr until bpftrace exits.
+
+        :return: bpftrace exit status
+        """
+        await asyncio.gather(
+            self.__drain(self._proc.stdout, self.on_stdout),
+            self.__drain(self._proc.stderr, self.on_stderr),
         )
+        return await self._proc.wait()
+
+    def terminate(self):
+        """Send SIGTERM to bpftrace."""
+        if self._proc is not None and self._proc.returncode is None:
+            logging.debug(f"[{self._tid}] stopping tracer")
+            self._proc.terminate()
+
+    def kill(self):
+        """Send SIGKILL to bpftrace."""
+        if self._proc is not None and self._proc.returncode is None:
+            logging.debug(f"[{self._tid}] killing tracer")
+            self._proc.kill()
+
+    def close(self):
+        """Release the tracer outputs after bpftrace exited."""
+        logging.debug(f"[{self._tid}] exiting tracer")
+
+    def report(self) -> TracerReport:
+        """Get the exit status and lost-event count of the tracer."""
+        returncode = self._proc.returncode if self._proc is not None else None
+        events, lost = self.loss()
+        return TracerReport(self._tid, returncode, lost, events, self._generation)
+
+    def on_stdout(self, data: bytes):
+        """Consume a chunk of bpftrace stdout."""
+        self.on_stderr(data)
+
+    def on_stderr(self, data: bytes):
+        """Consume a chunk of bpftrace stderr."""
+        self._lost.scan(data)
+        for line in data.decode(errors="replace").splitlines():
+            if line.strip():
+                logging.warning(f"[{self._tid}] bpftrace: {line}")
+
+    async def __drain(self, stream: asyncio.StreamReader, consume):
+        while True:
+            data = await stream.read(READ_CHUNK_SIZE)
+            if not data:
+                return
+            consume(data)
 
-        # create the bpftrace command
-        bt_command = ["bpftrace"] + self._options + [self._script] + self._args
 
-        logging.debug(
-            "[{}] starting tracer: {}".format(self._tid, " ".join(bt_command))
+class MonoTracer(Tracer):
+    """Tracer runs bpftrace with output by bpftrace."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._offset = 0  # scanned bytes of the output file
+        self._index = False
+
+    def with_index(self):
+        """Write a sidecar index (src/index.py) of the output file once it is complete."""
+        self._index = True
+
+    def output_file(self) -> str:
+        """Get the path of the bpftrace output file (a new file after each restart)."""
+        return os.path.join(
+            self._output_dir, f"trace_{self._tid}_{self._generation}.log"
         )
 
-        try:
-            # run a new process
-            proc = subprocess.Popen(bt_command)
-
-            while proc.poll() is None:
-                if self._stop_event.is_set():
-                    logging.debug(f"[{self._tid}] stopping tracer")
-                    proc.terminate()
-                    try:
-                        logging.debug(f"[{self._tid}] waiting for {self._tto}s")
-                        proc.wait(timeout=self._tto)
-                    except subprocess.TimeoutExpired:
-                        logging.debug(f"[{self._tid}] killing tracer")
-                        proc.kill()
-                    return
-                time.sleep(0.2)
-        except Exception as e:
-            logging.error(f"[{self._tid}] failed: {e}")
-        finally:
-            logging.debug(f"[{self._tid}]  exiting tracer")
+    def output_files(self) -> list[str]:
+        """Get the name of the output file of the current run."""
+        return [os.path.basename(self.output_file())]
+
+    async def spawn(self):
+        """Start bpftrace, its output file is scanned from the beginning."""
+        self._offset = 0
+        await super().spawn()
+
+    async def respawn(self):
+        """Finish scanning the current output file and start the next one."""
+        self.loss()
+        self.__write_index()
+        await super().respawn()
+
+    def loss(self) -> tuple[int, int]:
+        """Scan what bpftrace appended to the output file since the last call."""
+        path = self.output_file()
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                f.seek(self._offset)
+                while data := f.read(READ_CHUNK_SIZE):
+                    self._offset += len(data)
+                    self._events += data.count(b"\n")
+                    self._lost.scan(data)
+        return super().loss()
+
+    def command(self) -> list[str]:
+        """Get the bpftrace command of the tracer (writing to the output file)."""
+        return (
+            ["bpftrace"]
+            + self._options
+            + ["-o", self.output_file()]
+            + [self._script]
+            + self.positional_args()
+        )
 
+    def on_stdout(self, data: bytes):
+        """Log bpftrace messages (trace events go to the output file)."""
+        self._lost.scan(data)
+        for line in data.decode(errors="replace").splitlines():
+            if line.strip():
+                logging.info(f"[{self._tid}] bpftrace: {line}")
 
-class RotateTracer(Tracer):
-    """Tracer runs bpftrace in a separate thread with output log rotation."""
+    def close(self):
+        """Count the lost events that bpftrace wrote into the output file."""
+        self.loss()
+        self.__write_index()
+        super().close()
 
-    def with_rotate_size(
+    def __write_index(self):
+        if self._index and os.path.isfile(self.output_file()):
+            write_index(self.output_file())
+
+
+class SegmentWriter:
+    """SegmentWriter writes trace output into numbered segments of a bounded size.
+
+    Output chunks are written through block-buffered files and only split on a
+    newline when a segment is full, closed segments go to the segment worker.
+    """
+
+    def __init__(
         self,
-        rotate_size: int = 100 * 1024 * 1024,
+        output_dir: str,
+        tid: str,
+        rotate_size: int = None,
+        worker: SegmentWorker = None,
     ):
-        """With rotate size limit (default is 100Mb per file).
+        """SegmentWriter constructor.
 
-        :param rotate_size: the file size for rotate
+        :param output_dir: the output directory of the segments
+        :param tid: the tracer id (segments are trace_<tid>_<index>.log)
+        :param rotate_size: the segment size (None to only start a segment on next())
+        :param worker: compression and retention of closed segments (None to keep them)
         """
+        self._output_dir = output_dir
+        self._tid = tid
         self._rotate_size = rotate_size
+        self._worker = worker
+
         self._file_index = 0
         self._current_size = 0
         self._f = None
 
-    def __open_new_file(self):
-        """Rotate output file."""
-        if self._f:
-            self._f.close()
+    def size(self) -> int:
+        """Get the size of the current segment in bytes."""
+        return self._current_size
+
+    def current_file(self) -> str:
+        """Get the name of the current segment (None before the first one)."""
+        return os.path.basename(self._f.name) if self._f else None
+
+    def next(self):
+        """Close the current segment and start the next one."""
+        self.__close_file()
 
         filename = os.path.join(
             self._output_dir, f"trace_{self._tid}_{self._file_index}.log"
         )
         logging.info(f"[{self._tid}] rotating to {filename}")
 
-        self._f = open(filename, "w", buffering=1)  # line-buffered
+        self._f = open(filename, "wb", buffering=WRITE_BUFFER_SIZE)
         self._current_size = 0
         self._file_index += 1
 
-    def __write_line(self, line: str):
-        data = line.encode()
-        if self._current_size + len(data) > self._rotate_size:
-            self.__open_new_file()
+    def write(self, data: bytes):
+        """Write a chunk of output, rotating on a line boundary when the segment is full."""
+        while data:
+            room = (
+                self._rotate_size - self._current_size
+                if self._rotate_size
+                else len(data)
+            )
+            if len(data) <= room:
+                self._f.write(data)
+                self._current_size += len(data)
+                return
+
+            # split at the last line that fits, or right after the current line
+            cut = data.rfind(b"\n", 0, room)
+            if cut < 0:
+                cut = data.find(b"\n")
+                if cut < 0:
+                    self._f.write(data)
+                    self._current_size += len(data)
+                    return
+
+            self._f.write(data[: cut + 1])
+            self.next()
+            data = data[cut + 1 :]
 
-        self._f.write(line)
-        self._current_size += len(data)
+    def close(self):
+        """Close the last segment and wait for the segment worker."""
+        self.__close_file()
+        if self._worker:
+            self._worker.close()
+            self._worker = None
 
-    def start_tracer(self):
-        """Start bpftrace and rotate logs while reading stdout."""
-        bt_cmd = ["bpftrace"] + self._options + [self._script] + self._args
+    def __close_file(self):
+        """Close the current segment and hand it over to the segment worker."""
+        if self._f:
+            self._f.close()
+            if self._worker:
+                self._worker.submit(self._f.name)
+            self._f = None
 
-        logging.debug(f"[{self._tid}] starting tracer: {' '.join(bt_cmd)}")
 
-        # setup first output file
-        self.__open_new_file()
+class RotateTracer(Tracer):
+    """Tracer runs bpftrace with output log rotation.
+
+    stdout is read in large binary chunks and written by a SegmentWriter.
+    """
 
-        try:
-            proc = subprocess.Popen(
-                bt_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,  # line-buffered read
+    def with_rotate_size(
+        self,
+        rotate_size: int = 100 * 1024 * 1024,
+    ):
+        """With rotate size limit (default is 100Mb per file).
+
+        :param rotate_size: the file size for rotate
+        """
+        self._rotate_size = rotate_size
+        self._worker = None
+        self._writer = None
+
+    def with_segment_worker(
+        self, compress: str = None, retention: RetentionPolicy = None, index=False
+    ):
+        """With background indexing, compression and retention of closed segments.
+
+        :param compress: compression method (gzip or zstd, None to disable)
+        :param retention: retention policy (None to keep all segments)
+        :param index: write a sidecar index of every closed segment
+        """
+        if compress or retention or index:
+            self._worker = SegmentWorker(
+                compress, retention, write_index if index else None
             )
 
-            # read until process ends or stop requested
-            while True:
-                if self._stop_event.is_set():
-                    logging.debug(f"[{self._tid}] stopping tracer")
-                    proc.terminate()
-                    try:
-                        proc.wait(timeout=self._tto)
-                    except subprocess.TimeoutExpired:
-                        logging.debug(f"[{self._tid}] killing tracer")
-                        proc.kill()
-                    break
-
-                # non-blocking line read
-                line = proc.stdout.readline()
-                if not line:
-                    # process probably exited
-                    if proc.poll() is not None:
-                        break
-                    time.sleep(0.05)
-                    continue
+    async def spawn(self):
+        """Open the next output file and start bpftrace."""
+        if self._writer is None:
+            self._writer = SegmentWriter(
+                self._output_dir, self._tid, self._rotate_size, self._worker
+            )
+        self._writer.next()
+        await super().spawn()
+
+    def output_files(self) -> list[str]:
+        """Get the name of the current segment."""
+        return [self._writer.current_file()] if self._writer else []
+
+    def on_stdout(self, data: bytes):
+        """Write a chunk of stdout, rotating on a line boundary when the file is full."""
+        self._lost.scan(data)
+        self._events += data.count(b"\n")
+        self._writer.write(data)
+
+    def close(self):
+        """Close the last output file and wait for the segment worker."""
+        if self._writer:
+            self._writer.close()
+        elif self._worker:
+            self._worker.close()
+        super().close()
+
+
+class SplitTracer(Tracer):
+    """Tracer runs a combined script and splits its output into the outputs it was made of.
+
+    The probes that the io and memory scripts share are attached once, the lines
+    of the operations that only one output prints go to that output, every
+    other line goes to all of them, so each output reads as if its own script
+    had produced it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rotate_size = None
+        self._worker = {}  # output => SegmentWorker
+        self._routes = {}  # operation => outputs
+        self._outputs = []
+        self._writers = {}  # output => SegmentWriter
+        self._tail = b""  # partial line of the last chunk
+
+    def with_outputs(self, outputs: dict[str, list[str]]):
+        """Set the outputs of the combined script.
+
+        :param outputs: output name => operations printed only for this output
+        """
+        self._outputs = list(outputs)
+        self._routes = {
+            op.encode(): [name] for name, ops in outputs.items() for op in ops
+        }
+
+    def with_rotate_size(self, rotate_size: int = 100 * 1024 * 1024):
+        """Rotate the output files (default is 100Mb per file).
+
+        :param rotate_size: the file size for rotate
+        """
+        self._rotate_size = rotate_size
+
+    def with_segment_worker(
+        self, compress: str = None, retention: RetentionPolicy = None, index=False
+    ):
+        """Index, compress and apply the retention policy to the closed segments of every output.
 
-                # write line safely with rotation
-                self.__write_line(line)
-        except Exception as e:
-            logging.error(f"[{self._tid}] tracer failed: {e}")
-        finally:
-            if self._f:
-                self._f.close()
-            logging.debug(f"[{self._tid}] exiting tracer")
+        :param compress: compression method (gzip or zstd, None to disable)
+        :param retention: retention policy (None to keep all segments)
+        :param index: write a sidecar index of every closed segment
+        """
+        if compress or retention or index:
+            self._worker = {
+                name: SegmentWorker(compress, retention, write_index if index else None)
+                for name in self._outputs
+            }
+
+    def metadata(self) -> dict:
+        """Get the tracer entry of the run metadata."""
+        metadata = super().metadata()
+        metadata["outputs"] = self._outputs
+        return metadata
+
+    async def spawn(self):
+        """Start the next segment of every output and start bpftrace."""
+        self._tail = b""
+        for name in self._outputs:
+            if name not in self._writers:
+                self._writers[name] = SegmentWriter(
+                    self._output_dir,
+                    name,
+                    self._rotate_size,
+                    self._worker.get(name),
+                )
+            self._writers[name].next()
+        await super().spawn()
+
+    def output_files(self) -> list[str]:
+        """Get the name of the current segment of every output."""
+        return [writer.current_file() for writer in self._writers.values()]
+
+    def on_stdout(self, data: bytes):
+        """Split a chunk of stdout by the operation of each line."""
+        self._lost.scan(data)
+
+        data = self._tail + data
+        end = data.rfind(b"\n") + 1
+        self._tail = data[end:]
+        if not end:
+            return
+
+        lines = data[:end].split(b"\n")[:-1]
+        self._events += len(lines)
+
+        batches = {name: [] for name in self._outputs}
+        routes = self._routes
+        everywhere = [batches[name].append for name in self._outputs]
+        appends = {
+            op: [batches[n].append for n in names] for op, names in routes.items()
+        }
+        for line in lines:
+            # {pid=... tid=... proc=...}{EN op}{...}
+            i = line.find(b"}{E") + 5
+            op = line[i : line.find(b"}", i)] if i > 4 else None
+            for append in appends.get(op, everywhere):
+                append(line)
+
+        for name, batch in batches.items():
+            if batch:
+                self._writers[name].write(b"\n".join(batch) + b"\n")
+
+    def close(self):
+        """Close the output files of every output."""
+        if self._tail:
+            self.on_stdout(b"\n")
+        for writer in self._writers.values():
+            writer.close()
+        for name, worker in self._worker.items():
+            if name not in self._writers:
+                worker.close()
+        super().close()
+
+
+class MultiTracer(Tracer):
+    """Tracer runs one bpftrace process for many cgroups and demultiplexes its output.
+
+    The multi-target scripts prefix every event with the cgroup id of the process
+    ("<cgroup> <nsecs> {...}"), lines are routed by it to the segments of their
+    target without the prefix. Targets are added and removed at runtime, the
+    script acknowledges them with "<nsecs> TARGET <cgroup> ON|OFF" lines.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rotate_size = None
+        self._compress = None
+        self._retention = None
+        self._index = False
+
+        self._targets = {}  # cgroup id => Target
+        self._writers = {}  # cgroup id => SegmentWriter
+        self._counts = {}  # cgroup id => events
+        self._attached = {}  # cgroup id => monotonic time of the ON acknowledgement
+        self._tail = b""  # partial line of the last chunk
+        self._dropped = 0  # events of untracked cgroups
+
+    def with_rotate_size(self, rotate_size: int = 100 * 1024 * 1024):
+        """Rotate the output files of every target (default is 100Mb per file).
+
+        :param rotate_size: the file size for rotate
+        """
+        self._rotate_size = rotate_size
+
+    def with_segment_worker(
+        self, compress: str = None, retention: RetentionPolicy = None, index=False
+    ):
+        """Index, compress and apply the retention policy to the closed segments of every target.
+
+        :param compress: compression method (gzip or zstd, None to disable)
+        :param retention: retention policy (None to keep all segments)
+        :param index: write a sidecar index of every closed segment
+        """
+        self._compress = compress
+        self._retention = retention
+        self._index = index
+
+    def add_target(self, target: Target):
+        """Start tracing a cgroup (the process may be running already).
+
+        :param target: the target to add
+        """
+        key = target.cgid.encode()
+        self._targets[key] = target
+        if self._proc is not None and self._proc.returncode is None:
+            self.__open(key)
+            track(target.cgid)
+
+    def remove_target(self, cgid: str):
+        """Stop tracing a cgroup, its output is closed once bpftrace acknowledges it.
+
+        :param cgid: the cgroup id
+        """
+        if cgid.encode() in self._targets:
+            untrack(cgid)
+
+    def targets(self) -> dict[str, dict]:
+        """Get the status of the traced cgroups.
+
+        :return: cgroup id => name, events and the monotonic time bpftrace
+            acknowledged it (None until then)
+        """
+        return {
+            key.decode(): {
+                "name": target.name,
+                "events": self._counts.get(key, 0),
+                "attached": self._attached.get(key),
+            }
+            for key, target in list(self._targets.items())
+        }
+
+    def metadata(self) -> dict:
+        """Get the tracer entry of the run metadata."""
+        metadata = super().metadata()
+        metadata["targets"] = [t.name for t in self._targets.values()]
+        return metadata
+
+    async def spawn(self):
+        """Start the next segment of every target and start bpftrace."""
+        self._tail = b""
+        self._attached = {}
+        for key in list(self._targets):
+            if key in self._writers:
+                self._writers[key].next()
+            else:
+                self.__open(key)
+        await super().spawn()
+
+    def output_files(self) -> list[str]:
+        """Get the name of the current segment of every target."""
+        return [writer.current_file() for writer in self._writers.values()]
+
+    def on_stdout(self, data: bytes):
+        """Route the events of a chunk of stdout to the segments of their target."""
+        self._lost.scan(data)
+
+        data = self._tail + data
+        end = data.rfind(b"\n") + 1
+        self._tail = data[end:]
+        if not end:
+            return
+
+        batches = {}
+        for line in data[:end].split(b"\n")[:-1]:
+            key, _, event = line.partition(b" ")
+            batch = batches.get(key)
+            if batch is None:
+                if key not in self._writers:
+                    # events before a TARGET acknowledgement belong to the previous state
+                    self.__write(batches)
+                    batches = {}
+                    self.__on_message(line, event)
+                    continue
+                batch = batches[key] = []
+            batch.append(event)
+        self.__write(batches)
+
+    def close(self):
+        """Close the output files of every target."""
+        for key in list(self._writers):
+            self.__close(key)
+        if self._dropped:
+            logging.info(f"[{self._tid}] dropped {self._dropped} untracked events")
+        super().close()
+
+    def __write(self, batches: dict[bytes, list[bytes]]):
+        """Append the events of a chunk to the segments of their target."""
+        for key, batch in batches.items():
+            self._events += len(batch)
+            comm = self._targets[key].comm
+            if comm is not None:
+                tag = f" proc={comm}}}".encode()
+                batch = [event for event in batch if tag in event]
+            if batch:
+                self._counts[key] = self._counts.get(key, 0) + len(batch)
+                self._writers[key].write(b"\n".join(batch) + b"\n")
+
+    def __open(self, key: bytes):
+        target = self._targets[key]
+        target.prepare()
+        target.record(self._tid, super().metadata())
+
+        worker = None
+        if self._compress or self._retention or self._index:
+            worker = SegmentWorker(
+                self._compress, self._retention, write_index if self._index else None
+            )
+        self._writers[key] = SegmentWriter(
+            target.output_dir, self._tid, self._rotate_size, worker
+        )
+        self._writers[key].next()
+
+    def __close(self, key: bytes):
+        self._writers.pop(key).close()
+        target = self._targets.pop(key)
+        target.record(self._tid, {"events": self._counts.pop(key, 0)})
+        self._attached.pop(key, None)
+
+    def __on_message(self, line: bytes, rest: bytes):
+        """Handle the lines that are not events of a tracked cgroup."""
+        if rest.startswith(b"TARGET "):
+            _, key, state = rest.split(b" ")
+            if key not in self._targets:
+                return
+            if state == b"ON":
+                self._attached[key] = time.monotonic()
+                logging.info(
+                    f"[{self._tid}] tracing cgroup {key.decode()} ({self._targets[key].name})"
+                )
+            elif key in self._writers:
+                self.__close(key)
+                logging.info(f"[{self._tid}] stopped tracing cgroup {key.decode()}")
+        elif b" START " in line:
+            # the probes are attached now, (re)send the targets added before
+            for target in list(self._targets.values()):
+                track(target.cgid)
+        elif rest.startswith(b"CLOCK "):
+            # the multi-target output never reaches a trace file of the session directory
+            anchor = parse_clock_line(line)
+            if anchor is not None:
+                append_anchor(self._output_dir, *anchor, source=self._tid)
+        elif rest.partition(b" ")[2].startswith(b"{"):
+            self._dropped += 1
+        elif line.strip():
+            logging.info(f"[{self._tid}] bpftrace: {line.decode(errors='replace')}")
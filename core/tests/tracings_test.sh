@@ -4,7 +4,7 @@
 set -eu
 
 BASE_DIR="bpftrace"
-SCRIPT_NAMES="exceptions_trace.bt io_trace.bt meta_trace.bt kprobes_trace.bt memory_trace.bt"
+SCRIPT_NAMES="io_trace.bt io_uring_trace.bt memory_trace.bt block_trace.bt combined_trace.bt combined_block_trace.bt combined_uring_trace.bt combined_uring_block_trace.bt io_aggregate.bt io_uring_aggregate.bt memory_aggregate.bt"
 
 echo "[INFO] Starting bpftrace dry-run tests"
 
@@ -15,7 +15,7 @@ for module in "$BASE_DIR"/*/; do
     module_name=$(basename "$module")
     echo "[INFO] Testing module: $module_name"
 
-    # test the three script types
+    # test every script type
     for script in $SCRIPT_NAMES; do
         script_path="${module}${script}"
 
@@ -4,11 +4,23 @@
 import json
 import logging
 import os
+import re
 
 from jinja2 import Template
 
 CONFIG_PATH = "tracers.json"
 
+# 1-in-N sampling of threads (or processes) by a multiplicative hash, so the
+# EN and EX events of a syscall are always kept together. $rate <= 1 disables it.
+SAMPLING_CLAUSE = "({rate} <= 1 || ((uint64)({by} ? pid : tid) * 2654435761 & 0xffffffff) % {rate} == 0)"
+
+# multi-target scripts prefix every event with the cgroup id, e.g. "<cgroup> <nsecs> {pid=...}"
+EVENT_PRINTF = re.compile(r'printf\("%llu (\{.*?)", nsecs, ')
+
+# probe sections start with a comment line, e.g. /* read enter + exit */
+SECTION = re.compile(r"^/\* .+ \*/$", re.M)
+PRINTED_OP = re.compile(r"\{E[NX] (\w+)\}")
+
 
 def import_json(path: str) -> dict:
     """Import json data into a dictionary.
@@ -36,6 +48,76 @@ def read_to_str(path: str) -> str:
         return ""
 
 
+def next_positional(*sections: str) -> int:
+    """Return the first positional parameter that is not used by the sections.
+
+    :param sections: bpftrace code
+    """
+    used = [int(i) for section in sections for i in re.findall(r"\$(\d+)", section)]
+    return max(used, default=0) + 1
+
+
+def with_sampling(filter_section: str, index: int) -> str:
+    """Add the sampling clause to a filter.
+
+    the sampling rate is the positional parameter `index` and the sampling key
+    (0 for tid, 1 for pid) is the next one.
+
+    :param filter_section: a filter like "/ @tracked[pid] /"
+    :param index: positional parameter of the sampling rate
+    """
+    condition = filter_section.strip().strip("/").strip()
+    clause = SAMPLING_CLAUSE.format(rate=f"${index}", by=f"${index + 1}")
+    return f"/ {condition} && {clause} /"
+
+
+def with_target_tag(script: str) -> str:
+    """Prefix the events of a rendered script with the cgroup id of the process.
+
+    events printed for another process (e.g. io_uring completions, which print
+    the submitter) tag with the $cgroup variable the probe sets instead.
+
+    :param script: the rendered bpftrace script
+    """
+
+    def tag(match: re.Match) -> str:
+        own = script.startswith("pid, ", match.end())
+        cgroup = "cgroup" if own else "$cgroup"
+        return f'printf("%llu %llu {match.group(1)}", {cgroup}, nsecs, '
+
+    return EVENT_PRINTF.sub(tag, script)
+
+
+def combine(scripts: dict[str, str]) -> str:
+    """Merge rendered scripts into one script, the sections they share are kept once.
+
+    a header line per script lists the operations that only this script prints,
+    e.g. "// output io: read,write", so a tracer can split the output back
+    (the lines of the other operations belong to every script).
+
+    :param scripts: output name => rendered script
+    """
+    sections = []
+    for script in scripts.values():
+        starts = [m.start() for m in SECTION.finditer(script)]
+        bounds = [0] + starts + [len(script)]
+        for begin, end in zip(bounds, bounds[1:]):
+            section = script[begin:end].rstrip("\n") + "\n\n"
+            if section.strip() and section not in sections:
+                sections.append(section)
+
+    printed = {name: set(PRINTED_OP.findall(s)) for name, s in scripts.items()}
+    header = ""
+    for name, ops in printed.items():
+        others = set().union(*(o for n, o in printed.items() if n != name))
+        header += f"// output {name}: {','.join(sorted(ops - others))}\n"
+
+    # the header goes after the shebang line of the first section
+    shebang, _, rest = sections[0].partition("\n")
+    sections[0] = f"{shebang}\n{header}{rest}"
+    return "".join(sections).rstrip("\n") + "\n"
+
+
 def read_template(path: str) -> Template:
     """Read template into jinja2 object.
 
@@ -85,18 +167,50 @@ if __name__ == "__main__":
         filter_section = read_to_str(filter_path)
         begin_section = read_to_str(begin_path)
 
-        # create the outputs
-        for out in cfg["sources"]:
+        # sampling parameters come after the input parameters
+        filter_section = with_sampling(
+            filter_section, next_positional(begin_section, filter_section)
+        )
+
+        # create the outputs (an input may only support a part of the sources)
+        sources = cfg.get("input_sources", {}).get(entry, cfg["sources"])
+        rendered = {}
+        for out in sources:
             logging.info(f"exporting script {entry} : {out}")
 
+            # a variant renders the template of another source with extra variables
+            variables = dict(cfg.get("variants", {}).get(out, {}))
+            template = variables.pop("template", out)
+
             # form the paths
-            template_path = os.path.join(templates_dir_path, out) + ".j2"
+            template_path = os.path.join(templates_dir_path, template) + ".j2"
             output_path = os.path.join(output_dir_path, out)
 
             tmp = read_template(template_path)
-            res = tmp.render(begin_section=begin_section, filter=filter_section)
+            res = tmp.render(
+                begin_section=begin_section,
+                filter=filter_section,
+                interval=cfg["aggregate_interval"],
+                **variables,
+            )
+            if entry in cfg.get("tagged_inputs", []):
+                res = with_target_tag(res)
 
             save_template(output_path, res)
             logging.info(f"template saved: {output_path}")
+            rendered[out] = res
+
+        # merge scripts that share probes (multi-target tracers do not split outputs)
+        if entry in cfg.get("tagged_inputs", []):
+            continue
+        for out, parts in cfg.get("combined", {}).items():
+            if not all(part in rendered for part in parts):
+                continue
+            output_path = os.path.join(output_dir_path, out)
+            save_template(
+                output_path,
+                combine({part.split("_")[0]: rendered[part] for part in parts}),
+            )
+            logging.info(f"combined script saved: {output_path}")
 
     logging.info("done")